@@ -25,6 +25,8 @@ Reference
 import sys
 import ctypes
 from ctypes import c_void_p, c_float, c_int32, c_bool
+import numpy as np
+from utils import NativeFunction
 
 
 if sys.platform == 'darwin':
@@ -74,20 +76,11 @@ class Rect(ctypes.Structure):
     def __str__(self):
         return 'Rect(%d, %d, %d, %d)' % (self.x, self.y, self.width, self.height)
 
-_create_packer = _binpack.create_packer
-_create_packer.restype = c_packer_p
-_create_packer.argtypes = [c_int32, c_int32, c_int32, c_bool]
-
-_destroy_packer = _binpack.destroy_packer
-_destroy_packer.argtypes = [c_packer_p]
-
-_get_occupancy = _binpack.get_occupancy
-_get_occupancy.restype = c_float
-_get_occupancy.argtypes = [c_packer_p]
-
-_pack_rect = _binpack.pack_rect
-_pack_rect.restype = Rect
-_pack_rect.argtypes = [c_packer_p, c_int32, c_int32]
+_create_packer = NativeFunction(_binpack, 'create_packer', [c_int32, c_int32, c_int32, c_bool], c_packer_p)
+_destroy_packer = NativeFunction(_binpack, 'destroy_packer', [c_packer_p])
+_get_occupancy = NativeFunction(_binpack, 'get_occupancy', [c_packer_p], c_float)
+_pack_rect = NativeFunction(_binpack, 'pack_rect', [c_packer_p, c_int32, c_int32], Rect)
+_pack_rects = NativeFunction(_binpack, 'pack_rects', [c_packer_p, c_int32, c_void_p, c_void_p, c_bool], c_int32)
 
 
 def create_packer(type, width, height, allow_rotate):
@@ -139,6 +132,31 @@ def pack_rect(packer, w, h):
     """
     return _pack_rect(packer, w, h)
 
+
+def pack_rects(packer, sizes, rects, best_fit=False):
+    """ Packs several rectangles in the bin, in one call.
+    
+    :param sizes:       A numpy array of shape (N, 2) and type int32, with the (w, h) of each rect
+    :param rects:       A numpy array of shape (N, 4) and type int32, that receives the packed rects in the same order as the sizes.
+                        See pack_rect() for the format. The rects that weren't packed are (0, 0, 0, 0)
+    :param best_fit:    If False, the rects are packed in the given order, until a rect doesn't fit.
+                        If True, the packer picks the rect that fits best in each step, among all the remaining rects.
+                        This is slower, but often packs tighter.
+    :return:            The number of rects that were packed
+    """
+    assert sizes.dtype == np.int32 and sizes.flags.c_contiguous and sizes.shape[1:] == (2,), "The sizes must be a C ordered (N, 2) int32 array"
+    assert rects.dtype == np.int32 and rects.flags.c_contiguous and rects.shape == (sizes.shape[0], 4), "The rects must be a C ordered (N, 4) int32 array"
+    if not best_fit and not _pack_rects.exists():
+        # an older native library
+        rects[:] = 0
+        for i, (w, h) in enumerate(sizes):
+            rect = _pack_rect(packer, w, h)
+            if rect.height == 0:
+                return i
+            rects[i] = (rect.x, rect.y, rect.width, rect.height)
+        return len(sizes)
+    return _pack_rects(packer, sizes.shape[0], sizes.ctypes.data_as(c_void_p), rects.ctypes.data_as(c_void_p), best_fit)
+
 if __name__ == '__main__':
     import time
     import Image, ImageDraw
@@ -1,4 +1,12 @@
-g++ -shared -O2 -Wall \
+# OpenMP makes the threads argument of convolve1d, maximum and minimum work.
+# Apple's compiler has no OpenMP runtime of its own, it needs libomp (e.g. "port install libomp")
+OPENMP="-Xpreprocessor -fopenmp -I/opt/local/include/libomp -L/opt/local/lib/libomp -lomp"
+if ! echo "int main() { return 0; }" | g++ $OPENMP -x c++ - -o /dev/null 2> /dev/null; then
+	echo "libomp wasn't found, the threads argument will have no effect"
+	OPENMP=""
+fi
+
+g++ -shared -O2 -Wall $OPENMP \
 	source/sedt.cpp \
 	source/utils.cpp \
 	-o shared/darwin64/_utils.dylib
@@ -0,0 +1,20 @@
+# Builds the native libraries for Linux, e.g. "sh compile_linux.sh linux32" for a 32 bit build
+PLATFORM=${1:-linux64}
+if [ "$PLATFORM" = "linux32" ]; then
+	ARCH=-m32
+else
+	ARCH=-m64
+fi
+
+g++ -shared -fPIC -O2 -Wall -fopenmp $ARCH \
+	source/sedt.cpp \
+	source/utils.cpp \
+	-o shared/$PLATFORM/_utils.so
+
+g++ -shared -fPIC -O2 -Wall $ARCH \
+	source/binpack/Rect.cpp \
+	source/binpack/GuillotineBinPack.cpp \
+	source/binpack/SkylineBinPack.cpp \
+	source/binpack/MaxRectsBinPack.cpp \
+	source/binpack.cpp \
+	-o shared/$PLATFORM/_binpack.so
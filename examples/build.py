@@ -1,10 +1,19 @@
-import sys, os, inspect
+import sys, os, inspect, json, hashlib, multiprocessing, traceback
 SCRIPTDIR = os.path.dirname( inspect.getsourcefile(inspect.currentframe()) )
 
 EXAMPLEDIR = os.path.abspath(os.path.dirname(__file__))
 SOURCEDIR = os.path.normpath( os.path.join(EXAMPLEDIR, '..', 'doc', 'source') )
 OUTPUTDIR = os.path.normpath( os.path.join(EXAMPLEDIR, '..', 'doc', 'source', 'examples') )
 FONTCREATOR = os.path.normpath( os.path.join(EXAMPLEDIR, '..', 'fontcreator.py') )
+ROOTDIR = os.path.dirname(FONTCREATOR)
+
+# Remembers the inputs of each built font, so that unchanged fonts can be skipped
+STAMPSPATH = os.path.join(OUTPUTDIR, '.buildstamps.json')
+
+sys.path.insert(0, os.path.dirname(FONTCREATOR))
+import fontcreator
+import fontutils as fu
+from fontinfo import SFontInfo
 
 TEXT="Hello World!"
 EXT='.png'
@@ -33,7 +42,113 @@ Here are some examples that are generated with the font creator
 FOOTER = """
 """
 
-def generate_doc(path, outputdir, profile=False):
+def _get_file_stamp(path, oldstamp):
+    """ Returns the modification time, size and hash of a file.
+    The file is only hashed if the modification time or size changed since the old stamp
+    """
+    st = os.stat(path)
+    if oldstamp and oldstamp['mtime'] == st.st_mtime and oldstamp['size'] == st.st_size:
+        return oldstamp
+
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        h.update(f.read())
+    return {'mtime': st.st_mtime, 'size': st.st_size, 'sha1': h.hexdigest()}
+
+
+_code_stamp = None
+
+def _get_code_stamp():
+    """ Returns a hash of the font creator itself: its python files and the native libraries """
+    global _code_stamp
+    if _code_stamp is None:
+        paths = []
+        for dirpath, dirnames, filenames in os.walk(ROOTDIR):
+            if dirpath == ROOTDIR:
+                dirnames[:] = [d for d in dirnames if d not in ('examples', 'tests', 'doc', 'build')]
+            isshared = os.path.relpath(dirpath, ROOTDIR).split(os.sep)[0] == 'shared'
+            paths.extend( os.path.join(dirpath, f) for f in filenames if isshared or f.endswith('.py') )
+
+        h = hashlib.sha1()
+        for path in sorted(paths):
+            h.update(os.path.relpath(path, ROOTDIR).replace(os.sep, '/') + '\n')
+            with open(path, 'rb') as f:
+                h.update(f.read())
+        _code_stamp = h.hexdigest()
+    return _code_stamp
+
+
+def _get_stamp(options, oldstamp):
+    """ Returns the stamps of the font creator code and of all the input files of a font """
+    oldfiles = (oldstamp or dict()).get('files', dict())
+    info = SFontInfo(options)
+    files = dict( (dep, _get_file_stamp(dep, oldfiles.get(dep))) for dep in info.dependencies )
+    return {'code': _get_code_stamp(), 'files': files}
+
+
+def _get_output_stamps(outputs):
+    """ Returns the modification time and size of each of the written files """
+    stamps = dict()
+    for output in outputs:
+        st = os.stat(output)
+        stamps[output] = {'mtime': st.st_mtime, 'size': st.st_size}
+    return stamps
+
+
+def _is_up_to_date(stamp, oldstamp):
+    """ The font is up to date if the code and the inputs are unchanged, and all the files that
+    the last build wrote still exist and haven't been changed since
+    """
+    if not oldstamp or stamp['code'] != oldstamp.get('code') or not oldstamp.get('outputs'):
+        return False
+    files, oldfiles = stamp['files'], oldstamp.get('files', dict())
+    if sorted(files.keys()) != sorted(oldfiles.keys()):
+        return False
+    for output, outputstamp in oldstamp['outputs'].iteritems():
+        if not os.path.exists(output) or _get_output_stamps([output])[output] != outputstamp:
+            return False
+    return all( files[dep]['sha1'] == oldfiles[dep]['sha1'] for dep in files )
+
+
+# The extensions of the files that the built-in writers write
+WRITER_EXTENSIONS = {'fontout_json': '.json', 'fontout_font': '.font'}
+
+def _get_outputs(options, infos):
+    """ Returns the files that fontcreator.run() wrote, given its options and the font infos it returned """
+    outputs = []
+    for info in (infos if isinstance(infos, list) else [infos]):
+        output = fu.get_size_path(options.output, info.size) if info.sizes else options.output
+        if options.writetext:
+            outputs.append(output)
+            continue
+
+        if info.texturepages != 1:
+            textures = [fu.get_page_path(output, page) for page in xrange(info.pagecount)]
+        else:
+            textures = [output]
+        outputs.extend( os.path.splitext(texture)[0] + info.textureformat for texture in textures )
+        if info.writer.__name__ in WRITER_EXTENSIONS:
+            outputs.append( os.path.splitext(output)[0] + WRITER_EXTENSIONS[info.writer.__name__] )
+    return outputs
+
+
+def _compile(args):
+    """ Compiles a font in this process, given the command line arguments to fontcreator.py
+    Returns the written files, or None if an error occurred
+    """
+    options = fontcreator.init(args)
+    try:
+        infos = fontcreator.run(options)
+    except fu.FontException, e:
+        print "%s: %s" % (options.input, str(e))
+        return None
+    return _get_outputs(options, infos)
+
+
+def generate_doc(path, outputdir, profile=False, oldstamp=None, force=False):
+    """ Builds the textures of a font and writes its .rst file.
+    Returns the .rst contents and the stamp of the inputs, or 1 if an error occurred
+    """
     print "Generating documentation for %s" % path
 
     filename = os.path.basename(path)
@@ -46,20 +161,39 @@ def generate_doc(path, outputdir, profile=False):
     jsonname = filename.replace('.fontinfo', '.json')
     pstatspath = os.path.join(outputdir, filename) + '.pstats'
 
-    verbose = '-v' if '-v' in sys.argv else ''
+    verbose = ['-v'] if '-v' in sys.argv else []
 
-    cmd = '%s %s -i %s -o %s -w "%s" --bgcolor=0,0,0 %s' % (sys.executable, FONTCREATOR, path, outputpath_text, TEXT, verbose)
+    textargs = ['-i', path, '-o', outputpath_text, '-w', TEXT, '--bgcolor=0,0,0'] + verbose
+    args = ['-i', path, '-o', outputpath] + verbose
 
-    if os.system(cmd) != 0:
-        return 1
+    stamp = _get_stamp(fontcreator.init(args), oldstamp)
 
-    timeit = 'time' if profile else ''
-    cprofile = '-m cProfile -o %s' % pstatspath if profile else ''
+    if profile:
+        # profile each run in a separate process
+        cmd = '%s %s %s' % (sys.executable, FONTCREATOR, ' '.join(['"%s"' % arg for arg in textargs]))
+        if os.system(cmd) != 0:
+            return 1
+
+        if not DEBUG:
+            if os.system('time %s -m cProfile -o %s %s -i %s -o %s' % (sys.executable, pstatspath, FONTCREATOR, path, outputpath)) != 0:
+                return 1
 
-    if not DEBUG:
-        if os.system('%s %s %s %s -i %s -o %s' % (timeit, sys.executable, cprofile, FONTCREATOR, path, outputpath)) != 0:
+    elif force or not _is_up_to_date(stamp, oldstamp):
+        # the files that both passes write
+        outputs = _compile(textargs)
+        if outputs is None:
             return 1
 
+        if not DEBUG:
+            fontoutputs = _compile(args)
+            if fontoutputs is None:
+                return 1
+            outputs += fontoutputs
+        stamp['outputs'] = _get_output_stamps(outputs)
+    else:
+        stamp['outputs'] = oldstamp['outputs']
+        print "Skipping %s, it is up to date" % path
+
     if profile:
         gprof = 'gprof2dot'
         if os.system('%s -f pstats %s -e 0.1 -n 0.1 | dot -Tpdf -o %s/%s.pdf' % (gprof, pstatspath, OUTPUTDIR, filename)) != 0:
@@ -126,23 +260,60 @@ The JSON file :download:`.json <./%s>`
     with open(rstoutputpath, 'wb') as f:
         f.write(s)
 
-    return s
+    return (s, stamp)
 
 
-def generate_header(path, outputdir):
+def generate_header(path, outputdir, oldstamp=None, force=False):
     print "Generating header logo with %s" % path
 
     outputpath_text = os.path.join(outputdir, HEADERNAME)
 
-    if os.system('%s %s -i %s -o %s -w "%s"' % (sys.executable, FONTCREATOR, path, outputpath_text, HEADERTEXT)) != 0:
+    args = ['-i', path, '-o', outputpath_text, '-w', HEADERTEXT]
+    stamp = _get_stamp(fontcreator.init(args), oldstamp)
+
+    if force or not _is_up_to_date(stamp, oldstamp):
+        outputs = _compile(args)
+        if outputs is None:
+            return 1
+        stamp['outputs'] = _get_output_stamps(outputs)
+    else:
+        stamp['outputs'] = oldstamp['outputs']
+        print "Skipping %s, it is up to date" % path
+
+    return stamp
+
+
+def _generate_worker(args):
+    """ Runs generate_doc() or generate_header() in a worker process """
+    fn, k, kw = args
+    try:
+        return fn(*k, **kw)
+    except Exception:
+        traceback.print_exc()
         return 1
 
-    return 0
+
+def _load_stamps():
+    if not os.path.exists(STAMPSPATH):
+        return dict()
+    try:
+        with open(STAMPSPATH, 'rb') as f:
+            return json.load(f)
+    except ValueError:
+        return dict()
+
+
+def _save_stamps(stamps):
+    if not os.path.exists(OUTPUTDIR):
+        os.makedirs(OUTPUTDIR)
+    with open(STAMPSPATH, 'wb') as f:
+        json.dump(stamps, f, indent=4, sort_keys=True)
 
 if __name__ == '__main__':
     olddir = os.getcwd()
     
     profile = 'profile' in sys.argv
+    force = 'force' in sys.argv
     try:
         if SCRIPTDIR:
             os.chdir(SCRIPTDIR)
@@ -158,19 +329,47 @@ if __name__ == '__main__':
             
         fontinfos = [ os.path.join(EXAMPLEDIR, x) for x in fontinfos if x.endswith('.fontinfo') ]
 
+        stamps = dict() if force else _load_stamps()
+
+        jobs = []
         for file in fontinfos:
             if file.endswith(HEADER_FONTINFO):
                 continue
-            doc = generate_doc( file, OUTPUTDIR, profile=profile )
-            if not isinstance(doc, str):
-                print "Aborting, an error occurred"
-                sys.exit(1)
-
-            docs.append(doc)
-            print ""
+            jobs.append( (generate_doc, (file, OUTPUTDIR), dict(profile=profile, oldstamp=stamps.get(file), force=force)) )
 
         if not DEBUG:
-            generate_header(HEADER_FONTINFO, OUTPUTDIR)
+            header = os.path.abspath(HEADER_FONTINFO)
+            jobs.append( (generate_header, (header, OUTPUTDIR), dict(oldstamp=stamps.get(header), force=force)) )
+
+        # The fonts are independent of each other, so build them in parallel
+        # (unless profiling, where the timings would interfere)
+        if profile:
+            results = map(_generate_worker, jobs)
+        else:
+            pool = multiprocessing.Pool()
+            try:
+                results = pool.map(_generate_worker, jobs)
+            finally:
+                pool.close()
+                pool.join()
+
+        failed = False
+        for (fn, k, kw), result in zip(jobs, results):
+            if result == 1:
+                failed = True
+                continue
+            if fn == generate_doc:
+                doc, stamp = result
+                docs.append(doc)
+            else:
+                stamp = result
+            stamps[k[0]] = stamp
+
+        _save_stamps(stamps)
+
+        if failed:
+            print "Aborting, an error occurred"
+            sys.exit(1)
 
         path = os.path.join(OUTPUTDIR, 'examples.rst')
         rstfiles = [os.path.basename(fi).replace('.fontinfo', '.rst') for fi in fontinfos if not fi.endswith(HEADER_FONTINFO)]
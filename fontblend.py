@@ -2,16 +2,31 @@
 Copyright @ 2013 Mathias Westerdahl
 """
 
-import logging
+import logging, inspect
 import numpy as np
 
 BLENDFUNCTIONS = dict()
 
 
+def _with_out(fun):
+    """ Wraps a blend function that doesn't take an out argument """
+    def wrapper(base, blend, out=None):
+        result = fun(base, blend)
+        if out is None:
+            return result
+        np.copyto(out, result)
+        return out
+    wrapper.__name__ = fun.__name__
+    wrapper.__doc__ = fun.__doc__
+    return wrapper
+
+
 def blendfunction(fun):
     """ Registers a class as a blend function
 
     :param fun: A function that takes two numpy images, blends them and then returns the resulting image.
+                If it also takes an *out* argument, it should write the result to that array (if given) and return it.
+                The out array may be the blend image, but never the base image.
     
     Example::
     
@@ -20,110 +35,136 @@ def blendfunction(fun):
             return base + blend
     """
     assert( callable(fun) )
-    BLENDFUNCTIONS[fun.__name__.lower()] = fun
+    if 'out' not in inspect.getargspec(fun).args:
+        BLENDFUNCTIONS[fun.__name__.lower()] = _with_out(fun)
+    else:
+        BLENDFUNCTIONS[fun.__name__.lower()] = fun
     logging.info( "Registered blend function %s" % fun.__name__.lower() )
     return fun
 
 
-# TODO: vectorize these functions
+def _apply(ufunc, a, b, out):
+    # numpy doesn't accept out=None
+    if out is None:
+        return ufunc(a, b)
+    return ufunc(a, b, out)
 
 
 @blendfunction
-def blendnormal(base, blend):
+def blendnormal(base, blend, out=None):
     """ R = blend
 
     :param base: The base image
     :param blend: The blend image
+    :param out: The optional output image
     """
-    return blend
+    if out is None or out is blend:
+        return blend
+    np.copyto(out, blend)
+    return out
 
 
 # Darken blends
 
 @blendfunction
-def blenddarken(base, blend):
+def blenddarken(base, blend, out=None):
     """ R = min( base, blend )
 
     :param base: The base image
     :param blend: The blend image
+    :param out: The optional output image
     """
-    return np.minimum(base, blend)
+    return _apply(np.minimum, base, blend, out)
 
 
 @blendfunction
-def blendmultiply(base, blend):
+def blendmultiply(base, blend, out=None):
     """ R = base * blend
 
     :param base: The base image
     :param blend: The blend image
+    :param out: The optional output image
     """
-    return base * blend
+    return _apply(np.multiply, base, blend, out)
 
 
 @blendfunction
-def blendcolorburn(base, blend):
+def blendcolorburn(base, blend, out=None):
     """ R = 1 - (1 - base) / blend
 
     :param base: The base image
     :param blend: The blend image
+    :param out: The optional output image
     """
-    # 1 - (1-Base) / Blend
-    ones = np.ones_like(base)
-    return ones - (ones - base) / blend
+    # the out array holds the temporary, unless it's the blend image
+    tmp = _apply(np.subtract, 1.0, base, None if out is blend else out)
+    np.divide(tmp, blend, tmp)
+    return np.subtract(1.0, tmp, tmp if out is None else out)
 
 
 @blendfunction
-def blendlinearburn(base, blend):
+def blendlinearburn(base, blend, out=None):
     """ R = base + blend - 1
 
     :param base: The base image
     :param blend: The blend image
+    :param out: The optional output image
     """
-    # R = Base + Blend - 1
-    return base + blend - np.ones_like(base)
+    out = _apply(np.add, base, blend, out)
+    out -= 1.0
+    return out
 
 
 # Lighten blends
 
 @blendfunction
-def blendlighten(base, blend):
+def blendlighten(base, blend, out=None):
     """ R = max( base, blend )
 
     :param base: The base image
     :param blend: The blend image
+    :param out: The optional output image
     """
-    return np.maximum(base, blend)
+    return _apply(np.maximum, base, blend, out)
 
 
 @blendfunction
-def blendscreen(base, blend):
+def blendscreen(base, blend, out=None):
     """ R = 1 - (1 - base) * (1 - blend)
 
     :param base: The base image
     :param blend: The blend image
+    :param out: The optional output image
     """
-    # R = 1 - (1-Base) * (1-Blend)
-    ones = np.ones_like(base)
-    return ones - (ones - base) * (ones - blend)
+    out = _apply(np.subtract, 1.0, blend, out)
+    out *= 1.0 - base
+    return np.subtract(1.0, out, out)
 
 
 @blendfunction
-def blendcolordodge(base, blend):
+def blendcolordodge(base, blend, out=None):
     """ R = base / (1 - blend)
 
     :param base: The base image
     :param blend: The blend image
+    :param out: The optional output image
     """
-    # R = Base / (1-Blend)
-    ones = np.ones_like(base)
-    return base / (ones - blend)
+    out = _apply(np.subtract, 1.0, blend, out)
+    return np.divide(base, out, out)
 
 
 @blendfunction
-def blendlineardodge(base, blend):
+def blendlineardodge(base, blend, out=None):
     """ R = base + blend
 
     :param base: The base image
     :param blend: The blend image
+    :param out: The optional output image
     """
-    return base + blend
+    return _apply(np.add, base, blend, out)
+
+
+# The built-in blend functions that utils.blend() can do natively, fused with the rest of Layer.apply_blend()
+NATIVE_MODES = { blendnormal: 'normal', blenddarken: 'darken', blendmultiply: 'multiply', blendcolorburn: 'colorburn',
+                 blendlinearburn: 'linearburn', blendlighten: 'lighten', blendscreen: 'screen',
+                 blendcolordodge: 'colordodge', blendlineardodge: 'lineardodge' }
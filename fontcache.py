@@ -0,0 +1,163 @@
+"""
+Copyright @ 2013 Mathias Westerdahl
+
+A disc cache for the glyph bitmaps, after all layers and post effects are applied.
+
+The cache is content addressed: a glyph is looked up by a hash of everything that
+affects its pixels, which means that a changed font, size or effect setup never
+yields a stale glyph. The cache is kept below a given size by removing the least recently used glyphs.
+"""
+
+import os, hashlib, tempfile, logging
+import numpy as np
+import editor.properties.propertytypes as prop
+
+# Bump this whenever the rendering changes in a way that makes old cache entries invalid
+CACHE_VERSION = '2'
+
+EXT = '.npz'
+
+
+def _hash_file(h, path):
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(1 << 20)
+            if not data:
+                break
+            h.update(data)
+
+
+def get_layers_key(options, info):
+    """ Creates a key of all the settings that are shared by all glyphs in the font:
+    The font file contents, the font size, the layer setup and the parameters of each function (section)
+    as written in the .fontinfo, including the contents of the files they refer to.
+
+    Must be called after the glyph dimensions (info.maxsize) are calculated.
+    """
+    h = hashlib.sha1()
+    h.update('version=%s\n' % CACHE_VERSION)
+    _hash_file(h, info.name)
+
+    for name in ['size', 'dpi', 'antialias', 'internalpadding', 'useadvanceaswidth', 'bgcolor', 'fgcolor', 'precision']:
+        h.update('%s=%r\n' % (name, getattr(info, name)))
+
+    h.update('extrapadding=%r\n' % (tuple(int(x) for x in info.extrapadding),))
+    h.update('maxsize=%r\n' % (tuple(int(x) for x in info.maxsize),))
+    h.update('maxbearingY=%d\n' % info.maxbearingY)
+    h.update('layers=%r\n' % (info.layersource,))
+
+    for section in sorted(info.functionlist.iterkeys()):
+        fn = info.functionlist[section]
+        h.update('[%s] %s\n' % (section, type(fn).__name__))
+
+        # all the parameters, as written in the .fontinfo, since not all of them are declared as properties
+        for name, value in info.functionsource[section]:
+            h.update('%s=%s\n' % (name, value))
+
+        properties = getattr(fn, '__properties', dict())
+        for name in sorted(properties.iterkeys()):
+            value = getattr(fn, name)
+            if isinstance(properties[name], prop.FileProperty) and value:
+                _hash_file(h, os.path.join(options.datadir, value))
+
+    return h.hexdigest()
+
+
+def get_glyph_key(layerskey, glyph):
+    """ Creates the key of a single glyph, given the key from get_layers_key() """
+    h = hashlib.sha1(layerskey)
+    h.update('%d %d %d %d %r' % (glyph.utf8, glyph.bearingX, glyph.bearingY, glyph.advance, glyph.bitmap.shape))
+    return h.hexdigest()
+
+
+class GlyphCache(object):
+    """ Stores the glyph bitmaps as compressed numpy files in a directory
+
+    :param path:        The cache directory
+    :param maxsize:     The maximum size of the cache, in bytes
+    """
+
+    def __init__(self, path, maxsize):
+        self.path = path
+        self.maxsize = maxsize
+
+    def _get_path(self, key):
+        return os.path.join(self.path, key[:2], key + EXT)
+
+    def get(self, key):
+        """ Returns the cached bitmap, or None if the key isn't in the cache """
+        path = self._get_path(key)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with np.load(path) as data:
+                bitmap = data['bitmap']
+        except Exception, e:
+            logging.warning("Failed to read cached glyph %s: %s" % (path, str(e)))
+            return None
+
+        # mark the glyph as recently used
+        os.utime(path, None)
+        return bitmap
+
+    def put(self, key, bitmap):
+        """ Stores a bitmap in the cache """
+        path = self._get_path(key)
+        dirname = os.path.dirname(path)
+        if not os.path.exists(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                # Another process might have created it
+                if not os.path.isdir(dirname):
+                    raise
+
+        # write to a temporary file first, so that no other process reads a half written glyph
+        fd, tmppath = tempfile.mkstemp(suffix=EXT, dir=dirname)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez_compressed(f, bitmap=bitmap)
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(tmppath, path)
+        except:
+            if os.path.exists(tmppath):
+                os.remove(tmppath)
+            raise
+
+    def trim(self):
+        """ Removes the least recently used glyphs until the cache is below its maximum size """
+        if not os.path.isdir(self.path):
+            return
+
+        entries = []
+        total = 0
+        for dirpath, dirnames, filenames in os.walk(self.path):
+            for filename in filenames:
+                if not filename.endswith(EXT):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append( (st.st_mtime, st.st_size, path) )
+                total += st.st_size
+
+        if total <= self.maxsize:
+            return
+
+        entries.sort()
+        removed = 0
+        for mtime, size, path in entries:
+            if total <= self.maxsize:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+
+        logging.debug("Removed %d glyphs from the cache %s" % (removed, self.path))
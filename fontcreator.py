@@ -2,9 +2,10 @@
 Copyright @ 2013 Mathias Westerdahl
 """
 
-import sys, os, logging
+import sys, os, logging, copy
 from optparse import OptionParser
 import itertools
+import multiprocessing
 
 try:
     from PIL import Image
@@ -48,6 +49,8 @@ import fontutils as fu
 
 from fontinfo import SFontInfo
 import fonteffects
+import fontcache
+import fontkerning
 
 """
 for n in sorted(sys.modules.keys()):
@@ -88,7 +91,7 @@ class LogStream(object):
         self.log.flush()
 
 
-def _apply_layer(info, glyph, layer, previmage, glyphimage):
+def _apply_layer(info, glyph, layer, previmage, glyphimage, pool=None):
     # The max y should be the same for all characters in the same row
     # This is necessary for having the same "space" during calculations
     maxsize = info.maxsize
@@ -99,13 +102,176 @@ def _apply_layer(info, glyph, layer, previmage, glyphimage):
     image = layer.apply_color( 0, starty, glyph.bitmap.shape, maxsize, glyphimage, previmage )
     image = layer.apply_effects( image )
     image = layer.apply_mask( image )
-    image = layer.apply_blend( glyphimage, previmage, image )
+    image = layer.apply_blend( glyphimage, previmage, image, pool )
 
-    assert image != None
+    assert image is not None
     return image
 
 
-def _apply_layers(info):
+def _apply_background(info, image):
+    bgimage = np.empty( image.shape, info.dtype)
+    bgimage[:] = (info.bgcolor[0], info.bgcolor[1], info.bgcolor[2], 0.0)
+    
+    image = fu.alpha_blend(bgimage, image, out=bgimage)
+    image.flags.writeable = False
+    return image
+
+
+def _apply_layers_glyph(info, glyph, pool=None):
+    glyphimage = glyph.bitmap
+    glyphimage.flags.writeable = False
+
+    # ????
+    fonteffects.DefaultMask.idx = np.where(glyphimage == 0)
+    
+    previmage = np.dstack((glyphimage, glyphimage, glyphimage, glyphimage))
+    previmage.flags.writeable = False
+
+    previmage = _apply_layer(info, glyph, info.layers[0], previmage, glyphimage, pool)
+    previmage.flags.writeable = False
+
+    for layer in info.layers[1:]:
+        previmage = _apply_layer(info, glyph, layer, previmage, glyphimage, pool)
+        previmage.flags.writeable = False
+
+    for effect in info.posteffects:
+        previmage = effect.apply(info, glyph, previmage)
+        previmage.flags.writeable = False
+    
+    glyph.bitmap = _apply_background(info, previmage)
+
+
+class GlyphBatchError(Exception):
+    """ Raised when a set of glyphs cannot be processed as a batch """
+    pass
+
+
+def _is_batch_safe(fn):
+    return getattr(fn, 'batchsafe', False)
+
+
+class GlyphBatch(object):
+    """ A set of glyphs that are stacked into one array of glyph cells with shape (N, W, H).
+    The cells are a part of the info.maxsize area that the color functions work on, and each glyph is placed in
+    its cell at the same position as the color functions expect it to be.
+    
+    :param glyphs:    The glyphs in the batch
+    :param starty:    The offset of the cells within the info.maxsize area
+    :param cells:     The area of each cell that is covered by its glyph bitmap
+    :param outside:   A boolean array of shape (N, W, H, 1) that is set where the cells aren't covered by the glyphs
+    :param pool:      The scratch buffers for the temporary images of the batch
+    """
+    def __init__(self, info, glyphs):
+        self.info = info
+        self.glyphs = glyphs
+        
+        offsets = [info.maxbearingY - glyph.bearingY for glyph in glyphs]
+        self.starty = min(offsets)
+        endy = max(offset + glyph.bitmap.shape[1] for offset, glyph in zip(offsets, glyphs))
+        width = max(glyph.bitmap.shape[0] for glyph in glyphs)
+        
+        self.cells = []
+        for offset, glyph in zip(offsets, glyphs):
+            y = offset - self.starty
+            self.cells.append( (slice(0, glyph.bitmap.shape[0]), slice(y, y + glyph.bitmap.shape[1])) )
+        
+        self.glyphimage = np.zeros( (len(glyphs), width, endy - self.starty), glyphs[0].bitmap.dtype )
+        self.outside = np.ones( self.glyphimage.shape + (1,), bool )
+        for i, glyph in enumerate(glyphs):
+            self.glyphimage[i][self.cells[i]] = glyph.bitmap
+            self.outside[i][self.cells[i]] = False
+        self.glyphimage.flags.writeable = False
+        self.pool = fu.ScratchPool()
+    
+    def clip(self, image):
+        """ Clears the parts of the cells that lie outside the glyphs, which makes the result the same as if each glyph was processed on its own """
+        if image.ndim < 4:
+            # a color function returned the same image for all glyphs
+            batch = np.empty( (len(self.glyphs),) + image.shape, image.dtype )
+            batch[:] = image
+            image = batch
+        elif not image.flags.writeable:
+            image = image.copy()
+        np.copyto(image, 0, where=self.outside)
+        image.flags.writeable = False
+        return image
+    
+    def apply_per_glyph(self, fn, image):
+        """ Calls fn(index, glyph, cell) for each glyph and gathers the results into a new batch """
+        out = None
+        for i, glyph in enumerate(self.glyphs):
+            result = fn(i, glyph, self.cells[i])
+            if result.shape[:2] != glyph.bitmap.shape[:2]:
+                raise GlyphBatchError("The glyph '%s' changed size from %s to %s" % (glyph.unicode, str(glyph.bitmap.shape[:2]), str(result.shape[:2])))
+            if out is None:
+                out = np.zeros( image.shape[:3] + result.shape[2:], result.dtype )
+            out[i][self.cells[i]] = result
+        return out
+    
+    def apply_effect(self, effect, image):
+        info = self.info
+        if _is_batch_safe(effect):
+            return self.clip( effect.apply(info, self.glyphs, image) )
+        return self.apply_per_glyph( lambda i, glyph, cell: effect.apply(info, glyph, image[i][cell]), image )
+
+
+def _apply_layer_batch(info, batch, layer, previmage):
+    maxsize = info.maxsize
+    glyphimage = batch.glyphimage
+    
+    if _is_batch_safe(layer.color):
+        layer.set_info( batch.glyphs, info )
+        image = batch.clip( layer.apply_color( 0, batch.starty, glyphimage.shape[1:], maxsize, glyphimage, previmage ) )
+    else:
+        def apply_color(i, glyph, cell):
+            layer.set_info( glyph, info )
+            return layer.apply_color( 0, batch.starty + cell[1].start, glyph.bitmap.shape, maxsize, glyphimage[i][cell], previmage[i][cell] )
+        image = batch.apply_per_glyph( apply_color, previmage )
+    
+    layer.set_info( batch.glyphs, info )
+    
+    for effect in layer.effects:
+        image = batch.apply_effect( effect, image )
+        layer._verify( effect, image )
+    
+    if layer.mask is not None:
+        if _is_batch_safe(layer.mask):
+            fonteffects.DefaultMask.idx = np.where(glyphimage == 0)
+            image = batch.clip( layer.apply_mask( image ) )
+        else:
+            image = batch.apply_per_glyph( lambda i, glyph, cell: layer.mask.apply(info, glyph, image[i][cell].copy()), image )
+    
+    image = batch.clip( layer.apply_blend( glyphimage, previmage, image, batch.pool ) )
+    return image
+
+
+def _apply_layers_batch(info, glyphs):
+    batch = GlyphBatch(info, glyphs)
+    glyphimage = batch.glyphimage
+    
+    previmage = np.empty( glyphimage.shape + (4,), glyphimage.dtype )
+    previmage[:] = glyphimage[..., np.newaxis]
+    previmage.flags.writeable = False
+    
+    for layer in info.layers:
+        previmage = _apply_layer_batch(info, batch, layer, previmage)
+    
+    # The post effects are applied on the batch until one of them isn't batch safe (e.g. changes the glyph size).
+    # From there on, the glyphs are processed one by one.
+    posteffects = list(info.posteffects)
+    while posteffects and _is_batch_safe(posteffects[0]):
+        previmage = batch.apply_effect( posteffects.pop(0), previmage )
+    
+    for i, glyph in enumerate(glyphs):
+        image = previmage[i][batch.cells[i]]
+        for effect in posteffects:
+            image = effect.apply(info, glyph, image)
+            image.flags.writeable = False
+        
+        glyph.bitmap = _apply_background(info, image)
+
+
+def _apply_layers(info, options=None):
     
     #bbox = np.array( [0, 0] )
     width = 0
@@ -130,6 +296,40 @@ def _apply_layers(info):
     info.maxsize = bbox
     info.maxbearingY = max_bearing_y
 
+    glyphs = [glyph for glyph in info.glyphs if glyph.bitmap is not None]
+
+    cache = None
+    if getattr(options, 'cachedir', None):
+        cache = fontcache.GlyphCache(options.cachedir, options.cachesize * 1024 * 1024)
+        layerskey = fontcache.get_layers_key(options, info)
+        keys = dict( (glyph, fontcache.get_glyph_key(layerskey, glyph)) for glyph in glyphs )
+
+        missing = []
+        for glyph in glyphs:
+            bitmap = cache.get(keys[glyph])
+            if bitmap is None:
+                missing.append(glyph)
+            else:
+                bitmap.flags.writeable = False
+                glyph.bitmap = bitmap
+
+        logging.info("Found %d of %d glyphs in the cache %s" % (len(glyphs) - len(missing), len(glyphs), options.cachedir))
+        glyphs = missing
+
+    jobs = getattr(options, 'jobs', 1)
+    if jobs > 1 and len(glyphs) > 1:
+        _apply_layers_parallel(options, info, glyphs, jobs)
+    elif glyphs:
+        _set_dimensions(info)
+        _apply_layers_glyphs(info, glyphs)
+
+    if cache is not None:
+        for glyph in glyphs:
+            cache.put(keys[glyph], glyph.bitmap)
+        cache.trim()
+
+
+def _set_dimensions(info):
     elements = []
     for layer in info.layers:
         elements.append(layer)
@@ -138,38 +338,74 @@ def _apply_layers(info):
         if hasattr(element, 'set_dimensions'):
             element.set_dimensions(info.maxsize[0], info.maxsize[1])
 
-    for glyph in info.glyphs:
-        
-        if glyph.bitmap is None:
-            continue
 
-        glyphimage = glyph.bitmap
-        glyphimage.flags.writeable = False
+def _apply_layers_glyphs(info, glyphs):
+    if info.batchsize > 0:
+        # group glyphs of similar sizes together, to keep the cells small
+        glyphs.sort(key=lambda glyph: (glyph.bitmap.shape[1], glyph.bitmap.shape[0]))
 
-        # ????
-        fonteffects.DefaultMask.idx = np.where(glyphimage == 0)
-        
-        previmage = np.dstack((glyphimage, glyphimage, glyphimage, glyphimage))
-        previmage.flags.writeable = False
+        for i in xrange(0, len(glyphs), info.batchsize):
+            try:
+                _apply_layers_batch(info, glyphs[i:i + info.batchsize])
+            except GlyphBatchError, e:
+                logging.info("%s: Processing the remaining glyphs one by one", str(e))
+                glyphs = glyphs[i:]
+                break
+        else:
+            return
 
-        previmage = _apply_layer(info, glyph, info.layers[0], previmage, glyphimage)
-        previmage.flags.writeable = False
+    pool = fu.ScratchPool()
+    for glyph in glyphs:
+        _apply_layers_glyph(info, glyph, pool)
 
-        for layer in info.layers[1:]:
-            previmage = _apply_layer(info, glyph, layer, previmage, glyphimage)
-            previmage.flags.writeable = False
 
-        for effect in info.posteffects:
-            previmage = effect.apply(info, glyph, previmage)
-            previmage.flags.writeable = False
-        
-        bgimage = np.ones( previmage.shape, float) * (info.bgcolor[0], info.bgcolor[1], info.bgcolor[2], 0.0)
-        bgimage.flags.writeable = False
-        
-        previmage = fu.alpha_blend(bgimage, previmage)
-        previmage.flags.writeable = False
-        
-        glyph.bitmap = previmage
+# The font info of a worker process, see _init_worker()
+_worker_info = None
+
+def _init_worker(options, size, extrapadding, maxsize, maxbearingY):
+    """ Sets up a worker process with its own layers and font face,
+    since neither can be shared with the parent process
+    """
+    global _worker_info
+    info = SFontInfo(options)
+    info.size = size
+    info.face = ft.new_face( info.name )
+    info.extrapadding = extrapadding
+    info.maxsize = maxsize
+    info.maxbearingY = maxbearingY
+    _set_dimensions(info)
+    _worker_info = info
+
+
+def _apply_layers_worker(glyphs):
+    _apply_layers_glyphs(_worker_info, glyphs)
+    return [glyph.bitmap for glyph in glyphs]
+
+
+def _apply_layers_parallel(options, info, glyphs, jobs):
+    """ Shards the glyphs over a pool of processes and collects the finished bitmaps.
+    The chunks are kept in order, so the result is the same as the single process path
+    """
+    jobs = min(jobs, len(glyphs))
+    # a few chunks per process evens out the differences in glyph sizes
+    chunksize = (len(glyphs) + jobs * 4 - 1) / (jobs * 4)
+    chunks = [glyphs[i:i + chunksize] for i in xrange(0, len(glyphs), chunksize)]
+
+    logging.debug("Processing %d glyphs in %d chunks using %d processes" % (len(glyphs), len(chunks), jobs))
+
+    pool = multiprocessing.Pool(jobs, _init_worker, (options, info.size, info.extrapadding, info.maxsize, info.maxbearingY))
+    try:
+        results = pool.map(_apply_layers_worker, chunks)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    for chunk, bitmaps in zip(chunks, results):
+        for glyph, bitmap in zip(chunk, bitmaps):
+            glyph.bitmap = bitmap
 
 
 def _convert_int_to_unicode(char):
@@ -209,9 +445,13 @@ class Glyph(object):
     
     :param utf8:          The UTF-8 character code
     :param unicode:       The unicode letter
+    :param index:         The glyph index in the font face. Several letters may map to the same glyph
     :param bitmap:        The numpy array of shape (x, y, 4)
     :param bitmapbox:     The box in the texture where the glyph is printed.
                           A 4-tuple: (left, top, width, height)  *(In pixels)*
+    :param page:          The texture page the glyph is printed to
+    :param rotated:       True if the glyph is printed rotated 90 degrees clockwise in the bitmapbox.
+                          (Only if allowrotate is set)
     :param bearingX:      The distance from the cursor to the leftmost border of the bitmap
     :param bearingY:      The distance from the baseline to the topmost border of the bitmap
     :param advance:       The distance used to increment the cursor
@@ -219,13 +459,36 @@ class Glyph(object):
     def __init__(self, utf8, unicode):
         self.utf8 = utf8
         self.unicode = unicode
+        self.index = 0
         self.bitmap = None
         self.bitmapbox = None
+        self.page = 0
+        self.rotated = False
         self.bearingX = 0
         self.bearingY = 0
         self.advance = 0
 
 
+def _trim_glyphs(info):
+    """ Crops the fully transparent borders of the glyph bitmaps, and moves the bearings accordingly """
+    before = 0
+    after = 0
+    for glyph in info.glyphs:
+        if glyph.bitmap is None:
+            continue
+        before += glyph.bitmap.shape[0] * glyph.bitmap.shape[1]
+        bounds = fu.get_alpha_bounds(glyph.bitmap)
+        if bounds is None:
+            glyph.bitmap = None
+            continue
+        left, top, right, bottom = bounds
+        glyph.bitmap = glyph.bitmap[left:right, top:bottom]
+        glyph.bearingX += left
+        glyph.bearingY -= top
+        after += glyph.bitmap.shape[0] * glyph.bitmap.shape[1]
+    logging.debug("Trimmed the glyphs from %d to %d pixels" % (before, after))
+
+
 def _get_glyph_info(options, info, face):
     logging.debug("Fetching glyph info")
     
@@ -257,6 +520,7 @@ def _get_glyph_info(options, info, face):
         metrics = face.glyph.contents.metrics
 
         glyph = Glyph(c, unicode)
+        glyph.index = face.get_char_index(unicode)
         glyph.bearingX = (metrics.horiBearingX >> 6) + info.extrapadding[0]
         glyph.bearingY = (metrics.horiBearingY >> 6) + info.internalpadding[1] + info.extrapadding[1]
         glyph.advance = (metrics.horiAdvance >> 6) + info.extrapadding[2]
@@ -299,12 +563,19 @@ def render(options, info, face):
     # since the layers might set this, we set it back
     face.set_char_size( width=0, height=info.size * 64, hres=info.dpi, vres=info.dpi )
     
+    # the letters that map to the same glyph in the font are only rendered once
+    rendered = dict()
+    duplicates = []
     for glyph in info.glyphs:
+        if glyph.index in rendered:
+            duplicates.append( (glyph, rendered[glyph.index]) )
+            continue
+        rendered[glyph.index] = glyph
 
         face.load_char( glyph.unicode, flags )
 
         if face.glyph.contents.bitmap.rows:
-            glyph.bitmap = fu.make_array_from_bitmap(face.glyph.contents.bitmap)
+            glyph.bitmap = fu.make_array_from_bitmap(face.glyph.contents.bitmap).astype(info.dtype)
             shape = glyph.bitmap.shape
 
             glyph.bitmap = fu.pad_bitmap(glyph.bitmap, info.extrapadding[0], info.extrapadding[1], info.extrapadding[2], info.extrapadding[3], 0.0)
@@ -323,7 +594,15 @@ def render(options, info, face):
             logging.debug("char missing bitmap %X '%s'" % (glyph.utf8, glyph.unicode) )
 
     # Apply all layers on all the tiny bitmaps
-    _apply_layers(info)
+    _apply_layers(info, options)
+    
+    if duplicates:
+        logging.debug("Rendered %d glyphs for %d characters" % (len(rendered), len(info.glyphs)))
+    for glyph, original in duplicates:
+        glyph.bitmap = original.bitmap
+    
+    if info.trimglyphs:
+        _trim_glyphs(info)
     
     max_bearing_y = 0 # the maximum extent above the baseline
     min_bearing_y = 0 # the maximum extent below the baseline
@@ -347,23 +626,60 @@ def render(options, info, face):
     info.max_width = max_width
 
 
-def _get_pair_kernings(info, face):
-    characters = set([ glyph.utf8 for glyph in info.glyphs])
+def _read_font_kernings(info, face):
+    """ Reads the kerning table of the font, for the glyphs of all the letters.
+    Returns None if the font file has no table that can be read
+    """
+    glyphs = set()
+    for c in info.letters:
+        glyphs.add( face.get_char_index(_convert_int_to_unicode(c)) )
+    glyphs.discard(0)
+
+    fontkernings = fontkerning.read_kernings(info.name, glyphs)
+    if fontkernings is None:
+        logging.info("Found no kerning table in %s, querying each pair of glyphs instead" % info.name)
+    else:
+        logging.debug("Read %d pair kernings from %s" % (len(fontkernings), info.name))
+    return fontkernings
+
+
+def _get_pair_kernings(info, face, fontkernings=None):
+    """ Returns the pair kernings (in pixels) at the current size of the face.
+    The kernings are scaled from the font table, or queried from the face for each pair if there is no table
+    """
     pairkernings = dict()
-    for pair in itertools.product(characters, repeat=2):
-        prevc, c = pair
-        kerning = face.get_kerning(prevc, c)
-        if kerning.x != 0:
-            assert c < 0xFFFFFFFF
-            assert prevc < 0xFFFFFFFF
-            pairkernings[ _encode_pair(prevc, c) ] = kerning.x>>6
-            
-            #print "kerning %s, %s: %d" % (chr(prevc), chr(c), kerning.x>>6), '\t', '0x%016x' % _encode_pair(prevc, c)
+    if fontkernings is None:
+        # the pairs are looked up by the unicode letters, since the utf8 codes aren't character codes
+        characters = [ (glyph.utf8, glyph.unicode) for glyph in info.glyphs ]
+        for (prevc, prevunicode), (c, unicode) in itertools.product(characters, repeat=2):
+            kerning = face.get_kerning(prevunicode, unicode)
+            if kerning.x != 0:
+                pairkernings[ _encode_pair(prevc, c) ] = kerning.x>>6
+        return pairkernings
+
+    # several letters may map to the same glyph
+    characters = dict()
+    for glyph in info.glyphs:
+        if glyph.index:
+            characters.setdefault(glyph.index, []).append(glyph.utf8)
+
+    x_scale = face.size.x_scale
+    x_ppem = face.size.x_ppem
+    for (left, right), value in fontkernings.iteritems():
+        if left not in characters or right not in characters:
+            continue
+        kerning = fontkerning.scale_kerning(value, x_scale, x_ppem)
+        if kerning != 0:
+            for prevc in characters[left]:
+                for c in characters[right]:
+                    pairkernings[ _encode_pair(prevc, c) ] = kerning
     return pairkernings
 
 
 def compile(options):
-
+    """ Compiles the font and writes the texture and the glyph info.
+    Returns (info, pairkernings, image), or a list of them, one per size, if the font info specifies *sizes*
+    """
     info = SFontInfo(options)
 
     if not os.path.exists( info.name ):
@@ -371,12 +687,34 @@ def compile(options):
 
     face = ft.new_face( info.name )
 
+    # the kerning table is read once, and scaled to each size
+    fontkernings = None
+    if info.usepairkernings:
+        fontkernings = _read_font_kernings(info, face)
+
+    if not info.sizes:
+        return _compile_size(options, info, face, fontkernings)
+
+    # the sizes share the face and the layers, and each get their own copy of the per size state
+    results = []
+    for size in info.sizes:
+        logging.info("Compiling size %d" % size)
+        sizeinfo = copy.copy(info)
+        sizeinfo.size = size
+        sizeoptions = copy.copy(options)
+        sizeoptions.output = fu.get_size_path(options.output, size)
+        results.append( _compile_size(sizeoptions, sizeinfo, face, fontkernings) )
+    return results
+
+
+def _compile_size(options, info, face, fontkernings=None):
     # gather the glyph info
     _get_glyph_info(options, info, face)
 
-    pairkernings = None
+    # before the rendering, since the effects may change the size of the face
+    pairkernings = dict()
     if info.usepairkernings:
-        pairkernings = _get_pair_kernings(info, face)
+        pairkernings = _get_pair_kernings(info, face, fontkernings)
     
     # The actual compile step
     render(options, info, face)
@@ -384,16 +722,18 @@ def compile(options):
     # assemble into a texture
     image = info.texturerender( info )
 
-    pairkernings = dict()
-    if info.usepairkernings:
-        pairkernings = _get_pair_kernings(info, face)
-
     if not options.writetext:
         if not os.path.exists( os.path.dirname(options.output) ):
             os.makedirs(os.path.dirname(options.output))
             
         try:
-            info.texturewriter( options, info, image )
+            if isinstance(image, list):
+                for page, pageimage in enumerate(image):
+                    pageoptions = copy.copy(options)
+                    pageoptions.output = fu.get_page_path(options.output, page)
+                    info.texturewriter( pageoptions, info, pageimage )
+            else:
+                info.texturewriter( options, info, image )
         except Exception, e:
             raise fu.FontException('Failed to write texture: %s' % str(e) )
 
@@ -456,7 +796,7 @@ def write_text(options, info, pairkernings):
     texture_size = _calc_bbox(info, cinfo, pairkernings, options.writetext)
     texture_size = (texture_size[0]+info.padding*2+60, texture_size[1]+info.padding*2)
 
-    ones = np.ones(texture_size, float)
+    ones = np.ones(texture_size, info.dtype)
     
     bgcolor = info.bgcolor
     if options.bgcolor:
@@ -471,7 +811,7 @@ def write_text(options, info, pairkernings):
     b = ones * bgcolor[2]
     a = ones * bgcolor[3]
 
-    zeros = np.zeros(texture_size, float)
+    zeros = np.zeros(texture_size, info.dtype)
     image = np.dstack( (r,g,b,zeros) )
 
     x = 0
@@ -543,7 +883,7 @@ def write_text(options, info, pairkernings):
     logging.debug("Wrote %s" % options.output)
 
 
-def init():
+def init(args=None):
     parser = OptionParser()
     parser.add_option('-i', '--input', metavar='FILE', help='The input font (.fontinfo)')
     parser.add_option('-o', '--output', metavar='FILE', help='The output font (.fntb)')
@@ -553,8 +893,11 @@ def init():
     parser.add_option('-l', '--log', default='', help='A log file where the stdout is saved logged to.' )
     parser.add_option('-w', '--writetext', metavar='TEXT', help='When used, a .fontinfo file is used as input and the text is written into the output texture.')
     parser.add_option('--bgcolor', default='', metavar='COLOR', help='The background color used when writing text')
+    parser.add_option('-j', '--jobs', type='int', default=1, metavar='N', help='The number of processes used to render the glyphs and to try the packing methods')
+    parser.add_option('--cachedir', default='', metavar='DIRECTORY', help='A directory where the rendered glyphs are cached between runs')
+    parser.add_option('--cachesize', type='int', default=256, metavar='MB', help='The maximum size of the glyph cache (in megabytes)')
 
-    options, args = parser.parse_args()
+    options, args = parser.parse_args(args)
 
     if options.log:
         sys.stdout = LogStream(options.log)
@@ -568,12 +911,37 @@ def init():
         parser.error("The input file doesn't exist: %s" % options.input)
     if not options.endian in ['little', 'big']:
         parser.error("Invalid endianess: %s" % options.endian)
+    if options.jobs < 1:
+        parser.error("The number of jobs must be at least 1: %d" % options.jobs)
 
     logging.basicConfig(level=(logging.INFO if options.verbose else logging.WARN))
 
     return options
 
 
+def run(options):
+    """ Compiles the font, or writes the text, given the options from init().
+    Returns the font info, or a list of them, one per size, if the font info specifies *sizes*
+    """
+    options.endian = '<' if options.endian == 'little' else '>'
+
+    result = compile(options)
+    if not isinstance(result, list):
+        (info, pairkernings, image) = result
+        if options.writetext:
+            write_text(options, info, pairkernings)
+        return info
+
+    infos = []
+    for info, pairkernings, image in result:
+        if options.writetext:
+            textoptions = copy.copy(options)
+            textoptions.output = fu.get_size_path(options.output, info.size)
+            write_text(textoptions, info, pairkernings)
+        infos.append(info)
+    return infos
+
+
 if __name__ == '__main__':
     options = init()
 
@@ -581,12 +949,7 @@ if __name__ == '__main__':
         logging.info("Using freetype-%d.%d.%d" % ft.version() )
 
     try:
-        options.endian = '<' if options.endian == 'little' else '>'
-
-        (info, pairkernings, image) = compile(options)
-
-        if options.writetext:
-            write_text(options, info, pairkernings)
+        run(options)
 
     except fu.FontException, e:
         if '-v' in sys.argv:
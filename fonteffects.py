@@ -24,6 +24,7 @@ import editor.properties.propertytypes as prop
 #    http://stackoverflow.com/questions/5919663/how-does-photoshop-blend-two-images-together
 #    http://dunnbypaul.net/blends/
 #    DistanceFields: http://www.valvesoftware.com/publications/2007/SIGGRAPH2007_AlphaTestedMagnification.pdf
+#    Multi channel distance fields: https://github.com/Chlumsky/msdfgen
 
 # TODO:
 #    Bevel effect
@@ -47,6 +48,9 @@ def GetClassType(cls):
 
 def ColorFunction(cls):
     """ Registers a class as a color function
+
+    A color function that sets ``batchsafe = True`` promises that its apply() also works on a
+    batch of glyph cells, where the images have shape (N, W, H, 4) and the glyph argument is a list of glyphs.
     """
     assert( getattr(cls, '__call__') )
     WrapPropertyClass(cls)
@@ -65,6 +69,9 @@ def GetColorFunction(name):
 
 def EffectFunction(cls):
     """ Registers a class as a effect function
+
+    An effect that sets ``batchsafe = True`` promises that its apply() also works on a
+    batch of glyph cells, where the images have shape (N, W, H, 4) and the glyph argument is a list of glyphs.
     """
     assert( getattr(cls, '__call__') )
     WrapPropertyClass(cls)
@@ -127,6 +134,8 @@ class Solid(object):
     """
     color = prop.ColorProperty( (255,255,255) )
 
+    batchsafe = True
+
     def __init__(self, *k, **kw):
         for name, value in kw.iteritems():
             try:
@@ -140,7 +149,7 @@ class Solid(object):
             self.color = (self.color[0], self.color[1], self.color[2], 1.0)
 
     def apply(self, info, glyph, startx, starty, size, maxsize, glyphimage, previmage):
-        return previmage * self.color
+        return previmage * np.asarray(self.color, previmage.dtype)
 
 
 @ColorFunction
@@ -153,6 +162,8 @@ class Gradient(object):
     colors = [(0,0,0), (255,255,255)]
     angle = prop.AngleProperty( 120, help='The angle of rotation (in degrees)' )
 
+    batchsafe = True
+
     def __init__(self, *k, **kw):
         for name, value in kw.iteritems():
             try:
@@ -181,46 +192,43 @@ class Gradient(object):
         maxextents = np.sqrt( halfextents[0]*halfextents[0]*np.abs(normal[0]) + halfextents[1]*halfextents[1]*np.abs(normal[1]) )
         maxextents = np.round(maxextents)
 
-        data = np.empty((width,height,4), dtype=np.float32)
-        for x in xrange(0, width):
-            for y in xrange(0, height):
+        # project all the pixel positions onto the normal at once
+        vx = np.arange(width, dtype=float).reshape(-1, 1) - origin[0]
+        vy = np.arange(height, dtype=float).reshape(1, -1) - origin[1]
 
-                v = np.array([x,y], dtype=float)
-                v -= origin
+        d = ((vx * normal[0] + vy * normal[1]) / maxextents) / 2.0 + 0.5
+        d = np.clip( d, 0.0, 1.0 )
 
-                d = (np.dot(v, normal) / maxextents) / 2.0 + 0.5
-                d = np.clip( d, 0.0, 1.0 )
+        lenminusone = len(self.colors) - 1
 
-                lenminusone = len(self.colors) - 1
+        d *= lenminusone
+        index = d.astype(np.int32)
+        subunit = d % 1.0
 
-                index = int(d * lenminusone)
-                subunit = (d * lenminusone) % 1.0
-                if index == lenminusone:
-                    index -= 1
-                    subunit = 1.0
+        # the last color stop uses the end of the previous segment
+        last = index == lenminusone
+        index[last] -= 1
+        subunit[last] = 1.0
 
-                c1 = self.colors[index]
-                c2 = self.colors[index+1]
-                r = c1[0] + (c2[0] - c1[0]) * subunit
-                g = c1[1] + (c2[1] - c1[1]) * subunit
-                b = c1[2] + (c2[2] - c1[2]) * subunit
-                a = 1.0
+        colors = np.array(self.colors, dtype=float)
+        c1 = colors[index]
+        c2 = colors[index+1]
 
-                data[x,y] = (r,g,b,a)
+        data = np.empty((width,height,4), dtype=np.float32)
+        data[:, :, :3] = c1 + (c2 - c1) * subunit[:, :, np.newaxis]
+        data[:, :, 3] = 1.0
 
         self.bitmap = data
 
     def apply(self, info, glyph, startx, starty, size, maxsize, glyphimage, previmage):
-        bm = np.array(self.bitmap[startx:startx+size[0], starty:starty+size[1]])
-        assert bm.shape == previmage.shape, "Wrong sizes: %s != %s" % ( str(bm.shape), str(previmage.shape) )
+        bm = self.bitmap[startx:startx+size[0], starty:starty+size[1]]
+        assert bm.shape == previmage.shape[-3:], "Wrong sizes: %s != %s" % ( str(bm.shape), str(previmage.shape) )
         
-        idx = np.where(glyphimage == 0)
-        r,g,b = (bm[:,:,0], bm[:,:,1], bm[:,:,2])
-        r[idx] = 0
-        g[idx] = 0
-        b[idx] = 0
-        a = previmage[:, :, 3]
-        return np.dstack((r,g,b,a))
+        out = np.empty(previmage.shape, previmage.dtype)
+        out[..., :3] = bm[..., :3]
+        out[..., :3][glyphimage == 0] = 0
+        out[..., 3] = previmage[..., 3]
+        return out
 
 
 @ColorFunction
@@ -239,17 +247,19 @@ class Stripes(object):
 
     colors = [(0,0,0), (255,255,255)]
 
-    def __init__(self, *k, **kw):
-        self.width = self.__class__.width
-        self.offset = self.__class__.offset
-        self.angle = self.__class__.angle
-        self.colors = self.__class__.colors
+    batchsafe = True
 
+    def __init__(self, *k, **kw):
         for name, value in kw.iteritems():
             try:
                 setattr(self, name, eval(value) )
             except NameError:
                 setattr(self, name, value )
+
+        if self.width < 1:
+            raise FontEffectException("Stripes must have a width of at least 1 pixel")
+        if len(self.colors) < 2:
+            raise FontEffectException("Stripes must have more than one color to alternate between")
         self.colors = _convert_color_to_units( self.colors )
 
     def set_dimensions(self, width, height):
@@ -264,42 +274,27 @@ class Stripes(object):
         lengthsq = np.dot(normal,normal)
         normal /= np.sqrt(lengthsq)
 
-        # place the rotation in the middle and project a corner point
-        # onto the normal. Then we can find out the max extents of the blend
-        #origin = np.array([width/2.0, height/2.0])
+        # place the rotation in the middle and project all pixel positions
+        # onto the normal. The stripes run perpendicular to the normal
         origin = np.array( [np.round(width/2.0), np.round(height/2.0)], float)
-        maxextents = np.sqrt( np.dot( origin, origin ) )
-        maxextents = np.round(maxextents)
 
-        data = np.empty((width,height,4), dtype=np.float32)
-        for x in xrange(0, width):
-            for y in xrange(0, height):
+        vx = np.arange(width, dtype=float).reshape(-1, 1) - origin[0]
+        vy = np.arange(height, dtype=float).reshape(1, -1) - origin[1]
 
-                v = np.array([x,y], dtype=float)
-                v -= origin
+        d = vx * normal[0] + vy * normal[1] + self.offset
 
-                lengthsq = np.dot(v,v)
+        index = np.floor(d / self.width).astype(np.int32) % len(self.colors)
 
-                d = (np.dot( v, normal ) / maxextents) / 2.0 + 0.5
+        colors = np.array(self.colors, dtype=float)
 
-                unity = d
-
-                subunit = unity
-                invsubunit = 1 - subunit
-                index = 0
-
-                c1 = self.colors[index]
-                c2 = self.colors[index+1]
-                r = c1[0] * invsubunit + c2[0] * subunit
-                g = c1[1] * invsubunit + c2[1] * subunit
-                b = c1[2] * invsubunit + c2[2] * subunit
-
-                data[x,y] = (r,g,b, 1.0)
+        data = np.empty((width,height,4), dtype=np.float32)
+        data[:, :, :3] = colors[index]
+        data[:, :, 3] = 1.0
 
         self.bitmap = data
 
     def apply(self, info, glyph, startx, starty, size, maxsize, glyphimage, previmage):
-        return self.bitmap[startx:startx+size[0], starty:starty+size[1]]
+        return np.asarray(self.bitmap[startx:startx+size[0], starty:starty+size[1]], glyphimage.dtype)
 
 
 @ColorFunction
@@ -312,6 +307,8 @@ class Texture(object):
 
     name = prop.FileProperty( default='', help='The texture name relative to options.datadir.' )
 
+    batchsafe = True
+
     def __init__(self, *k, **kw):
         options = k[0]
         for name, value in kw.iteritems():
@@ -346,7 +343,7 @@ class Texture(object):
             self.bitmap = np.concatenate( (self.bitmap, self.bitmap), axis=1)
 
     def apply(self, info, glyph, startx, starty, size, maxsize, glyphimage, previmage):
-        return self.bitmap[startx:startx+size[0], starty:starty+size[1]]
+        return np.asarray(self.bitmap[startx:startx+size[0], starty:starty+size[1]], glyphimage.dtype)
 
 
 @EffectFunction
@@ -357,11 +354,16 @@ class Outline(object):
     :param opacity: The opacity of the color [0,100]
     :param width:   The width of the outline
     :param spread:  The radius of the blur of the outline
+    :param method:  'disc' makes an exactly round outline. 'octagon' approximates the disc with an octagon,
+                    which takes the same time for all widths (see utils.maximum_octagon)
     """
     color = prop.ColorProperty( (0, 0, 0) )
     opacity = prop.OpacityProperty( 100 )
     width = prop.Size1DProperty( 1 )
     spread = prop.Size1DProperty( 0 )
+    method = prop.StringProperty( 'disc' )
+
+    batchsafe = True
 
     def __init__(self, *k, **kw):
         """
@@ -378,6 +380,8 @@ class Outline(object):
 
         self.color = [ float(x) / 255.0 for x in self.color]
         self.opacity = float(self.opacity) / 100.0
+        if self.method not in ('disc', 'octagon'):
+            raise FontEffectException("Unknown outline method: %s" % self.method)
         self.kernel = fu.create_2d_circle_kernel(self.width)
         
         r = self.width + self.spread
@@ -385,7 +389,10 @@ class Outline(object):
         """ Return the amount of padding needed to fit the effect as a 4 tuple (left, top, right, bottom) """ 
 
     def apply(self, info, glyph, image):        
-        out = utils.maximum(image, self.kernel)
+        if self.method == 'octagon':
+            out = utils.maximum_octagon(image, self.width)
+        else:
+            out = utils.maximum(image, self.kernel)
         
         if self.spread:
             out = fu.blur_image(out, self.spread)
@@ -397,7 +404,7 @@ class Outline(object):
         b[a > 0] = self.color[2]
         a[a > 0] = self.opacity
 
-        return fu.alpha_blend(out, image)
+        return fu.alpha_blend(out, image, out=out)
 
 
 @EffectFunction
@@ -415,6 +422,8 @@ class DropShadow(object):
     size = 1
     #: The offset of the shadow
     distance = 3
+    #: How the shadow is blurred: 'kernel' or 'iir' (see fontutils.blur_image)
+    method = 'kernel'
 
     def __init__(self, *k, **kw):
         """
@@ -436,6 +445,9 @@ class DropShadow(object):
             except NameError:
                 setattr(self, name, value )
 
+        if self.method not in ('kernel', 'iir'):
+            raise FontEffectException("Unknown blur method: %s" % self.method)
+
         self.color = [ float(x) / 255.0 for x in self.color]
         self.opacity = float(self.opacity) / 100.0
         self.angle = float(self.angle)
@@ -470,14 +482,14 @@ class DropShadow(object):
         # replace the color
         r, g, b, a = fu.split_channels(shadowbitmap)
 
-        shadowbitmap = np.dstack( (r, g, b, a) ) * (self.color[0], self.color[1], self.color[2], self.opacity)
+        shadowbitmap = np.dstack( (r, g, b, a) ) * np.asarray( (self.color[0], self.color[1], self.color[2], self.opacity), image.dtype )
 
-        shadowbitmap = fu.blur_image(shadowbitmap, self.size)
+        shadowbitmap = fu.blur_image(shadowbitmap, self.size, self.method)
 
         topbitmap = np.zeros_like( shadowbitmap )
         topbitmap[:image.shape[0], :image.shape[1], :] = image
 
-        return fu.alpha_blend(shadowbitmap, topbitmap)
+        return fu.alpha_blend(shadowbitmap, topbitmap, out=shadowbitmap)
 
 
 @EffectFunction
@@ -487,6 +499,10 @@ class GaussianBlur(object):
     
     #: The radius (in pixels) of the kernel
     size = 1
+    #: 'kernel' or 'iir', which is faster for large sizes (see fontutils.blur_image)
+    method = 'kernel'
+
+    batchsafe = True
 
     def __init__(self, *k, **kw):
         """
@@ -500,10 +516,12 @@ class GaussianBlur(object):
             except NameError:
                 setattr(self, name, value )
                 
+        if self.method not in ('kernel', 'iir'):
+            raise FontEffectException("Unknown blur method: %s" % self.method)
         self.padding = (self.size, self.size, self.size, self.size)
 
     def apply(self, info, glyph, image):
-        return fu.blur_image(image, self.size)
+        return fu.blur_image(image, self.size, self.method)
 
 
 @EffectFunction
@@ -515,6 +533,8 @@ class KernelBlur(object):
     #: The center value of the kernel
     strength = 1
 
+    batchsafe = True
+
     def __init__(self, *k, **kw):
         """
         @param size        The size of the kernel
@@ -546,6 +566,12 @@ class DistanceField(object):
     size = 16
     #: The number of times the glyph is enlarged before the glyph is rendered.
     factor = 4
+    #: How the distance field is calculated. 'raster' renders the glyph at factor times the size and down scales the result.
+    #: 'antialiased' estimates the edges from an anti-aliased rendering at the actual size, which is much faster and uses less memory.
+    mode = 'raster'
+    #: The distance transform: 'sedt', 'exact' or 'antialiased' (see utils.calculate_edt).
+    #: Defaults to 'sedt' in the raster mode and to 'antialiased' in the antialiased mode.
+    method = None
 
     def __init__(self, *k, **kw):
         self.size = self.__class__.size
@@ -563,6 +589,41 @@ class DistanceField(object):
         self.max_dim = (width, height)
 
     def apply(self, info, glyph, startx, starty, size, maxsize, glyphimage, previmage):
+        if self.mode == 'antialiased':
+            i = self._calculate_antialiased(info, glyph, glyphimage.dtype)
+        elif self.mode == 'raster':
+            i = self._calculate_raster(info, glyph, glyphimage.dtype)
+        else:
+            raise FontEffectException("Unknown distance field mode: %s" % self.mode)
+
+        a = np.zeros_like(i)
+        a[i > 0] = 1.0
+        
+        return np.dstack( (i, i, i, a) )
+
+    def _calculate_antialiased(self, info, glyph, dtype):
+        face = info.face
+        flags = ft.LOAD_RENDER | ft.LOAD_TARGET_NORMAL
+
+        face.set_char_size( width=0, height=info.size*64, hres=info.dpi, vres=info.dpi )
+        face.load_char( glyph.unicode, flags )
+
+        if not face.glyph.contents.bitmap.rows:
+            # nothing is covered, so all pixels are outside
+            return np.zeros(glyph.bitmap.shape[:2], dtype)
+
+        bitmap = fu.make_array_from_bitmap(face.glyph.contents.bitmap).astype(dtype) / 255.0
+
+        metrics = face.glyph.contents.metrics
+        bearingY = (metrics.horiBearingY >> 6) + info.internalpadding[1] + info.extrapadding[1]
+        offset_y = bearingY - glyph.bearingY
+
+        bitmap = fu.pad_bitmap(bitmap, info.extrapadding[0], info.extrapadding[1] - offset_y, info.extrapadding[2], info.extrapadding[3] + offset_y, 0.0)
+
+        # the size is given in pixels of the enlarged glyph
+        return utils.calculate_edt(bitmap, float(self.size) / self.factor, method=self.method or 'antialiased')
+
+    def _calculate_raster(self, info, glyph, dtype):
         factor = self.factor
         face = info.face
         flags = ft.LOAD_RENDER | ft.LOAD_TARGET_MONO
@@ -585,19 +646,235 @@ class DistanceField(object):
         e[:, :] = bitmap
         bitmap = e
         
-        i = utils.calculate_sedt(bitmap, self.size)
+        i = utils.calculate_edt(bitmap, self.size, method=self.method or 'sedt')
         #i = bitmap
         
-        while factor > 1:
-            i = utils.half_size(i)
-            factor /= 2
-        
-        i = i.astype(np.float64) / 255.0
-        
-        a = np.zeros_like(i)
-        a[i > 0] = 1.0
+        i = utils.downsample(i, factor)
         
-        return np.dstack( (i, i, i, a) )
+        return i.astype(dtype) / 255.0
+
+
+# The edge colors of the multi channel distance field, as bit masks of the rgb channels
+_BLACK = 0
+_RED = 1
+_GREEN = 2
+_YELLOW = 3
+_BLUE = 4
+_MAGENTA = 5
+_CYAN = 6
+_WHITE = 7
+
+def _switch_color(color, banned=_BLACK):
+    """ Picks the next edge color, so that two neighbouring edges always share exactly one channel """
+    combined = color & banned
+    if combined in (_RED, _GREEN, _BLUE):
+        return combined ^ _WHITE
+    if color in (_BLACK, _WHITE):
+        return _CYAN
+    shifted = color << 1
+    return (shifted | shifted >> 3) & _WHITE
+
+
+def _flatten_segment(segment, steps):
+    """ Returns steps+1 points along a line, conic or cubic bezier segment """
+    t = np.linspace(0.0, 1.0, steps + 1)[:, None]
+    p = np.array(segment, float)
+    if len(p) == 2:
+        return p[0] + t * (p[1] - p[0])
+    if len(p) == 3:
+        return (1-t)**2 * p[0] + 2*(1-t)*t * p[1] + t**2 * p[2]
+    return (1-t)**3 * p[0] + 3*(1-t)**2*t * p[1] + 3*(1-t)*t**2 * p[2] + t**3 * p[3]
+
+
+def _split_segment(segment):
+    """ Splits a bezier segment in three (de Casteljau) """
+    p = [np.array(x, float) for x in segment]
+    def split(p, t):
+        left, right = [p[0]], [p[-1]]
+        while len(p) > 1:
+            p = [a + (b - a) * t for a, b in zip(p[:-1], p[1:])]
+            left.append(p[0])
+            right.append(p[-1])
+        return left, right[::-1]
+    first, rest = split(p, 1.0/3.0)
+    second, third = split(rest, 0.5)
+    return [ [tuple(x) for x in part] for part in (first, second, third) ]
+
+
+def _segment_directions(segment):
+    """ The directions at the start and at the end of a segment """
+    p = np.array(segment, float)
+    start = p[1] - p[0] if (p[1] != p[0]).any() else p[-1] - p[0]
+    end = p[-1] - p[-2] if (p[-1] != p[-2]).any() else p[-1] - p[0]
+    return start / (np.linalg.norm(start) or 1.0), end / (np.linalg.norm(end) or 1.0)
+
+
+def _color_contour(segments, crossthreshold):
+    """ Assigns channels to the segments of a contour, so that the segments that meet at a corner
+    don't share all channels (see Chlumsky, "Shape decomposition for multi-channel distance fields")
+
+    Returns the (possibly split) segments and their colors
+    """
+    directions = [_segment_directions(segment) for segment in segments]
+    corners = []
+    for i in xrange(len(segments)):
+        a = directions[i-1][1]
+        b = directions[i][0]
+        if np.dot(a, b) <= 0 or abs(a[0]*b[1] - a[1]*b[0]) > crossthreshold:
+            corners.append(i)
+
+    if not corners:
+        return segments, [_WHITE] * len(segments)
+
+    if len(corners) == 1:
+        # A "teardrop" shape: the single smooth edge is split into three colors
+        start = corners[0]
+        segments = segments[start:] + segments[:start]
+        while len(segments) < 3:
+            segments = [part for segment in segments for part in _split_segment(segment)]
+        color = _switch_color(_WHITE)
+        colors = [color, _WHITE, _switch_color(color)]
+        m = len(segments)
+        return segments, [ colors[int(3 + 2.875 * i / (m - 1) - 1.4375 + 0.5) - 2] for i in xrange(m) ]
+
+    colors = [None] * len(segments)
+    color = _switch_color(_WHITE)
+    initialcolor = color
+    spline = 0
+    start = corners[0]
+    for i in xrange(len(segments)):
+        index = (start + i) % len(segments)
+        if spline + 1 < len(corners) and corners[spline + 1] == index:
+            spline += 1
+            color = _switch_color(color, initialcolor if spline == len(corners) - 1 else _BLACK)
+        colors[index] = color
+    return segments, colors
+
+
+@ColorFunction
+class MultiChannelDistanceField(object):
+    """ Calculates a multi channel signed distance field (MSDF) from the glyph outline.
+
+    The edges of the outline are assigned different color channels at the corners, and each channel
+    holds the distance to its edges. The median of the three channels reconstructs the sharp corners,
+    which a single channel distance field rounds off. Use it with mask=None, and render the text with
+    a shader that uses median(r, g, b) as the distance.
+
+    :param size:        The spread (in pixels) of the distance field
+    :param angle:       The minimum change of direction (in degrees) between two edges for them to form a corner
+    """
+    size = prop.FloatProperty( 4, min=1, max=256, help='The spread (in pixels) of the distance field' )
+    angle = prop.AngleProperty( 8, help='The minimum change of direction (in degrees) between two edges for them to form a corner' )
+
+    def __init__(self, *k, **kw):
+        for name, value in kw.iteritems():
+            try:
+                setattr(self, name, eval(value) )
+            except NameError:
+                setattr(self, name, value )
+
+        padding = int(np.ceil(self.size))
+        self.padding = (padding, padding, padding, padding)
+
+    def _load_outline(self, info, glyph):
+        flags = ft.LOAD_NO_BITMAP
+        # use the same hinting as when the glyph was rendered
+        antialias = getattr(info, 'antialias', 'normal')
+        if antialias == 'none':
+            flags |= ft.LOAD_TARGET_MONO
+        elif antialias == 'light':
+            flags |= ft.LOAD_TARGET_LIGHT
+        elif antialias == 'normal':
+            flags |= ft.LOAD_TARGET_NORMAL
+
+        face = info.face
+        face.set_char_size( width=0, height=info.size*64, hres=info.dpi, vres=info.dpi )
+        face.load_char( glyph.unicode, flags )
+        return fu.get_outline_contours(face.glyph.contents.outline)
+
+    def apply(self, info, glyph, startx, starty, size, maxsize, glyphimage, previmage):
+        width, height = size[0], size[1]
+        contours = self._load_outline(info, glyph)
+
+        crossthreshold = np.sin(self.angle / 180.0 * np.pi)
+        edges = []
+        for contour in contours:
+            segments, colors = _color_contour(contour, crossthreshold)
+            for segment, color in zip(segments, colors):
+                # approximate curves with lines about a pixel long
+                length = sum( np.hypot(b[0] - a[0], b[1] - a[1]) for a, b in zip(segment[:-1], segment[1:]) )
+                steps = 1 if len(segment) == 2 else int(min(32, max(2, np.ceil(length))))
+                edges.append( (_flatten_segment(segment, steps), color) )
+
+        values = np.zeros( (width, height, 3), glyphimage.dtype )
+        if not edges:
+            return np.dstack( (values, np.zeros( (width, height), glyphimage.dtype )) )
+
+        # the rendered bitmap starts at the pixel grid aligned bounding box of the outline control points
+        allpoints = np.array( [point for contour in contours for segment in contour for point in segment] )
+        left = np.floor(allpoints[:, 0].min())
+        top = np.ceil(allpoints[:, 1].max())
+
+        x = left + np.arange(width) - info.extrapadding[0] + 0.5
+        y = top - np.arange(height) + info.extrapadding[1] - 0.5
+        px, py = [a.ravel() for a in np.meshgrid(x, y, indexing='ij')]
+
+        # the outer contours are clockwise in TrueType fonts and counter clockwise in PostScript fonts
+        area = sum( np.sum(points[:-1, 0] * points[1:, 1] - points[1:, 0] * points[:-1, 1]) for points, color in edges )
+        orientation = 1.0 if area > 0 else -1.0
+
+        bestdistance = np.empty( (3, px.size) )
+        bestdistance.fill(np.inf)
+        bestorthogonality = np.ones( (3, px.size) )
+        bestvalue = np.zeros( (3, px.size) )
+
+        for points, color in edges:
+            a = points[:-1, :, None]
+            ab = points[1:, :, None] - a
+            lengthsq = np.maximum( ab[:, 0]**2 + ab[:, 1]**2, 1e-12 )
+            aqx = px[None, :] - a[:, 0]
+            aqy = py[None, :] - a[:, 1]
+            t = (aqx * ab[:, 0] + aqy * ab[:, 1]) / lengthsq
+            tc = np.clip(t, 0.0, 1.0)
+            dx = aqx - tc * ab[:, 0]
+            dy = aqy - tc * ab[:, 1]
+            distances = np.hypot(dx, dy)
+
+            # the closest line piece of the edge
+            j = np.argmin(distances, axis=0)
+            pixels = np.arange(px.size)
+            distance = distances[j, pixels]
+            abx, aby = ab[j, 0, 0], ab[j, 1, 0]
+            length = np.sqrt(lengthsq[j, 0])
+            dirx, diry = abx / length, aby / length
+            cross = (dirx * aqy[j, pixels] - diry * aqx[j, pixels]) * orientation
+            sign = np.where(cross >= 0, 1.0, -1.0)
+
+            safe = np.maximum(distance, 1e-12)
+            orthogonality = np.abs( (dirx * dx[j, pixels] + diry * dy[j, pixels]) / safe )
+
+            # beyond the ends of the edge, the distance to the extended edge is used (pseudo distance)
+            value = sign * distance
+            beyond = ((j == 0) & (t[j, pixels] < 0)) | ((j == len(ab) - 1) & (t[j, pixels] > 1))
+            pseudo = beyond & (np.abs(cross) <= distance)
+            value[pseudo] = cross[pseudo]
+
+            for channel in xrange(3):
+                if not color & (1 << channel):
+                    continue
+                better = (distance < bestdistance[channel] - 1e-9) | ((distance <= bestdistance[channel] + 1e-9) & (orthogonality < bestorthogonality[channel]))
+                bestdistance[channel][better] = distance[better]
+                bestorthogonality[channel][better] = orthogonality[better]
+                bestvalue[channel][better] = value[better]
+
+        values = np.clip(bestvalue / self.size * 0.5 + 0.5, 0.0, 1.0)
+        values = values.T.reshape( (width, height, 3) )
+
+        values = values.astype(glyphimage.dtype)
+        a = np.zeros( (width, height), glyphimage.dtype )
+        a[values.max(axis=2) > 0] = 1.0
+
+        return np.dstack( (values, a) )
 
 
 @EffectFunction
@@ -614,16 +891,13 @@ class Halfsize(object):
                 setattr(self, name, value )
 
     def apply(self, glyph, info, image):
-        for n in xrange(self.factor):
-            out = utils.half_size(image)
-            image = out
-
-        return out
+        return utils.downsample(image, 2 ** self.factor)
 
 
 #To be used as a mask for each layer
 class DefaultMask(object):
     idx = None
+    batchsafe = True
 
     def apply(self, info, glyph, image):
         try:
@@ -690,11 +964,23 @@ class Layer(object):
             return image
         return image
     
-    def apply_blend(self, glyphimage, previmage, image):
+    def apply_blend(self, glyphimage, previmage, image, pool=None):
         if self.blend is not None:
-            image = np.clip( image, 0.0, 1.0 )
-            image = self.blend(base=previmage, blend=image)
-            image = fu.alpha_blend(previmage, image * self.opacity)
+            mode = fb.NATIVE_MODES.get(self.blend)
+            if mode is not None and utils.has_blend() and image.dtype == previmage.dtype and image.dtype in (np.float32, np.float64):
+                image = utils.blend(previmage, image, mode, self.opacity)
+                self._verify(self.blend, image)
+                return image
+            
+            # the temporary images are kept in one scratch buffer
+            pool = pool or fu.ScratchPool()
+            scratch = pool.get(image.shape, np.result_type(image, previmage))
+            np.clip( image, 0.0, 1.0, scratch )
+            blended = self.blend(base=previmage, blend=scratch, out=scratch)
+            if blended is not scratch or self.opacity != 1.0:
+                np.multiply(blended, self.opacity, scratch)
+            image = fu.alpha_blend(previmage, scratch)
+            pool.put(scratch)
             self._verify(self.blend, image)
         return image
 
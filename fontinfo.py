@@ -11,6 +11,14 @@ The font info reads the .fontinfo and creates the layers, effects, and blends
 .. py:attribute:: size = 32
 
     The size of the font (in pixels)
+
+.. py:attribute:: sizes = ''
+
+    A comma separated list of sizes (in pixels), e.g. *sizes = 12, 16, 24, 32*.
+    If set, the font is rendered once for each size in the same run, and *size* is ignored.
+    The font face and the layers and effects are shared between the sizes.
+    Each size is written as a separate texture and glyph info, with the size added to the output name:
+    'font.png' -> 'font_16px.png'
     
 .. py:attribute:: leading = 0.0
 
@@ -42,6 +50,28 @@ The font info reads the .fontinfo and creates the layers, effects, and blends
 .. py:attribute:: usepairkernings = 1
 
     Enables the collecting of the pair kernings table.
+    The kernings are read from the 'kern' or 'GPOS' table of the font (see :doc:`fontkerning`),
+    and are queried from FreeType for each pair of letters if the font isn't a TrueType/OpenType font.
+
+.. py:attribute:: batchsize = 0
+
+    The number of glyphs that are run through the layers and post effects at once.
+    The glyph cells are stacked into one array, so each color function, effect and blend function is applied
+    once per batch instead of once per glyph. Functions that aren't batch safe are still applied per glyph.
+    Set to 0 to process the glyphs one by one.
+
+.. py:attribute:: trimglyphs = 0
+
+    If set, the fully transparent borders of each glyph are cropped after the post effects,
+    and the bearings are adjusted to match. This saves texture space, since the glyph cells are padded
+    to make room for the effects, e.g. a small glyph like '.' otherwise keeps the full padding on all sides.
+    Glyphs that are fully transparent are written without a bitmap, like the space.
+
+.. py:attribute:: precision = float32
+
+    The floating point type of the images in the layers, effects and blends, and of the texture.
+    One of **'float32'** and **'float64'**. The results of the two agree within one step of an 8 bit color channel,
+    and float32 is faster and uses half the memory.
 
 .. py:attribute:: letters = 20-7e
 
@@ -92,16 +122,19 @@ The font info reads the .fontinfo and creates the layers, effects, and blends
 
 """
 import os, sys, struct
+import numpy as np
 from ConfigParser import SafeConfigParser
 from fontutils import FontException
 import fontblend
 import fonteffects
+import editor.properties.propertytypes as prop
 
 
 def GetDefaultOptions():
     defaults = dict()
     defaults['name'] = 'not set'
     defaults['size'] = '32'
+    defaults['sizes'] = ''
     defaults['leading'] = '0.0'
     defaults['tracking'] = '0.0'
     defaults['dpi'] = '72'
@@ -109,6 +142,9 @@ def GetDefaultOptions():
     defaults['internalpadding'] = '0, 0'
     defaults['useadvanceaswidth'] = '0'  # E.g. set to 1 for japanese fonts
     defaults['usepairkernings'] = '1'
+    defaults['batchsize'] = '0'
+    defaults['trimglyphs'] = '0'
+    defaults['precision'] = 'float32'
     
     defaults['letters'] = '20-7e'
     defaults['bgcolor'] = '0, 0, 0'
@@ -119,6 +155,13 @@ def GetDefaultOptions():
     
     defaults['texturerender'] = 'fonttex_bitmap'
     defaults['texturesize'] = '512, 512'
+    defaults['autotexturesize'] = '0'
+    defaults['texturesizemultiple'] = '0'
+    defaults['texturepages'] = '1'
+    defaults['packingmethod'] = 'skyline_bl'
+    defaults['packingorder'] = 'height'
+    defaults['packingbestfit'] = '0'
+    defaults['allowrotate'] = '0'
     defaults['textureoffset'] = '0, 0'
     defaults['usepremultipliedalpha'] = '0'
     
@@ -154,11 +197,14 @@ class SFontInfo(object):
                 setattr(self, name, defaults[name] )
 
         self.functionlist = dict()
+        # the raw parameters of each function, e.g. used for identifying the cached glyphs
+        self.functionsource = dict()
         
         for section in cfg.sections():
             if section in ['default']:
                 continue
 
+            self.functionsource[section] = sorted(cfg.items(section, raw=True))
             vars = dict(cfg.items(section))
             vars['section'] = section
 
@@ -173,6 +219,15 @@ class SFontInfo(object):
             self.functionlist[section] = cls(options, **vars)
             self.functionlist[section].name = section
 
+        # the files that the font is created from, e.g. used for incremental builds
+        self.dependencies = [os.path.abspath(options.input)]
+        for section in sorted(self.functionlist.iterkeys()):
+            fn = self.functionlist[section]
+            for name, info in getattr(fn, '__properties', dict()).iteritems():
+                value = getattr(fn, name)
+                if isinstance(info, prop.FileProperty) and value:
+                    self.dependencies.append( os.path.abspath(os.path.join(options.datadir, value)) )
+
         d = dict()
         d.update( self.functionlist )
         d.update( fontblend.BLENDFUNCTIONS )
@@ -181,6 +236,9 @@ class SFontInfo(object):
         if not cfg.has_option('default', 'layers'):
             raise FontException("A font must have at least one layer")
 
+        # the layer setup before it's evaluated, e.g. used for identifying the cached glyphs
+        self.layersource = (self.layers, self.posteffects)
+
         self.layers = eval( cfg.get("default", "layers"), d, d )
         if cfg.has_option('default', 'posteffects'):
             self.posteffects = eval( cfg.get("default", "posteffects"), d, d )
@@ -189,14 +247,28 @@ class SFontInfo(object):
 
         if not os.path.isabs(self.name):
             self.name = os.path.join( os.path.dirname(options.input), self.name )
+        self.dependencies.append( os.path.abspath(self.name) )
 
         self.leading = float(eval(self.leading))
         self.tracking = float(eval(self.tracking))
 
         self.size = int(eval(self.size))
+        self.sizes = [ int(size) for size in self.sizes.split(',') if size.strip() ]
+        for size in self.sizes:
+            if size <= 0:
+                raise FontException("Invalid font size: %d" % size)
         self.dpi = int(self.dpi)
         self.texturesize = tuple( map( int, self.texturesize.split(',') ) )
         self.textureoffset = tuple( map( int, self.textureoffset.split(',') ) )
+        self.autotexturesize = int(self.autotexturesize)
+        self.texturesizemultiple = int(self.texturesizemultiple)
+        self.texturepages = int(self.texturepages)
+        self.packingmethod = self.packingmethod.strip().lower()
+        self.packingorder = self.packingorder.strip().lower()
+        self.packingbestfit = int(self.packingbestfit)
+        self.allowrotate = int(self.allowrotate)
+        self.jobs = getattr(options, 'jobs', 1)
+        self.pagecount = 1
 
         texturerender = __import__(self.texturerender)
         texturerender = getattr(texturerender, 'render', None)
@@ -223,6 +295,12 @@ class SFontInfo(object):
         self.internalpadding = tuple( map( int, self.internalpadding.split(',') ) )
         self.useadvanceaswidth = int(self.useadvanceaswidth)
         self.usepairkernings = int(self.usepairkernings)
+        self.batchsize = int(self.batchsize)
+        self.trimglyphs = int(self.trimglyphs)
+        self.precision = self.precision.strip().lower()
+        if self.precision not in ('float32', 'float64'):
+            raise FontException("Unknown precision '%s'. Must be one of: float32, float64" % self.precision)
+        self.dtype = np.dtype(self.precision)
         self.usepremultipliedalpha = int(self.usepremultipliedalpha)
 
         self.bgcolor = eval(self.bgcolor)
@@ -235,6 +313,8 @@ class SFontInfo(object):
             letters_path = os.path.join( os.path.dirname(options.input), self.letters )
                                       
         if os.path.exists(letters_path):
+            self.dependencies.append( os.path.abspath(letters_path) )
+
             with open(letters_path, 'rb') as f:
                 data = f.read()
             
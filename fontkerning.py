@@ -0,0 +1,279 @@
+"""
+Copyright @ 2013 Mathias Westerdahl
+
+Reads the pair kernings of a TrueType/OpenType font directly from its 'kern' or 'GPOS' table.
+
+Asking FreeType for the kerning of every pair of glyphs is quadratic in the number of glyphs,
+while the tables only list the pairs that are actually kerned.
+The values are in font units, and are scaled to a font size with :py:func:`scale_kerning`.
+
+The 'kern' table is used if the font has one, since that is the table that FreeType reads.
+Otherwise the pair adjustments (lookup type 2) of the 'kern' feature in the 'GPOS' table are used.
+"""
+
+import struct, bisect, logging
+
+# The lookup types of the GPOS table
+_PAIR_ADJUSTMENT = 2
+_EXTENSION = 9
+
+# The 'kern' subtable coverage flags
+_KERN_HORIZONTAL = 0x01
+_KERN_MINIMUM = 0x02
+_KERN_CROSS_STREAM = 0x04
+_KERN_OVERRIDE = 0x08
+_KERN_APPLE_VERTICAL = 0x8000
+_KERN_APPLE_CROSS_STREAM = 0x4000
+_KERN_APPLE_VARIATION = 0x2000
+
+# The value record flag of the x advance of a glyph
+_X_ADVANCE = 0x0004
+
+
+def _u16(data, offset):
+    return struct.unpack_from('>H', data, offset)[0]
+
+def _s16(data, offset):
+    return struct.unpack_from('>h', data, offset)[0]
+
+def _u32(data, offset):
+    return struct.unpack_from('>I', data, offset)[0]
+
+
+def _get_tables(data, index):
+    """ Returns the offsets of the tables of the font, or None if it isn't a TrueType/OpenType font """
+    offset = 0
+    if data[:4] == 'ttcf':
+        if index >= _u32(data, 8):
+            return None
+        offset = _u32(data, 12 + index * 4)
+    if data[offset:offset + 4] not in ('\x00\x01\x00\x00', 'OTTO', 'true'):
+        return None
+
+    tables = dict()
+    for i in xrange(_u16(data, offset + 4)):
+        record = offset + 12 + i * 16
+        tables[data[record:record + 4]] = _u32(data, record + 8)
+    return tables
+
+
+def _read_kern_pairs(data, offset, glyphs, override, kernings):
+    """ Reads the pairs of a format 0 subtable, starting at the number of pairs """
+    for i in xrange(_u16(data, offset)):
+        left, right, value = struct.unpack_from('>HHh', data, offset + 8 + i * 6)
+        if left in glyphs and right in glyphs:
+            if override:
+                kernings[(left, right)] = value
+            else:
+                kernings[(left, right)] = kernings.get((left, right), 0) + value
+
+
+def _read_kern(data, offset, glyphs):
+    kernings = dict()
+    if _u16(data, offset) == 0:
+        # the Microsoft/OpenType version
+        position = offset + 4
+        for i in xrange(_u16(data, offset + 2)):
+            coverage = _u16(data, position + 4)
+            flags = coverage & 0xFF
+            if coverage >> 8 == 0 and flags & (_KERN_HORIZONTAL | _KERN_MINIMUM | _KERN_CROSS_STREAM) == _KERN_HORIZONTAL:
+                _read_kern_pairs(data, position + 6, glyphs, flags & _KERN_OVERRIDE, kernings)
+                # the length field overflows for subtables with more than 10920 pairs
+                position += 14 + _u16(data, position + 6) * 6
+            else:
+                position += _u16(data, position + 2)
+
+    elif _u32(data, offset) == 0x00010000:
+        # the Apple version
+        position = offset + 8
+        for i in xrange(_u32(data, offset + 4)):
+            coverage = _u16(data, position + 4)
+            if coverage & 0xFF == 0 and not coverage & (_KERN_APPLE_VERTICAL | _KERN_APPLE_CROSS_STREAM | _KERN_APPLE_VARIATION):
+                _read_kern_pairs(data, position + 8, glyphs, False, kernings)
+            position += _u32(data, position)
+
+    return kernings
+
+
+def _glyphs_in_range(glyphs, start, end):
+    """ Returns the glyphs of a sorted list that are within [start, end] """
+    return glyphs[bisect.bisect_left(glyphs, start):bisect.bisect_right(glyphs, end)]
+
+
+def _read_coverage(data, offset, glyphs):
+    """ Returns a dictionary from the covered glyphs to their coverage index """
+    coverage = dict()
+    if _u16(data, offset) == 1:
+        for i in xrange(_u16(data, offset + 2)):
+            glyph = _u16(data, offset + 4 + i * 2)
+            if glyph in glyphs:
+                coverage[glyph] = i
+    else:
+        sortedglyphs = sorted(glyphs)
+        for i in xrange(_u16(data, offset + 2)):
+            start, end, index = struct.unpack_from('>HHH', data, offset + 4 + i * 6)
+            for glyph in _glyphs_in_range(sortedglyphs, start, end):
+                coverage[glyph] = index + glyph - start
+    return coverage
+
+
+def _read_class_def(data, offset, glyphs):
+    """ Returns the class of each of the glyphs. The glyphs that aren't listed are in class 0 """
+    classes = dict.fromkeys(glyphs, 0)
+    if _u16(data, offset) == 1:
+        start = _u16(data, offset + 2)
+        for i in xrange(_u16(data, offset + 4)):
+            if start + i in classes:
+                classes[start + i] = _u16(data, offset + 6 + i * 2)
+    else:
+        sortedglyphs = sorted(glyphs)
+        for i in xrange(_u16(data, offset + 2)):
+            start, end, cls = struct.unpack_from('>HHH', data, offset + 4 + i * 6)
+            for glyph in _glyphs_in_range(sortedglyphs, start, end):
+                classes[glyph] = cls
+    return classes
+
+
+def _value_record_size(valueformat):
+    return 2 * bin(valueformat).count('1')
+
+
+def _read_x_advance(data, offset, valueformat):
+    """ Returns the x advance of a value record """
+    if not valueformat & _X_ADVANCE:
+        return 0
+    return _s16(data, offset + _value_record_size(valueformat & (_X_ADVANCE - 1)))
+
+
+def _read_pair_adjustment(data, offset, glyphs, kernings, done):
+    """ Reads a pair adjustment subtable into the kernings of its lookup.
+    A pair is only adjusted by the first subtable of the lookup that matches it, and the matched pairs are added to *done*
+    (a first glyph on its own, if the subtable matches all pairs that start with it)
+    """
+    posformat, coverage, valueformat1, valueformat2 = struct.unpack_from('>HHHH', data, offset)
+    coverage = _read_coverage(data, offset + coverage, glyphs)
+    recordsize = _value_record_size(valueformat1) + _value_record_size(valueformat2)
+
+    if posformat == 1:
+        for first, index in coverage.iteritems():
+            if first in done:
+                continue
+            pairset = offset + _u16(data, offset + 10 + index * 2)
+            for i in xrange(_u16(data, pairset)):
+                record = pairset + 2 + i * (2 + recordsize)
+                second = _u16(data, record)
+                if second in glyphs and (first, second) not in done:
+                    kernings[(first, second)] = _read_x_advance(data, record + 2, valueformat1)
+                    done.add( (first, second) )
+
+    elif posformat == 2:
+        classdef1, classdef2, class1count, class2count = struct.unpack_from('>HHHH', data, offset + 8)
+        classes1 = _read_class_def(data, offset + classdef1, coverage)
+        classes2 = _read_class_def(data, offset + classdef2, glyphs)
+
+        members2 = dict()
+        for glyph, cls in classes2.iteritems():
+            members2.setdefault(cls, []).append(glyph)
+
+        for first in coverage:
+            if first in done:
+                continue
+            done.add(first)
+            row = offset + 16 + classes1[first] * class2count * recordsize
+            for cls, seconds in members2.iteritems():
+                if cls >= class2count:
+                    continue
+                value = _read_x_advance(data, row + cls * recordsize, valueformat1)
+                if value:
+                    for second in seconds:
+                        if (first, second) not in done:
+                            kernings[(first, second)] = value
+
+
+def _read_gpos(data, offset, glyphs):
+    featurelist = offset + _u16(data, offset + 6)
+    lookuplist = offset + _u16(data, offset + 8)
+
+    # the lookups of the 'kern' feature, of all scripts and languages
+    lookups = set()
+    for i in xrange(_u16(data, featurelist)):
+        record = featurelist + 2 + i * 6
+        if data[record:record + 4] != 'kern':
+            continue
+        feature = featurelist + _u16(data, record + 4)
+        for j in xrange(_u16(data, feature + 2)):
+            lookups.add( _u16(data, feature + 4 + j * 2) )
+
+    # the lookups are applied in order, and their adjustments add up
+    kernings = dict()
+    for index in sorted(lookups):
+        lookup = lookuplist + _u16(data, lookuplist + 2 + index * 2)
+        lookuptype = _u16(data, lookup)
+        lookupkernings = dict()
+        done = set()
+        for i in xrange(_u16(data, lookup + 4)):
+            subtable = lookup + _u16(data, lookup + 6 + i * 2)
+            subtabletype = lookuptype
+            if lookuptype == _EXTENSION:
+                subtabletype = _u16(data, subtable + 2)
+                subtable += _u32(data, subtable + 4)
+            if subtabletype == _PAIR_ADJUSTMENT:
+                _read_pair_adjustment(data, subtable, glyphs, lookupkernings, done)
+
+        for pair, value in lookupkernings.iteritems():
+            kernings[pair] = kernings.get(pair, 0) + value
+
+    return kernings
+
+
+def parse_kernings(data, glyphs, index=0):
+    """ Reads the pair kernings from the contents of a font file.
+
+    :param data:    The contents of the font file
+    :param glyphs:  The glyph indices of interest. Only the pairs where both glyphs are in this set are returned
+    :param index:   The index of the font in a font collection (.ttc)
+    :return:        A dictionary from the (left, right) glyph indices to the kerning (in font units),
+                    or None if the kerning can't be read from the file, e.g. if it isn't a TrueType/OpenType font
+    """
+    glyphs = set(glyphs)
+    try:
+        tables = _get_tables(data, index)
+        if tables is None:
+            return None
+        if 'kern' in tables:
+            kernings = _read_kern(data, tables['kern'], glyphs)
+        elif 'GPOS' in tables:
+            kernings = _read_gpos(data, tables['GPOS'], glyphs)
+        else:
+            kernings = dict()
+    except struct.error, e:
+        logging.warning("Failed to read the kerning tables: %s" % str(e))
+        return None
+
+    return dict( (pair, value) for pair, value in kernings.iteritems() if value != 0 )
+
+
+def read_kernings(path, glyphs, index=0):
+    """ Reads the pair kernings from a font file. See :py:func:`parse_kernings` """
+    with open(path, 'rb') as f:
+        data = f.read()
+    return parse_kernings(data, glyphs, index)
+
+
+def scale_kerning(value, x_scale, x_ppem):
+    """ Scales a kerning value from font units to whole pixels, the same way as FreeType's FT_Get_Kerning()
+
+    :param value:   The kerning (in font units)
+    :param x_scale: The horizontal scale of the font size (16.16 fixed point), e.g. face.size.x_scale
+    :param x_ppem:  The horizontal size in pixels, e.g. face.size.x_ppem
+    """
+    sign = -1 if value < 0 else 1
+    # FT_MulFix
+    kerning = (abs(value) * abs(x_scale) + 0x8000) >> 16
+    # small sizes are kerned less, so that the kerning doesn't become too large
+    if x_ppem < 25:
+        # FT_MulDiv
+        kerning = (kerning * x_ppem + 12) / 25
+    kerning *= sign
+    # FT_PIX_ROUND
+    return ((kerning + 32) & ~63) >> 6
@@ -9,6 +9,7 @@ http://sv.wikipedia.org/wiki/UTF-8
 
 import os, struct
 from cStringIO import StringIO
+import fontutils
 
 def _write_u16(f, endian, value):
     s = struct.pack(endian + "H", value)
@@ -37,10 +38,15 @@ def write(options, info, pairkernings):
 
     glyphs = sorted(info.glyphs, key=lambda x: x.utf8)
     
+    if info.pagecount > 128:
+        raise fontutils.FontException("The .font format supports at most 128 texture pages, the font has %d" % info.pagecount)
+
     f = StringIO()
     for glyph in glyphs:
         bbox = glyph.bitmapbox if glyph.bitmapbox is not None else (0, 0, 0, 0)
-        s = struct.pack(endian + "IHHHHBbbx",
+        # the low 7 bits are the texture page, the high bit is set if the glyph is rotated
+        flags = glyph.page | (0x80 if glyph.rotated else 0)
+        s = struct.pack(endian + "IHHHHBbbB",
                         glyph.utf8,
                         bbox[0],
                         bbox[1],
@@ -48,7 +54,8 @@ def write(options, info, pairkernings):
                         bbox[3],
                         glyph.advance,
                         glyph.bearingX,
-                        glyph.bearingY)
+                        glyph.bearingY,
+                        flags)
         f.write(s)
 
     _align_8(f)
@@ -86,9 +93,16 @@ def write(options, info, pairkernings):
     
     _align_8(f)
     
+    # when using texture pages, the page names are stored one after another
     texture_offset = _get_offset(f)
     texture = os.path.splitext(os.path.basename(options.output))[0] + info.textureformat
-    f.write(texture + '\0')
+    if info.texturepages != 1:
+        pagecount = info.pagecount
+        for page in xrange(pagecount):
+            f.write(fontutils.get_page_path(texture, page) + '\0')
+    else:
+        pagecount = 0
+        f.write(texture + '\0')
     
     _align_8(f)
     
@@ -105,7 +119,7 @@ def write(options, info, pairkernings):
         _write_i16(f, endian, info.descender)
         _write_u16(f, endian, len(glyphs))
         _write_u16(f, endian, len(pairkernings))
-        _write_u16(f, endian, 0)
+        _write_u16(f, endian, pagecount)
         _write_u16(f, endian, 0)
         _write_u16(f, endian, 0)
         
@@ -5,13 +5,18 @@ Generates a .json file given a set of glyphs
 """
 
 import os, json
+import fontutils
 
 def _create_dict(options, info, pairkernings):
     d = dict()
     d['name'] = os.path.basename(options.input)
     d['size'] = info.size
     d['texturesize'] = info.texturesize
-    d['texturename'] = os.path.basename(options.output)
+    paged = info.texturepages != 1
+    if paged:
+        d['texturenames'] = [os.path.basename(fontutils.get_page_path(options.output, page)) for page in xrange(info.pagecount)]
+    else:
+        d['texturename'] = os.path.basename(options.output)
     d['ascender'] = int(info.ascender)
     d['descender'] = int(info.descender)
     
@@ -26,6 +31,10 @@ def _create_dict(options, info, pairkernings):
         else:
             gd['bitmapbox'] = (0,0,0,0)
             gd['bearing'] = (0,0)
+        if paged:
+            gd['page'] = glyph.page
+        if info.allowrotate:
+            gd['rotated'] = glyph.rotated
             
         glyphdicts.append(gd)
         
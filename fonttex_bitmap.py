@@ -6,7 +6,55 @@ This is the default rendering of the fonts
 .. py:attribute:: texturesize = 512, 512
 
     The desired size of the texture. If it's too small, the creator will fail.
+    If autotexturesize is set, this is the maximum size of the texture.
   
+.. py:attribute:: autotexturesize = 0
+
+    If set, the creator searches for the smallest texture (by area) that all glyphs fit in,
+    and the texture size is written to the font instead of texturesize.
+
+.. py:attribute:: texturesizemultiple = 0
+
+    The allowed texture dimensions when using autotexturesize.
+    If 0, the width and height are powers of two. Otherwise they are multiples of this value.
+
+.. py:attribute:: texturepages = 1
+
+    The maximum number of texture pages. When the glyphs don't fit in one texture, a new texture page
+    of the same size is started. Set to 0 for no limit.
+    If it isn't 1, the pages are written as *name_0.png*, *name_1.png* etc, and the page of each glyph
+    is written to the font. Together with autotexturesize, the pages are only used if the glyphs
+    don't fit in a single texture of the maximum size.
+
+.. py:attribute:: packingmethod = skyline_bl
+
+    The algorithm that packs the glyphs in the texture. One of
+    *skyline_bl, skyline_mw, maxrects_bssf, maxrects_blsf, maxrects_baf, maxrects_bl* and *maxrects_cp*
+    (see :doc:`binpack`). Set to *auto* to try all of them and keep the best result: the fewest texture pages,
+    then the smallest texture (with autotexturesize) and then the smallest area used on the last page.
+    The maxrects methods are considerably slower than the skyline methods.
+
+.. py:attribute:: packingbestfit = 0
+
+    If set, the packer chooses the order of the glyphs: In each step, it packs the glyph that fits best
+    among all remaining glyphs. This often packs tighter, especially with the maxrects methods, but is slower.
+    The packingorder then only decides between equally good glyphs.
+
+.. py:attribute:: allowrotate = 0
+
+    If set, the packer may rotate glyphs by 90 degrees to pack them tighter, which mostly helps fonts
+    with many tall or wide glyphs. A rotated glyph is stored turned clockwise, so the glyph pixel (x, y)
+    is found at the texture pixel (bx + bw - 1 - y, by + x), where (bx, by, bw, bh) is the bitmap box.
+    The rotated flag of each glyph is written to the font, and the renderer must swap the texture coordinates accordingly.
+    The gain is usually small, and it works best with a descending packingorder (e.g. *-height*).
+
+.. py:attribute:: packingorder = height
+
+    The order the glyphs are packed in. One of *height, width, area* and *perimeter*, from small to large.
+    Prefix with a '-' to pack from large to small, e.g. *-area*. Set to *auto* to try all of them.
+    Together with packingmethod = auto, all combinations are tried.
+    The candidates are tried in parallel when the creator is run with --jobs.
+
 .. py:attribute:: textureoffset = 0, 0
     
     The offset from the top left corner of the texture to the top left corner of the first glyph.
@@ -17,39 +65,325 @@ This is the default rendering of the fonts
     If set, will premultiply the alpha
 
 """
-import logging
+import logging, time, hashlib
+import multiprocessing
 import numpy as np
+import fontutils
 from fontutils import FontException
 import binpack
 
 DEBUG=False
 
 
-def _guess_dimensions(glyphs):
-    area = 0
-    for glyph in glyphs:
-        if glyph.bitmap is None:
+#: The packing methods, by their name in the font info
+METHODS = [('skyline_bl', binpack.SKYLINE_BL),
+           ('skyline_mw', binpack.SKYLINE_MW),
+           ('maxrects_bssf', binpack.MAXRECTS_BSSF),
+           ('maxrects_blsf', binpack.MAXRECTS_BLSF),
+           ('maxrects_baf', binpack.MAXRECTS_BAF),
+           ('maxrects_bl', binpack.MAXRECTS_BL),
+           ('maxrects_cp', binpack.MAXRECTS_CP)]
+
+#: The glyph orders, by their name in the font info. A '-' prefix reverses the order
+ORDERS = [('height', lambda size: size[1]),
+          ('width', lambda size: size[0]),
+          ('area', lambda size: size[0] * size[1]),
+          ('perimeter', lambda size: size[0] + size[1])]
+
+
+def _pack(sizes, width, height, maxpages=1, method=binpack.SKYLINE_BL, bestfit=False, allowrotate=False):
+    """ Packs the rects in bins of the given size. A new bin (page) is started when a rect doesn't fit the current one.
+
+    :param sizes:       A list of (w, h) tuples
+    :param maxpages:    The maximum number of pages. 0 means no limit
+    :param method:      The binpack packing algorithm
+    :param bestfit:     If set, the packer chooses the order of the rects. See binpack.pack_rects()
+    :param allowrotate: If set, the packer may rotate the rects. A rotated rect has its width and height swapped
+    :return:            A tuple (rects, pages, occupancies), or None if the rects don't fit.
+                        The rects are (x, y, w, h) tuples
+    """
+    if width <= 0 or height <= 0:
+        return None
+    if not sizes:
+        return [], [], [0.0]
+
+    sizes = np.array(sizes, np.int32)
+    rects = np.zeros( (len(sizes), 4), np.int32)
+    pages = np.zeros(len(sizes), np.int32)
+    occupancies = []
+
+    # the rects that are left for the next page
+    remaining = np.arange(len(sizes))
+    while len(remaining):
+        if maxpages and len(occupancies) == maxpages:
+            return None
+
+        pagerects = np.empty( (len(remaining), 4), np.int32)
+        packer = binpack.create_packer(method, width, height, allowrotate)
+        try:
+            count = binpack.pack_rects(packer, np.ascontiguousarray(sizes[remaining]), pagerects, bestfit)
+            occupancies.append(binpack.get_occupancy(packer))
+        finally:
+            binpack.destroy_packer(packer)
+
+        if count == 0:
+            # it won't fit on an empty page either
+            return None
+
+        packed = pagerects[:, 3] != 0
+        rects[remaining[packed]] = pagerects[packed]
+        pages[remaining[packed]] = len(occupancies) - 1
+        remaining = remaining[~packed]
+
+    return map(tuple, rects.tolist()), pages.tolist(), occupancies
+
+
+def _get_candidates(minimum, maximum, multiple):
+    """ Returns the allowed texture dimensions in the range [minimum, maximum], in ascending order.
+    A multiple of 0 means powers of two.
+    """
+    candidates = []
+    if multiple <= 0:
+        size = 1
+        while size <= maximum:
+            if size >= minimum:
+                candidates.append(size)
+            size *= 2
+    else:
+        size = max(multiple, ((minimum + multiple - 1) / multiple) * multiple)
+        while size <= maximum:
+            candidates.append(size)
+            size += multiple
+    return candidates
+
+
+def _size_key(size):
+    # prefer the smaller area, and then the squarer texture
+    return (size[0] * size[1], max(size))
+
+
+def _find_texture_size(sizes, maxsize, textureoffset, multiple, method=binpack.SKYLINE_BL, bestfit=False, allowrotate=False, bound=None):
+    """ Finds the smallest texture (by area) that all rects can be packed into.
+
+    For each allowed width, the smallest height is found by first doubling and then bisecting the index
+    into the allowed heights, starting at the area lower bound. This relies on the skyline packer never
+    failing in a bin that is taller than one it succeeded in (for the other methods, it's a close approximation).
+    Widths whose lower bound isn't smaller than the best texture so far are skipped without packing.
+
+    :param sizes:   A list of (w, h) tuples, in packing order
+    :param bound:   If set, only textures of the same width and smaller than this (width, height) are tried
+    :return:        A tuple ((width, height), result) where result is the result from _pack(),
+                    or None if the rects don't fit in the maximum texture size
+    """
+    offsetx, offsety = textureoffset
+    maxwidth, maxheight = maxsize
+
+    area = sum(w * h for w, h in sizes)
+    if allowrotate:
+        # the rects may be turned to fit
+        minwidth = minheight = max([min(w, h) for w, h in sizes] + [1])
+    else:
+        minwidth = max([w for w, h in sizes] + [1])
+        minheight = max([h for w, h in sizes] + [1])
+    minwidth += offsetx
+    minheight += offsety
+
+    widths = _get_candidates(minwidth, maxwidth, multiple)
+    heights = _get_candidates(minheight, maxheight, multiple)
+    if bound is not None:
+        widths = [width for width in widths if width == bound[0]]
+
+    best = None
+    attempts = 0
+    limit = _size_key(bound) if bound is not None else None
+    for width in widths:
+        # the smallest height that could possibly hold all the rects
+        lowerbound = (area + width - offsetx - 1) / (width - offsetx) + offsety
+        lo = 0
+        while lo < len(heights) and heights[lo] < lowerbound:
+            lo += 1
+
+        # the largest height that could improve on the best texture so far
+        last = len(heights) - 1
+        if best is not None:
+            limit = _size_key(best[0])
+        while limit is not None and last >= lo and _size_key( (width, heights[last]) ) >= limit:
+            last -= 1
+        if lo > last:
             continue
-        w, h, d = glyph.bitmap.shape
-        area += w*h
-    
-    #area += area / 1
-    
-    gw = 512
-    gh = 64
-    guess = gw * gh
-    while guess < area:
-        if gh >= gw:
-            gw *= 2
-            gh /= 2
+
+        # double the step until the rects fit
+        failed = lo - 1
+        index = lo
+        step = 1
+        while True:
+            attempts += 1
+            result = _pack(sizes, width - offsetx, heights[index] - offsety, method=method, bestfit=bestfit, allowrotate=allowrotate)
+            if result is not None or index == last:
+                break
+            failed = index
+            index = min(index + step, last)
+            step *= 2
+        if result is None:
+            continue
+
+        # bisect between the last failure and the first success
+        lo, hi = failed + 1, index
+        while lo < hi:
+            mid = (lo + hi) / 2
+            attempts += 1
+            midresult = _pack(sizes, width - offsetx, heights[mid] - offsety, method=method, bestfit=bestfit, allowrotate=allowrotate)
+            if midresult is not None:
+                hi = mid
+                result = midresult
+            else:
+                lo = mid + 1
+
+        best = ( (width, heights[hi]), result )
+
+    if best is not None:
+        logging.debug('Found the texture size (%d, %d) after %d packing attempts', best[0][0], best[0][1], attempts)
+    return best
+
+
+def _pack_glyphs(args):
+    """ Packs the glyphs with one method and order, as described by the font info.
+
+    :param args:    A tuple (sizes, method, bestfit, allowrotate, autotexturesize, texturesize, textureoffset, multiple, maxpages, bound).
+                    See _find_texture_size() for the bound
+    :return:        A tuple (texturesize, result) where result is the result from _pack(), or None if the glyphs don't fit
+    """
+    sizes, method, bestfit, allowrotate, autotexturesize, texturesize, textureoffset, multiple, maxpages, bound = args
+    if autotexturesize:
+        found = _find_texture_size(sizes, texturesize, textureoffset, multiple, method, bestfit, allowrotate, bound)
+        if found is not None or bound is not None:
+            return found
+
+    # use the given texture size, and several texture pages if allowed
+    result = _pack(sizes, texturesize[0] - textureoffset[0], texturesize[1] - textureoffset[1], maxpages, method, bestfit, allowrotate)
+    if result is None:
+        return None
+    return texturesize, result
+
+
+def _get_packing_key(packing):
+    """ The key to sort the packing results by: the fewest pages, the smallest texture and then the least used part of the last page """
+    texturesize, (rects, pages, occupancies) = packing
+    lastpage = len(occupancies) - 1
+    right = max([x + w for (x, y, w, h), page in zip(rects, pages) if page == lastpage] + [0])
+    bottom = max([y + h for (x, y, w, h), page in zip(rects, pages) if page == lastpage] + [0])
+    return (len(occupancies), ) + _size_key(texturesize) + (right * bottom, )
+
+
+def _get_options(name, options, value):
+    """ Returns the named options that are tried, given the value from the font info """
+    if value == 'auto':
+        return [option for option, _ in options]
+    if value.lstrip('-') not in dict(options):
+        raise FontException("Unknown %s '%s'. Must be one of: auto, %s" % (name, value, ', '.join(option for option, _ in options)) )
+    return [value]
+
+
+def _order(sizes, order):
+    """ Returns the indices of the sizes, in the given order """
+    key = dict(ORDERS)[order.lstrip('-')]
+    return sorted(xrange(len(sizes)), key=lambda i: key(sizes[i]), reverse=order.startswith('-'))
+
+
+def _pack_all(info, sizes):
+    """ Packs the glyphs with the packing methods and orders from the font info, and picks the best result.
+
+    If there are several candidates, the default (skyline_bl, height) is tried first. With autotexturesize,
+    the rest of the candidates then keep the width of the first result, and only try smaller heights,
+    since searching all widths takes too long with the maxrects methods.
+    The rest of the candidates are packed in parallel, using info.jobs processes.
+
+    :return:    A tuple (indices, texturesize, result) where indices is the packing order of the sizes,
+                and result is the result from _pack()
+    """
+    methods = _get_options('packingmethod', METHODS, info.packingmethod)
+    orders = _get_options('packingorder', ORDERS + [('-' + order, key) for order, key in ORDERS], info.packingorder)
+
+    candidates = [(method, order) for order in orders for method in methods]
+    # start with the default, to get a bound for the others
+    default = ('skyline_bl', 'height')
+    if default in candidates:
+        candidates.remove(default)
+        candidates.insert(0, default)
+
+    timestart = time.time()
+
+    def _get_args(method, order, bound):
+        indices = _order(sizes, order)
+        return ([sizes[i] for i in indices], dict(METHODS)[method], info.packingbestfit, info.allowrotate, info.autotexturesize, info.texturesize,
+                info.textureoffset, info.texturesizemultiple, info.texturepages, bound)
+
+    method, order = candidates[0]
+    packings = [_pack_glyphs(_get_args(method, order, None))]
+
+    if len(candidates) > 1:
+        bound = None
+        if info.autotexturesize and packings[0] is not None and len(packings[0][1][2]) == 1:
+            bound = packings[0][0]
+        args = [_get_args(method, order, bound) for method, order in candidates[1:]]
+
+        jobs = min(info.jobs, len(args))
+        if jobs > 1:
+            pool = multiprocessing.Pool(jobs)
+            try:
+                packings += pool.map(_pack_glyphs, args)
+                pool.close()
+            except:
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
         else:
-            gh *= 2
-        guess = gw * gh
-    return (gw, gh)
-        
+            packings += map(_pack_glyphs, args)
+
+    best = None
+    for (method, order), packing in zip(candidates, packings):
+        if packing is None:
+            continue
+        key = _get_packing_key(packing)
+        logging.debug('Packing %s, %s: texture (%d, %d) with %d pages', method, order, packing[0][0], packing[0][1], len(packing[1][2]))
+        if best is None or key < best[0]:
+            best = (key, method, order, packing)
+
+    if best is None:
+        return None
+
+    key, method, order, (texturesize, result) = best
+    if len(candidates) > 1:
+        logging.info('Chose the packing %s, %s out of %d: texture (%d, %d) with %d pages, %.1f %% used, in %f seconds',
+                     method, order, len(candidates), texturesize[0], texturesize[1], len(result[2]),
+                     100.0 * sum(result[2]) / len(result[2]), time.time() - timestart)
+    return _order(sizes, order), texturesize, result
+
+
+def _find_duplicates(glyphs):
+    """ Finds the glyphs with identical bitmaps, e.g. code points that map to the same glyph in the font.
+
+    :return:    A tuple (unique, duplicates) where unique is the list of glyphs with distinct bitmaps, and duplicates
+                is a list of (glyph, original) tuples, where original is the glyph in unique with the same bitmap
+    """
+    unique = []
+    duplicates = []
+    found = dict()
+    for glyph in glyphs:
+        bitmap = np.ascontiguousarray(glyph.bitmap)
+        key = (bitmap.shape, bitmap.dtype.str, hashlib.sha1(bitmap).digest())
+        original = found.get(key)
+        if original is None:
+            found[key] = glyph
+            unique.append(glyph)
+        else:
+            duplicates.append( (glyph, original) )
+    return unique, duplicates
+
 
 def _create_image(info, w, h):
-    image = np.ones( (w, h, 4), np.float64)
+    image = np.ones( (w, h, 4), info.dtype)
     image[:, :, 0] *= info.bgcolor[0]
     image[:, :, 1] *= info.bgcolor[1]
     image[:, :, 2] *= info.bgcolor[2]
@@ -63,66 +397,87 @@ def _glyph_cmp(a, b):
     elif b.bitmap is None and a.bitmap is not None:
         return -1
     elif b.bitmap is None and a.bitmap is None:
-        return cmp(a, b)
+        return cmp(a.utf8, b.utf8)
     
     return a.bitmap.shape[1] - b.bitmap.shape[1]
 
 
+def _check_sizes(info, glyphs, sizes):
+    """ Raises an error if a glyph is larger than the texture, since it doesn't fit on any number of texture pages """
+    width = info.texturesize[0] - info.textureoffset[0]
+    height = info.texturesize[1] - info.textureoffset[1]
+    for glyph, (w, h) in zip(glyphs, sizes):
+        if (w <= width and h <= height) or (info.allowrotate and h <= width and w <= height):
+            continue
+        raise FontException("The glyph '%s' (%dx%d, including the padding) is larger than the texture size (%d, %d) Increase the 'texturesize' property in the font info" % (glyph.unicode, w, h, info.texturesize[0], info.texturesize[1]) )
+
+
 def render(info):
     """ Assuming (0,0) is at the top left corner of the image.
     
     :param info:    The settings from the fontinfo file
-    :return:        The image all glyphs are rendered to
+    :return:        The image all glyphs are rendered to.
+                    If texturepages isn't 1, a list with one image per texture page
     """
     
     # sort the glyphs
     info.glyphs.sort(cmp=_glyph_cmp)
     
-    # Work in progress
-    #iw, ih = _guess_dimensions(info.glyphs)
-    iw, ih = info.texturesize
-    #ih /= 2
-    #print "guessed image size", iw, ih
-    image = _create_image(info, iw, ih)
-    
     textureoffset = info.textureoffset
     padding = info.padding
-    packer = binpack.create_packer(binpack.SKYLINE_BL, iw - textureoffset[0], ih - textureoffset[1], False)
+    glyphs = [glyph for glyph in info.glyphs if glyph.bitmap is not None]
+    # identical bitmaps are only packed once, and share the same bitmap box
+    glyphs, duplicates = _find_duplicates(glyphs)
+    if duplicates:
+        logging.info('Packing %d unique bitmaps for %d glyphs', len(glyphs), len(glyphs) + len(duplicates))
+    sizes = [(glyph.bitmap.shape[0] + padding, glyph.bitmap.shape[1] + padding) for glyph in glyphs]
+    _check_sizes(info, glyphs, sizes)
+    
+    packing = _pack_all(info, sizes)
+    if packing is None:
+        if info.texturepages != 1:
+            raise FontException("The glyphs don't fit in %d texture pages of size (%d, %d) Increase the 'texturesize' or 'texturepages' property in the font info" % (info.texturepages, info.texturesize[0], info.texturesize[1]) )
+        raise FontException("The texture size is too small: (%d, %d) Increase the 'texturesize' property in the font info" % (info.texturesize[0], info.texturesize[1]) )
+    indices, info.texturesize, result = packing
+    glyphs = [glyphs[i] for i in indices]
+    rects, pages, occupancies = result
+    info.pagecount = len(occupancies)
+    
+    iw, ih = info.texturesize
+    images = [_create_image(info, iw, ih) for _ in occupancies]
     
     # DEBUG PACK RENDERING
     if DEBUG:
-        image[:, :, 0] = 1.0
-        image[:, :, 3] = 1.0
+        for image in images:
+            image[:, :, 0] = 1.0
+            image[:, :, 3] = 1.0
     
-    for glyph in info.glyphs:
-        if glyph.bitmap is None:
-            continue
-        
+    for glyph, rect, page in zip(glyphs, rects, pages):
+        rect = binpack.Rect(*rect)
         bitmap = glyph.bitmap
         
         w, h, d = bitmap.shape
         
-        rect = binpack.pack_rect(packer, w + padding, h + padding)
-        if rect.height == 0:
-            raise FontException("The texture size is too small: (%d, %d) Increase the 'texturesize' property in the font info" % (info.texturesize[0], info.texturesize[1]) )
-        
         rect.x += textureoffset[0]
         rect.y += textureoffset[1]
         rect.width -= padding
         rect.height -= padding
         
         glyph.bitmapbox = (rect.x, rect.y, rect.width, rect.height)
+        glyph.page = page
+        glyph.rotated = False
+        image = images[page]
         
         # check if the glyph has been flipped
         if w != h and w == rect.height:
             bitmap = np.rot90(bitmap)
+            glyph.rotated = True
         
         try:
             image[ rect.x : rect.x + rect.width, rect.y : rect.y + rect.height ] = bitmap
 
             # DEBUG PACK RENDERING
             if DEBUG:
-                import fontutils
                 top = image[ rect.x : rect.x + rect.width, rect.y : rect.y + rect.height ]
                 ones = np.ones( (top.shape[0], top.shape[1]) )
                 
@@ -146,11 +501,18 @@ def render(info):
 
         #x += max(w, w2) + info.padding + info.internalpadding[0]*2
     
-    logging.debug('Used %f %% of the texture', (binpack.get_occupancy(packer) * 100))
-    binpack.destroy_packer(packer)
+    for glyph, original in duplicates:
+        glyph.bitmapbox = original.bitmapbox
+        glyph.page = original.page
+        glyph.rotated = original.rotated
+    
+    for page, occupancy in enumerate(occupancies):
+        logging.debug('Used %f %% of the texture page %d (%d, %d)', occupancy * 100, page, iw, ih)
     
     if info.usepremultipliedalpha:
-        image = fontutils.pre_multiply_alpha(image)
-        
-    return image
+        images = [fontutils.pre_multiply_alpha(image) for image in images]
+    
+    if info.texturepages != 1:
+        return images
+    return images[0]
         
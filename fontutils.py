@@ -1,6 +1,7 @@
 """
 Copyright @ 2013 Mathias Westerdahl
 """
+import os
 from math import sqrt
 import numpy as np
 import numpy.ctypeslib
@@ -24,15 +25,82 @@ def make_array_from_bitmap(_bitmap, bitdepth=8):
     return a[:width,:]
 
 
+def get_outline_contours(outline):
+    """ Converts a FT_Outline into a list of contours, in pixel units (y up).
+    Each contour is a list of segments, where each segment is a list of 2 (line), 3 (conic) or 4 (cubic) points.
+    """
+    contours = []
+    start = 0
+    for c in xrange(outline.n_contours):
+        end = outline.contours[c]
+        points = [ (outline.points[i].x / 64.0, outline.points[i].y / 64.0) for i in xrange(start, end + 1) ]
+        tags = [ outline.tags[i] & 3 for i in xrange(start, end + 1) ]
+        start = end + 1
+
+        # start at an on-curve point. If there are none, start between the two first conic control points
+        on = [i for i, tag in enumerate(tags) if tag & 1]
+        if on:
+            points = points[on[0]:] + points[:on[0]]
+            tags = tags[on[0]:] + tags[:on[0]]
+        else:
+            midpoint = ( (points[0][0] + points[-1][0]) / 2.0, (points[0][1] + points[-1][1]) / 2.0 )
+            points = [midpoint] + points
+            tags = [1] + tags
+        points.append(points[0])
+        tags.append(1)
+
+        segments = []
+        current = points[0]
+        i = 1
+        while i < len(points):
+            if tags[i] & 1:
+                segment = [current, points[i]]
+                i += 1
+            elif tags[i] & 2:
+                # cubic: two control points and an end point
+                segment = [current, points[i], points[i+1], points[i+2]]
+                i += 3
+            else:
+                # conic: consecutive control points have an implicit on-curve point between them
+                control = points[i]
+                if tags[i+1] & 1:
+                    segment = [current, control, points[i+1]]
+                    i += 2
+                else:
+                    midpoint = ( (control[0] + points[i+1][0]) / 2.0, (control[1] + points[i+1][1]) / 2.0 )
+                    segment = [current, control, midpoint]
+                    i += 1
+            current = segment[-1]
+            if segment[0] != segment[-1] or len(segment) > 2:
+                segments.append(segment)
+
+        if segments:
+            contours.append(segments)
+    return contours
+
+
+def get_page_path(path, page):
+    """ Returns the path of a texture page. E.g. 'font.png' -> 'font_1.png' """
+    base, ext = os.path.splitext(path)
+    return '%s_%d%s' % (base, page, ext)
+
+
+def get_size_path(path, size):
+    """ Returns the output path of one of the font sizes. E.g. 'font.png' -> 'font_16px.png' """
+    base, ext = os.path.splitext(path)
+    return '%s_%dpx%s' % (base, size, ext)
+
+
 def split_channels(image):
     """ Takes a numpy array and splits its' channels into a 3 or 4 tuple (views)
+    The channels are the last axis, so it also works on a batch of images with shape (N, W, H, C)
 
     :return: A 3 or 4 tuple, with each element containing the corresponding color channel
     """
-    if image.shape[2] == 3:
-        return (image[:, :, 0], image[:, :, 1], image[:, :, 2])
-    elif image.shape[2] == 4:
-        return (image[:, :, 0], image[:, :, 1], image[:, :, 2], image[:, :, 3])
+    if image.shape[-1] == 3:
+        return (image[..., 0], image[..., 1], image[..., 2])
+    elif image.shape[-1] == 4:
+        return (image[..., 0], image[..., 1], image[..., 2], image[..., 3])
     assert False, "Wrong shape: %s" % str(image.shape)
 
 
@@ -54,17 +122,23 @@ def pre_multiply_alpha(image):
     return image
 
 
-def alpha_blend(bottom, top):
-    """ Creates a new copy by alpha blending top onto bottom
+def alpha_blend(bottom, top, out=None):
+    """ Alpha blends top onto bottom
     
-    :param bottom: A numpy array of shape (x, y, 4)
-    :param top:    A numpy array of shape (x, y, 4)
-    :return:       Returns a new numpy.array with the same dtype as the top array
+    :param bottom: A numpy array of shape (x, y, 4) or (n, x, y, 4)
+    :param top:    A numpy array of shape (x, y, 4) or (n, x, y, 4)
+    :param out:    The array to write the result to. It may be the bottom or the top array.
+                   If None, a new array is created
+    :return:       The blended image, with the same dtype as the top array. It's the out array, unless
+                   that is the bottom array with another dtype
     """
     assert bottom.shape == top.shape, "Cannot blend two images of different shapes: %s != %s" % (str(bottom.shape), str(top.shape))
 
     if bottom.dtype != top.dtype:
-        bottom = bottom.astype(top.dtype)
+        converted = bottom.astype(top.dtype)
+        if out is bottom:
+            out = converted
+        bottom = converted
     """
     br, bg, bb, ba = split_channels(bottom)
     tr, tg, tb, ta = split_channels(top)
@@ -83,15 +157,46 @@ def alpha_blend(bottom, top):
     return out
     """
 
-    br, bg, bb, ba = split_channels(bottom)
-    tr, tg, tb, ta = split_channels(top)
+    if out is None:
+        out = np.empty_like(bottom)
 
-    out = np.empty_like(bottom)
-    out[:, :, 0] = br + (tr-br) * ta
-    out[:, :, 1] = bg + (tg-bg) * ta
-    out[:, :, 2] = bb + (tb-bb) * ta
-    out[:, :, 3] = np.maximum(ba, ta)
+    # the colors are bottom + (top - bottom) * alpha. The alpha channel is written last, since out may be the top array
+    color = np.subtract(top[..., :3], bottom[..., :3])
+    color *= top[..., 3:]
+    np.add(bottom[..., :3], color, out[..., :3])
+    np.maximum(bottom[..., 3], top[..., 3], out[..., 3])
     return out
+
+
+class ScratchPool(object):
+    """ Hands out temporary arrays, and reuses their memory once they're given back with put().
+    The buffers grow to the largest size that is asked for, so a pool can be shared by images of different sizes.
+    """
+    def __init__(self):
+        self.free = []
+        self.used = dict()
+
+    def get(self, shape, dtype):
+        """ Returns an uninitialized array of the given shape and type """
+        dtype = np.dtype(dtype)
+        size = int(np.prod(shape))
+        buf = None
+        for i, candidate in enumerate(self.free):
+            if candidate.dtype == dtype:
+                del self.free[i]
+                if candidate.size >= size:
+                    buf = candidate
+                break
+        if buf is None:
+            buf = np.empty(size, dtype)
+        array = buf[:size].reshape(shape)
+        self.used[id(array)] = (array, buf)
+        return array
+
+    def put(self, array):
+        """ Gives back an array from get(). It must not be used afterwards """
+        array, buf = self.used.pop(id(array))
+        self.free.append(buf)
     
 
 
@@ -151,6 +256,21 @@ def pad_bitmap(bitmap, left, top, right, bottom, value, debug=False):
     return out
 
 
+def get_alpha_bounds(image):
+    """ Finds the smallest box that holds all pixels with a non zero alpha
+
+    :param image:    A numpy array of shape (x, y, 4)
+    :return:         A tuple (left, top, right, bottom) where right and bottom are exclusive,
+                     or None if the image is fully transparent
+    """
+    alpha = image[:, :, 3] != 0
+    columns = np.flatnonzero(alpha.any(axis=1))
+    if not len(columns):
+        return None
+    rows = np.flatnonzero(alpha.any(axis=0))
+    return (columns[0], rows[0], columns[-1] + 1, rows[-1] + 1)
+
+
 def create_1d_lanczos_kernel(radius):
     # formula taken from http://en.wikipedia.org/wiki/Gaussian_blur
     def calc(x): return 0 if abs(x) > radius else (1 if x == 0 else np.sin(x*np.pi)/x)
@@ -189,7 +309,17 @@ def create_2d_circle_kernel(radius):
     return np.array([ np.sqrt( x * x + y * y ) <= float(radius) for y in xrange(-radius, radius+1) for x in xrange(-radius, radius+1)], dtype=np.float32).reshape( radius*2+1, radius*2+1 )
 
 
-def blur_image(image, radius):
+def blur_image(image, radius, method='kernel'):
+    """ Blurs the image with a gaussian
+    
+    :param radius: The radius of the blur
+    :param method: 'kernel' convolves the image with a create_1d_gaussian_kernel(radius).
+                   'iir' uses a recursive filter with the same sigma, which is faster for large radii.
+                   It isn't cut off at the radius, so it reaches a bit further than the kernel.
+    """
+    if method == 'iir':
+        return utils.gaussian_blur(image, (radius + 1.0) / sqrt(3.0))
+    assert method == 'kernel', "Unknown blur method: %s" % method
     k = create_1d_gaussian_kernel(radius)
     blurred = utils.convolve1d(image, k, axis=0)
     blurred = utils.convolve1d(blurred, k, axis=1)
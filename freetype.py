@@ -192,7 +192,7 @@ class Outline(ctypes.Structure):
         ('n_points', c_short),
         ('points', POINTER(Vector)),
         ('tags', POINTER(c_ubyte)),  # As seen in freetype-py, for being able to access all flags
-        ('points', POINTER(c_short)),
+        ('contours', POINTER(c_short)),
         ('flags', c_int),
     ]
 
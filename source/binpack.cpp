@@ -3,6 +3,7 @@
 #include "binpack/SkylineBinPack.h"
 #include "binpack/MaxRectsBinPack.h"
 #include "assert.h"
+#include <vector>
 
 struct SPacker
 {
@@ -21,7 +22,7 @@ HPacker create_packer(EPackerType type, int32_t w, int32_t h, bool allow_rotate)
 			 type == E_MAXRECTS_BAF ||
 			 type == E_MAXRECTS_BL ||
 			 type == E_MAXRECTS_CP )
-		packer->m_Packer = new MaxRectsBinPack(w, h);
+		packer->m_Packer = new MaxRectsBinPack(w, h, allow_rotate);
 	return packer;
 }
 
@@ -58,6 +59,64 @@ SRect pack_rect(HPacker _packer, int32_t w, int32_t h)
 	return out;
 }
 
+int32_t pack_rects(HPacker _packer, int32_t count, const int32_t* sizes, SRect* rects, bool best_fit)
+{
+	memset(rects, 0, sizeof(SRect) * count);
+
+	if( !best_fit )
+	{
+		for( int32_t i = 0; i < count; ++i )
+		{
+			rects[i] = pack_rect(_packer, sizes[i*2], sizes[i*2+1]);
+			if( rects[i].height == 0 )
+				return i;
+		}
+		return count;
+	}
+
+	// Let the packer choose the next rect to insert, among all the remaining ones
+	std::vector<RectSize> input(count);
+	for( int32_t i = 0; i < count; ++i )
+	{
+		input[i].width = sizes[i*2];
+		input[i].height = sizes[i*2+1];
+	}
+
+	const SPacker* packer = (SPacker*)_packer;
+	const EPackerType type = packer->m_Type;
+	std::vector<Rect> output;
+	std::vector<int> indices;
+
+	if( type == E_SKYLINE_BL )
+		((SkylineBinPack*)packer->m_Packer)->Insert(input, output, SkylineBinPack::LevelBottomLeft, &indices);
+	else if( type == E_SKYLINE_MW )
+		((SkylineBinPack*)packer->m_Packer)->Insert(input, output, SkylineBinPack::LevelMinWasteFit, &indices);
+	else if( type == E_MAXRECTS_BSSF )
+		((MaxRectsBinPack*)packer->m_Packer)->Insert(input, output, MaxRectsBinPack::RectBestShortSideFit, &indices);
+	else if( type == E_MAXRECTS_BLSF )
+		((MaxRectsBinPack*)packer->m_Packer)->Insert(input, output, MaxRectsBinPack::RectBestLongSideFit, &indices);
+	else if( type == E_MAXRECTS_BAF )
+		((MaxRectsBinPack*)packer->m_Packer)->Insert(input, output, MaxRectsBinPack::RectBestAreaFit, &indices);
+	else if( type == E_MAXRECTS_BL )
+		((MaxRectsBinPack*)packer->m_Packer)->Insert(input, output, MaxRectsBinPack::RectBottomLeftRule, &indices);
+	else if( type == E_MAXRECTS_CP )
+		((MaxRectsBinPack*)packer->m_Packer)->Insert(input, output, MaxRectsBinPack::RectContactPointRule, &indices);
+	else
+	{
+		assert(false && "Wrong type");
+	}
+
+	for( size_t i = 0; i < output.size(); ++i )
+	{
+		SRect& out = rects[indices[i]];
+		out.x = output[i].x;
+		out.y = output[i].y;
+		out.width = output[i].width;
+		out.height = output[i].height;
+	}
+	return (int32_t)output.size();
+}
+
 void destroy_packer(HPacker _packer)
 {
 	SPacker* packer = (SPacker*)_packer;
@@ -45,6 +45,8 @@ DLL_EXPORT HPacker create_packer(EPackerType type, int32_t w, int32_t h, bool al
 
 DLL_EXPORT SRect pack_rect(HPacker packer, int32_t w, int32_t h);
 
+DLL_EXPORT int32_t pack_rects(HPacker packer, int32_t count, const int32_t* sizes, SRect* rects, bool best_fit);
+
 DLL_EXPORT void destroy_packer(HPacker packer);
 
 DLL_EXPORT float get_occupancy(HPacker packer);
@@ -18,19 +18,21 @@ using namespace std;
 
 GuillotineBinPack::GuillotineBinPack()
 :binWidth(0),
-binHeight(0)
+binHeight(0),
+allowRotate(true)
 {
 }
 
-GuillotineBinPack::GuillotineBinPack(int width, int height)
+GuillotineBinPack::GuillotineBinPack(int width, int height, bool allowRotate)
 {
-	Init(width, height);
+	Init(width, height, allowRotate);
 }
 
-void GuillotineBinPack::Init(int width, int height)
+void GuillotineBinPack::Init(int width, int height, bool allowRotate_)
 {
 	binWidth = width;
 	binHeight = height;
+	allowRotate = allowRotate_;
 
 #ifdef _DEBUG
 	disjointRects.Clear();
@@ -456,7 +458,7 @@ Rect GuillotineBinPack::FindPositionForNewNode(int width, int height, FreeRectCh
 			break;
 		}
 		// If this is a perfect fit sideways, choose it.
-		else if (height == freeRectangles[i].width && width == freeRectangles[i].height)
+		else if (allowRotate && height == freeRectangles[i].width && width == freeRectangles[i].height)
 		{
 			bestNode.x = freeRectangles[i].x;
 			bestNode.y = freeRectangles[i].y;
@@ -489,7 +491,7 @@ Rect GuillotineBinPack::FindPositionForNewNode(int width, int height, FreeRectCh
 			}
 		}
 		// Does the rectangle fit sideways?
-		else if (height <= freeRectangles[i].width && width <= freeRectangles[i].height)
+		else if (allowRotate && height <= freeRectangles[i].width && width <= freeRectangles[i].height)
 		{
 			int score = ScoreByHeuristic(height, width, freeRectangles[i], rectChoice);
 
@@ -20,11 +20,12 @@ public:
 	GuillotineBinPack();
 
 	/// Initializes a new bin of the given size.
-	GuillotineBinPack(int width, int height);
+	GuillotineBinPack(int width, int height, bool allowRotate = true);
 
 	/// (Re)initializes the packer to an empty bin of width x height units. Call whenever
 	/// you need to restart with a new bin.
-	void Init(int width, int height);
+	/// @param allowRotate If false, Insert() never rotates the rectangles.
+	void Init(int width, int height, bool allowRotate = true);
 
 	/// Specifies the different choice heuristics that can be used when deciding which of the free subrectangles
 	/// to place the to-be-packed rectangle into.
@@ -90,6 +91,7 @@ public:
 private:
 	int binWidth;
 	int binHeight;
+	bool allowRotate;
 
 	/// Stores a list of all the rectangles that we have packed so far. This is used only to compute the Occupancy ratio,
 	/// so if you want to have the packer consume less memory, this can be removed.
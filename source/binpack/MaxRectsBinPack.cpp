@@ -17,19 +17,21 @@ using namespace std;
 
 MaxRectsBinPack::MaxRectsBinPack()
 :binWidth(0),
-binHeight(0)
+binHeight(0),
+allowRotate(true)
 {
 }
 
-MaxRectsBinPack::MaxRectsBinPack(int width, int height)
+MaxRectsBinPack::MaxRectsBinPack(int width, int height, bool allowRotate)
 {
-	Init(width, height);
+	Init(width, height, allowRotate);
 }
 
-void MaxRectsBinPack::Init(int width, int height)
+void MaxRectsBinPack::Init(int width, int height, bool allowRotate_)
 {
 	binWidth = width;
 	binHeight = height;
+	allowRotate = allowRotate_;
 
 	Rect n;
 	n.x = 0;
@@ -77,9 +79,15 @@ Rect MaxRectsBinPack::Insert(int width, int height, FreeRectChoiceHeuristic meth
 	return newNode;
 }
 
-void MaxRectsBinPack::Insert(std::vector<RectSize> &rects, std::vector<Rect> &dst, FreeRectChoiceHeuristic method)
+void MaxRectsBinPack::Insert(std::vector<RectSize> &rects, std::vector<Rect> &dst, FreeRectChoiceHeuristic method, std::vector<int> *dstIndices)
 {
 	dst.clear();
+	if (dstIndices)
+		dstIndices->clear();
+
+	std::vector<int> indices(rects.size());
+	for(size_t i = 0; i < indices.size(); ++i)
+		indices[i] = (int)i;
 
 	while(rects.size() > 0)
 	{
@@ -107,7 +115,11 @@ void MaxRectsBinPack::Insert(std::vector<RectSize> &rects, std::vector<Rect> &ds
 			return;
 
 		PlaceRect(bestNode);
+		dst.push_back(bestNode);
+		if (dstIndices)
+			dstIndices->push_back(indices[bestRectIndex]);
 		rects.erase(rects.begin() + bestRectIndex);
+		indices.erase(indices.begin() + bestRectIndex);
 	}
 }
 
@@ -127,7 +139,6 @@ void MaxRectsBinPack::PlaceRect(const Rect &node)
 	PruneFreeList();
 
 	usedRectangles.push_back(node);
-	//		dst.push_back(bestNode); ///\todo Refactor so that this compiles.
 }
 
 Rect MaxRectsBinPack::ScoreRect(int width, int height, FreeRectChoiceHeuristic method, int &score1, int &score2) const
@@ -189,7 +200,7 @@ Rect MaxRectsBinPack::FindPositionForNewNodeBottomLeft(int width, int height, in
 				bestX = freeRectangles[i].x;
 			}
 		}
-		if (freeRectangles[i].width >= height && freeRectangles[i].height >= width)
+		if (allowRotate && freeRectangles[i].width >= height && freeRectangles[i].height >= width)
 		{
 			int topSideY = freeRectangles[i].y + width;
 			if (topSideY < bestY || (topSideY == bestY && freeRectangles[i].x < bestX))
@@ -235,7 +246,7 @@ Rect MaxRectsBinPack::FindPositionForNewNodeBestShortSideFit(int width, int heig
 			}
 		}
 
-		if (freeRectangles[i].width >= height && freeRectangles[i].height >= width)
+		if (allowRotate && freeRectangles[i].width >= height && freeRectangles[i].height >= width)
 		{
 			int flippedLeftoverHoriz = abs(freeRectangles[i].width - height);
 			int flippedLeftoverVert = abs(freeRectangles[i].height - width);
@@ -285,7 +296,7 @@ Rect MaxRectsBinPack::FindPositionForNewNodeBestLongSideFit(int width, int heigh
 			}
 		}
 
-		if (freeRectangles[i].width >= height && freeRectangles[i].height >= width)
+		if (allowRotate && freeRectangles[i].width >= height && freeRectangles[i].height >= width)
 		{
 			int leftoverHoriz = abs(freeRectangles[i].width - height);
 			int leftoverVert = abs(freeRectangles[i].height - width);
@@ -336,7 +347,7 @@ Rect MaxRectsBinPack::FindPositionForNewNodeBestAreaFit(int width, int height,
 			}
 		}
 
-		if (freeRectangles[i].width >= height && freeRectangles[i].height >= width)
+		if (allowRotate && freeRectangles[i].width >= height && freeRectangles[i].height >= width)
 		{
 			int leftoverHoriz = abs(freeRectangles[i].width - height);
 			int leftoverVert = abs(freeRectangles[i].height - width);
@@ -405,7 +416,7 @@ Rect MaxRectsBinPack::FindPositionForNewNodeContactPoint(int width, int height,
 				bestContactScore = score;
 			}
 		}
-		if (freeRectangles[i].width >= height && freeRectangles[i].height >= width)
+		if (allowRotate && freeRectangles[i].width >= height && freeRectangles[i].height >= width)
 		{
 			int score = ContactPointScoreNode(freeRectangles[i].x, freeRectangles[i].y, width, height);
 			if (score > bestContactScore)
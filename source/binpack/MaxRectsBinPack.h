@@ -20,11 +20,12 @@ public:
 	MaxRectsBinPack();
 
 	/// Instantiates a bin of the given size.
-	MaxRectsBinPack(int width, int height);
+	MaxRectsBinPack(int width, int height, bool allowRotate = true);
 
 	/// (Re)initializes the packer to an empty bin of width x height units. Call whenever
 	/// you need to restart with a new bin.
-	void Init(int width, int height);
+	/// @param allowRotate If false, the rectangles are never rotated.
+	void Init(int width, int height, bool allowRotate = true);
 
 	/// Specifies the different heuristic rules that can be used when deciding where to place a new rectangle.
 	enum FreeRectChoiceHeuristic
@@ -40,7 +41,8 @@ public:
 	/// @param rects The list of rectangles to insert. This vector will be destroyed in the process.
 	/// @param dst [out] This list will contain the packed rectangles. The indices will not correspond to that of rects.
 	/// @param method The rectangle placement rule to use when packing.
-	void Insert(std::vector<RectSize> &rects, std::vector<Rect> &dst, FreeRectChoiceHeuristic method);
+	/// @param dstIndices [out] If not null, this list will contain the index in rects of each packed rectangle.
+	void Insert(std::vector<RectSize> &rects, std::vector<Rect> &dst, FreeRectChoiceHeuristic method, std::vector<int> *dstIndices = 0);
 
 	/// Inserts a single rectangle into the bin, possibly rotated.
 	Rect Insert(int width, int height, FreeRectChoiceHeuristic method);
@@ -51,6 +53,7 @@ public:
 private:
 	int binWidth;
 	int binHeight;
+	bool allowRotate;
 
 	std::vector<Rect> usedRectangles;
 	std::vector<Rect> freeRectangles;
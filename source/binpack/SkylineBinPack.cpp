@@ -48,14 +48,20 @@ void SkylineBinPack::Init(int width, int height, bool useWasteMap_, bool allowRo
 
 	if (useWasteMap)
 	{
-		wasteMap.Init(width, height);
+		wasteMap.Init(width, height, allowRotate);
 		wasteMap.GetFreeRectangles().clear();
 	}
 }
 
-void SkylineBinPack::Insert(std::vector<RectSize> &rects, std::vector<Rect> &dst, LevelChoiceHeuristic method)
+void SkylineBinPack::Insert(std::vector<RectSize> &rects, std::vector<Rect> &dst, LevelChoiceHeuristic method, std::vector<int> *dstIndices)
 {
 	dst.clear();
+	if (dstIndices)
+		dstIndices->clear();
+
+	std::vector<int> indices(rects.size());
+	for(size_t i = 0; i < indices.size(); ++i)
+		indices[i] = (int)i;
 
 	while(rects.size() > 0)
 	{
@@ -111,6 +117,9 @@ void SkylineBinPack::Insert(std::vector<RectSize> &rects, std::vector<Rect> &dst
 		usedSurfaceArea += rects[bestRectIndex].width * rects[bestRectIndex].height;
 		rects.erase(rects.begin() + bestRectIndex);
 		dst.push_back(bestNode);
+		if (dstIndices)
+			dstIndices->push_back(indices[bestRectIndex]);
+		indices.erase(indices.begin() + bestRectIndex);
 	}
 }
 
@@ -400,7 +409,7 @@ Rect SkylineBinPack::FindPositionForNewNodeMinWaste(int width, int height, int &
 #endif
 			}
 		}
-		if (RectangleFits(i, height, width, y, wastedArea))
+		if (allowRotate && RectangleFits(i, height, width, y, wastedArea))
 		{
 			if (wastedArea < bestWastedArea || (wastedArea == bestWastedArea && y + width < bestHeight))
 			{
@@ -268,3 +268,423 @@ void calculate_sedt(const Image* image, float radius, void* out)
 			_calculate_sedt<double, 1>( image, radius, out );
 	}
 }
+
+
+/* Anti-aliased euclidean distance transform
+ * Computes the distance field directly from an anti-aliased rendering, by estimating the
+ * sub pixel position of the edge from the coverage and the gradient of each edge pixel.
+ *
+ * Stefan Gustavson and Robin Strand, "Anti-aliased Euclidean distance transform", 2011
+ * http://contourtextures.wikidot.com/
+*/
+
+#define SQRT2 1.4142136
+
+// The distance from the pixel center to the edge, given the (normalized) gradient and the coverage
+static double edgedf(double gx, double gy, double a)
+{
+	if( gx == 0 || gy == 0 )
+	{
+		return 0.5 - a;
+	}
+
+	double glength = sqrt(gx*gx + gy*gy);
+	gx = fabs(gx / glength);
+	gy = fabs(gy / glength);
+	if( gx < gy )
+	{
+		double tmp = gx;
+		gx = gy;
+		gy = tmp;
+	}
+
+	double a1 = 0.5 * gy / gx;
+	if( a < a1 )
+		return 0.5 * (gx + gy) - sqrt(2.0 * gx * gy * a);
+	else if( a < (1.0 - a1) )
+		return (0.5 - a) * gx;
+	return -0.5 * (gx + gy) + sqrt(2.0 * gx * gy * (1.0 - a));
+}
+
+class AAEDT
+{
+private:
+	struct Pixel
+	{
+		double  dist;
+		int     seed;	// the index of the closest edge pixel
+		int16_t seedx;
+		int16_t seedy;
+	};
+
+	int w, h;
+	const double* img;
+	double* gx;
+	double* gy;
+	Pixel* pixels;
+
+	double distaa(int s, int dx, int dy) const
+	{
+		double a = img[s];
+		double di = sqrt((double)(dx*dx + dy*dy));
+		if( di == 0 )
+			return edgedf(gx[s], gy[s], a);
+		return di + edgedf(dx, dy, a);
+	}
+
+	inline bool updatePix(int idx, int x, int y, int xOffset, int yOffset)
+	{
+		if (x+xOffset < 0 || x+xOffset >= w || y+yOffset < 0 || y+yOffset >= h)
+		{
+			return false;
+		}
+
+		const Pixel& n = pixels[idx + yOffset * w + xOffset];
+		Pixel& p = pixels[idx];
+		if( n.seed < 0 || n.seed == p.seed )
+			return false;
+
+		// the edge is at most half a pixel diagonal from the seed pixel center,
+		// so most candidates can be rejected without calculating the actual distance
+		int dx = x - n.seedx;
+		int dy = y - n.seedy;
+		double bound = p.dist + 0.5 * SQRT2;
+		if( bound <= 0 || double(dx*dx + dy*dy) >= bound*bound )
+			return false;
+
+		double d = distaa(n.seed, dx, dy);
+		if( d < p.dist - 1e-5 )
+		{
+			p.dist = d;
+			p.seed = n.seed;
+			p.seedx = n.seedx;
+			p.seedy = n.seedy;
+			return true;
+		}
+		return false;
+	}
+
+	void computeGradient()
+	{
+		for( int i = 0; i < w*h; ++i )
+		{
+			gx[i] = 0;
+			gy[i] = 0;
+		}
+
+		for( int y = 1; y < h-1; ++y )
+		{
+			for( int x = 1; x < w-1; ++x )
+			{
+				int i = y*w + x;
+				if( img[i] <= 0.0 || img[i] >= 1.0 )
+					continue;
+
+				double dx = -img[i-w-1] - SQRT2*img[i-1] - img[i+w-1] + img[i-w+1] + SQRT2*img[i+1] + img[i+w+1];
+				double dy = -img[i-w-1] - SQRT2*img[i-w] - img[i-w+1] + img[i+w-1] + SQRT2*img[i+w] + img[i+w+1];
+				double length = dx*dx + dy*dy;
+				if( length > 0 )
+				{
+					length = sqrt(length);
+					dx /= length;
+					dy /= length;
+				}
+				gx[i] = dx;
+				gy[i] = dy;
+			}
+		}
+	}
+
+public:
+	// Computes the distance from each pixel to the shape given by the coverage 'img' (0.0 - 1.0)
+	void compute(int _w, int _h, const double* _img, double* outDist)
+	{
+		w = _w;
+		h = _h;
+		img = _img;
+		gx = new double[w*h];
+		gy = new double[w*h];
+		pixels = new Pixel[w*h];
+
+		computeGradient();
+
+		for( int i = 0; i < w*h; ++i )
+		{
+			Pixel& p = pixels[i];
+			if( img[i] <= 0.0 )
+			{
+				p.seed = -1;
+				p.dist = 1000000.0;
+			}
+			else
+			{
+				p.seed = i;
+				p.seedx = int16_t(i % w);
+				p.seedy = int16_t(i / w);
+				p.dist = img[i] < 1.0 ? edgedf(gx[i], gy[i], img[i]) : 0.0;
+			}
+		}
+
+		bool changed = true;
+		while( changed )
+		{
+			changed = false;
+
+			// Pass 0
+			for (int y=0;y<h;y++)
+			{
+				int idx = y*w;
+				for (int x=0;x<w;x++, ++idx)
+				{
+					changed |= updatePix( idx, x, y, -1,  0 );
+					changed |= updatePix( idx, x, y,  0, -1 );
+					changed |= updatePix( idx, x, y, -1, -1 );
+					changed |= updatePix( idx, x, y,  1, -1 );
+				}
+
+				--idx;
+				for (int x=w-1; x>=0; x--, --idx)
+				{
+					changed |= updatePix( idx, x, y, 1, 0 );
+				}
+			}
+
+			// Pass 1
+			for (int y=h-1; y>=0; y--)
+			{
+				int idx = (y+1)*w - 1;
+				for (int x=w-1; x>=0; x--, --idx)
+				{
+					changed |= updatePix( idx, x, y,  1,  0 );
+					changed |= updatePix( idx, x, y,  0,  1 );
+					changed |= updatePix( idx, x, y, -1,  1 );
+					changed |= updatePix( idx, x, y,  1,  1 );
+				}
+
+				++idx;
+				for (int x=0;x<w;x++, ++idx)
+				{
+					changed |= updatePix( idx, x, y, -1, 0 );
+				}
+			}
+		}
+
+		for( int i = 0; i < w*h; ++i )
+		{
+			outDist[i] = pixels[i].dist < 0 ? 0 : pixels[i].dist;
+		}
+
+		delete[] gx;
+		delete[] gy;
+		delete[] pixels;
+	}
+};
+
+template<typename DTYPE, size_t MAX>
+static void _calculate_aaedt(const Image* image, float radius, void* _out)
+{
+	const size_t w = image->m_Width;
+	const size_t h = image->m_Height;
+	const size_t pagesize = w * h;
+
+	const DTYPE* src = (const DTYPE*)image->m_Data;
+	DTYPE* out = (DTYPE*)_out;
+
+	double* coverage = new double[pagesize * 4];
+	double* inverted = coverage + pagesize;
+	double* outside = coverage + pagesize * 2;
+	double* inside = coverage + pagesize * 3;
+
+	for( size_t i = 0; i < pagesize; ++i )
+	{
+		double a = double(src[i]) / MAX;
+		a = a < 0.0 ? 0.0 : (a > 1.0 ? 1.0 : a);
+		coverage[i] = a;
+		inverted[i] = 1.0 - a;
+	}
+
+	AAEDT aaedt;
+	aaedt.compute(w, h, coverage, outside);
+	aaedt.compute(w, h, inverted, inside);
+
+	for( size_t i = 0; i < pagesize; ++i )
+	{
+		float value = float(inside[i] - outside[i]) / radius;
+		value = (value * 0.5f) + 0.5f;
+		value = fmin(1.0f, fmax(0.0f, value));
+
+		// scale back to input range
+		out[i] = DTYPE(value * MAX);
+	}
+
+	delete [] coverage;
+}
+
+void calculate_aaedt(const Image* image, float radius, void* out)
+{
+	if( image->m_Channels > 1)
+	{
+		printf("calculate_aaedt supports 1 channel only\n");
+		return;
+	}
+
+	if( image->m_Type == E_UINT )
+	{
+		if( image->m_ChannelDepth == 8 )
+			_calculate_aaedt<uint8_t, 255>( image, radius, out );
+		else if( image->m_ChannelDepth == 16 )
+			_calculate_aaedt<uint16_t, 65535>( image, radius, out );
+		else
+		{
+			assert(false && "UINT Not implemented!!");
+		}
+	}
+	else if( image->m_Type == E_FLOAT )
+	{
+		if( image->m_ChannelDepth == 32 )
+			_calculate_aaedt<float, 1>( image, radius, out );
+		else if( image->m_ChannelDepth == 64 )
+			_calculate_aaedt<double, 1>( image, radius, out );
+	}
+}
+
+
+/* Exact euclidean distance transform
+ * A separable transform that computes the squared distances with one pass over the columns and one over the rows,
+ * in linear time.
+ *
+ * Pedro F. Felzenszwalb and Daniel P. Huttenlocher, "Distance Transforms of Sampled Functions", 2012
+ * http://cs.brown.edu/people/pfelzens/dt/
+ *
+ * Anti-aliased pixels are seeded with the (squared) distance from the pixel center to the edge,
+ * estimated from the coverage alone.
+*/
+
+#define EDT_INF 1e20
+
+// The 1D squared distance transform of f, with the stride between the elements
+static void edt1d(double* f, int n, int stride, double* d, int* v, double* z)
+{
+	for( int q = 0; q < n; ++q )
+		d[q] = f[q * stride];
+
+	int k = 0;
+	v[0] = 0;
+	z[0] = -EDT_INF;
+	z[1] = EDT_INF;
+	for( int q = 1; q < n; ++q )
+	{
+		// find where the parabola from q intersects the lower envelope
+		double s = ((d[q] + q*q) - (d[v[k]] + v[k]*v[k])) / (2*q - 2*v[k]);
+		while( s <= z[k] )
+		{
+			--k;
+			s = ((d[q] + q*q) - (d[v[k]] + v[k]*v[k])) / (2*q - 2*v[k]);
+		}
+		++k;
+		v[k] = q;
+		z[k] = s;
+		z[k+1] = EDT_INF;
+	}
+
+	k = 0;
+	for( int q = 0; q < n; ++q )
+	{
+		while( z[k+1] < q )
+			++k;
+		int r = v[k];
+		f[q * stride] = (q - r) * (q - r) + d[r];
+	}
+}
+
+// The 2D squared distance transform, in place
+static void edt2d(double* grid, int w, int h, double* d, int* v, double* z)
+{
+	for( int x = 0; x < w; ++x )
+		edt1d(grid + x, h, w, d, v, z);
+	for( int y = 0; y < h; ++y )
+		edt1d(grid + y * w, w, 1, d, v, z);
+}
+
+template<typename DTYPE, size_t MAX>
+static void _calculate_edt(const Image* image, float radius, void* _out)
+{
+	const size_t w = image->m_Width;
+	const size_t h = image->m_Height;
+	const size_t pagesize = w * h;
+	const size_t maxdim = w > h ? w : h;
+
+	const DTYPE* src = (const DTYPE*)image->m_Data;
+	DTYPE* out = (DTYPE*)_out;
+
+	double* outer = new double[pagesize * 2 + maxdim * 2 + 1];
+	double* inner = outer + pagesize;
+	double* d = inner + pagesize;
+	double* z = d + maxdim;
+	int* v = new int[maxdim];
+
+	for( size_t i = 0; i < pagesize; ++i )
+	{
+		double a = double(src[i]) / MAX;
+		if( a >= 1.0 )
+		{
+			outer[i] = 0;
+			inner[i] = EDT_INF;
+		}
+		else if( a <= 0.0 )
+		{
+			outer[i] = EDT_INF;
+			inner[i] = 0;
+		}
+		else
+		{
+			double df = 0.5 - a;	// > 0 if the pixel center is outside the edge
+			outer[i] = df > 0 ? df * df : 0;
+			inner[i] = df < 0 ? df * df : 0;
+		}
+	}
+
+	edt2d(outer, w, h, d, v, z);
+	edt2d(inner, w, h, d, v, z);
+
+	for( size_t i = 0; i < pagesize; ++i )
+	{
+		float value = float(sqrt(inner[i]) - sqrt(outer[i])) / radius;
+		value = (value * 0.5f) + 0.5f;
+		value = fmin(1.0f, fmax(0.0f, value));
+
+		// scale back to input range
+		out[i] = DTYPE(value * MAX);
+	}
+
+	delete [] outer;
+	delete [] v;
+}
+
+void calculate_edt(const Image* image, float radius, void* out)
+{
+	if( image->m_Channels > 1)
+	{
+		printf("calculate_edt supports 1 channel only\n");
+		return;
+	}
+
+	if( image->m_Type == E_UINT )
+	{
+		if( image->m_ChannelDepth == 8 )
+			_calculate_edt<uint8_t, 255>( image, radius, out );
+		else if( image->m_ChannelDepth == 16 )
+			_calculate_edt<uint16_t, 65535>( image, radius, out );
+		else
+		{
+			assert(false && "UINT Not implemented!!");
+		}
+	}
+	else if( image->m_Type == E_FLOAT )
+	{
+		if( image->m_ChannelDepth == 32 )
+			_calculate_edt<float, 1>( image, radius, out );
+		else if( image->m_ChannelDepth == 64 )
+			_calculate_edt<double, 1>( image, radius, out );
+	}
+}
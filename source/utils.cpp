@@ -1,10 +1,39 @@
 #include "utils.h"
 #include <stdio.h>
 #include <float.h>
+#include <stddef.h>
+#include <math.h>
+
+// Splits the following loop over the given number of threads (0 = all cores), if compiled with OpenMP
+#if defined(_OPENMP)
+	#include <omp.h>
+	#if defined(_MSC_VER)
+		#define PARALLEL_FOR(threads) __pragma(omp parallel for num_threads(threads ? threads : omp_get_max_threads()))
+	#else
+		#define _PRAGMA(x) _Pragma(#x)
+		#define PARALLEL_FOR(threads) _PRAGMA(omp parallel for num_threads(threads ? threads : omp_get_max_threads()))
+	#endif
+#else
+	#define PARALLEL_FOR(threads)
+#endif
+
+
+uint32_t get_version()
+{
+	return UTILS_VERSION;
+}
 
+uint32_t get_max_threads()
+{
+#if defined(_OPENMP)
+	return omp_get_max_threads();
+#else
+	return 1;
+#endif
+}
 
 template<typename DTYPE, size_t MAX>
-static void _convolve1d(const Image* image, const float* kernel, size_t kernelsize, size_t axis, void* _out)
+static void _convolve1d(const Image* image, const float* kernel, size_t kernelsize, size_t axis, uint32_t threads, void* _out)
 {
 	const size_t width = image->m_Width;
 	const size_t height = image->m_Height;
@@ -17,7 +46,8 @@ static void _convolve1d(const Image* image, const float* kernel, size_t kernelsi
 
 	if( axis == 0 )
 	{
-		for( size_t y = 0; y < height; ++y )
+		PARALLEL_FOR(threads)
+		for( int y = 0; y < (int)height; ++y )
 		{
 			for( size_t x = 0; x < width; ++x )
 			{
@@ -25,13 +55,16 @@ static void _convolve1d(const Image* image, const float* kernel, size_t kernelsi
 				{
 					const int32_t xx = x - halfkernelsize;
 
+					// The pixels outside of the image are 0. (Before, a window that started outside of the image
+					// summed to 0, and a window that ended outside of it read past the row)
 					double sum = 0;
 					for( size_t i = 0; i < kernelsize; ++i )
 					{
+						const int32_t xi = xx + i;
 						double value = 0;
-						if( xx >= 0 && xx < (int32_t)width )
+						if( xi >= 0 && xi < (int32_t)width )
 						{
-							value = data[y * rowsize + (xx + i) * channels + c];
+							value = data[y * rowsize + xi * channels + c];
 						}
 						sum += value * kernel[i];
 					}
@@ -46,7 +79,8 @@ static void _convolve1d(const Image* image, const float* kernel, size_t kernelsi
 	}
 	else
 	{
-		for( size_t x = 0; x < width; ++x )
+		PARALLEL_FOR(threads)
+		for( int x = 0; x < (int)width; ++x )
 		{
 			for( size_t y = 0; y < height; ++y )
 			{
@@ -54,13 +88,15 @@ static void _convolve1d(const Image* image, const float* kernel, size_t kernelsi
 				{
 					const int32_t yy = y - halfkernelsize;
 
+					// The pixels outside of the image are 0, see above
 					double sum = 0;
 					for( size_t i = 0; i < kernelsize; ++i )
 					{
+						const int32_t yi = yy + i;
 						double value = 0;
-						if( yy >= 0 && yy < (int32_t)height )
+						if( yi >= 0 && yi < (int32_t)height )
 						{
-							value = data[(yy + i) * rowsize + x * channels + c];
+							value = data[yi * rowsize + x * channels + c];
 						}
 						sum += value * kernel[i];
 					}
@@ -76,7 +112,7 @@ static void _convolve1d(const Image* image, const float* kernel, size_t kernelsi
 }
 
 template<typename DTYPE, size_t MAX>
-static void _convolve1d_stacked(const Image* image, const float* kernel, size_t kernelsize, size_t axis, void* _out)
+static void _convolve1d_stacked(const Image* image, const float* kernel, size_t kernelsize, size_t axis, uint32_t threads, void* _out)
 {
 	const size_t width = image->m_Width;
 	const size_t height = image->m_Height;
@@ -91,7 +127,8 @@ static void _convolve1d_stacked(const Image* image, const float* kernel, size_t
 	{
 		for( size_t c = 0; c < channels; ++c )
 		{
-			for( size_t y = 0; y < height; ++y )
+			PARALLEL_FOR(threads)
+			for( int y = 0; y < (int)height; ++y )
 			{
 				for( size_t x = 0; x < width; ++x )
 				{
@@ -121,7 +158,8 @@ static void _convolve1d_stacked(const Image* image, const float* kernel, size_t
 	{
 		for( size_t c = 0; c < channels; ++c )
 		{
-			for( size_t x = 0; x < width; ++x )
+			PARALLEL_FOR(threads)
+			for( int x = 0; x < (int)width; ++x )
 			{
 				for( size_t y = 0; y < height; ++y )
 				{
@@ -149,31 +187,31 @@ static void _convolve1d_stacked(const Image* image, const float* kernel, size_t
 }
 
 
-void convolve1d(const Image* image, const float* kernel, size_t kernelsize, size_t axis, void* out)
+void convolve1d(const Image* image, const float* kernel, size_t kernelsize, size_t axis, uint32_t threads, void* out)
 {
 	if( image->m_Type == E_UINT )
 	{
 		if( image->m_Layout == E_INTERLEAVED )
 		{
 			if( image->m_ChannelDepth == 8 )
-				_convolve1d<uint8_t, 255>( image, kernel, kernelsize, axis, out);
+				_convolve1d<uint8_t, 255>( image, kernel, kernelsize, axis, threads, out);
 			else if( image->m_ChannelDepth == 16 )
-				_convolve1d<uint16_t, 65535>( image, kernel, kernelsize, axis, out);
+				_convolve1d<uint16_t, 65535>( image, kernel, kernelsize, axis, threads, out);
 			else if( image->m_ChannelDepth == 32 )
-				_convolve1d<uint32_t, 0xFFFFFFFF>( image, kernel, kernelsize, axis, out);
+				_convolve1d<uint32_t, 0xFFFFFFFF>( image, kernel, kernelsize, axis, threads, out);
 			else if( image->m_ChannelDepth == 64 )
-				_convolve1d<uint64_t, 0xFFFFFFFF>( image, kernel, kernelsize, axis, out);
+				_convolve1d<uint64_t, 0xFFFFFFFF>( image, kernel, kernelsize, axis, threads, out);
 		}
 		else
 		{
 			if( image->m_ChannelDepth == 8 )
-				_convolve1d_stacked<uint8_t, 255>( image, kernel, kernelsize, axis, out);
+				_convolve1d_stacked<uint8_t, 255>( image, kernel, kernelsize, axis, threads, out);
 			else if( image->m_ChannelDepth == 16 )
-				_convolve1d_stacked<uint16_t, 65535>( image, kernel, kernelsize, axis, out);
+				_convolve1d_stacked<uint16_t, 65535>( image, kernel, kernelsize, axis, threads, out);
 			else if( image->m_ChannelDepth == 32 )
-				_convolve1d_stacked<uint32_t, 0xFFFFFFFF>( image, kernel, kernelsize, axis, out);
+				_convolve1d_stacked<uint32_t, 0xFFFFFFFF>( image, kernel, kernelsize, axis, threads, out);
 			else if( image->m_ChannelDepth == 64 )
-				_convolve1d_stacked<uint64_t, 0xFFFFFFFF>( image, kernel, kernelsize, axis, out);
+				_convolve1d_stacked<uint64_t, 0xFFFFFFFF>( image, kernel, kernelsize, axis, threads, out);
 		}
 	}
 	else // float
@@ -181,23 +219,23 @@ void convolve1d(const Image* image, const float* kernel, size_t kernelsize, size
 		if( image->m_Layout == E_INTERLEAVED )
 		{
 			if( image->m_ChannelDepth == 32 )
-				_convolve1d<float, 1>( image, kernel, kernelsize, axis, out);
+				_convolve1d<float, 1>( image, kernel, kernelsize, axis, threads, out);
 			else if( image->m_ChannelDepth == 64 )
-				_convolve1d<double, 1>( image, kernel, kernelsize, axis, out);
+				_convolve1d<double, 1>( image, kernel, kernelsize, axis, threads, out);
 		}
 		else
 		{
 			if( image->m_ChannelDepth == 32 )
-				_convolve1d_stacked<float, 1>( image, kernel, kernelsize, axis, out);
+				_convolve1d_stacked<float, 1>( image, kernel, kernelsize, axis, threads, out);
 			else if( image->m_ChannelDepth == 64 )
-				_convolve1d_stacked<double, 1>( image, kernel, kernelsize, axis, out);
+				_convolve1d_stacked<double, 1>( image, kernel, kernelsize, axis, threads, out);
 		}
 	}
 }
 
 
 template<typename DTYPE, size_t MAX>
-static void _minmax(const Image* image, const float* kernel, size_t kernelwidth, size_t kernelheight, bool maximum, void* _out)
+static void _minmax(const Image* image, const float* kernel, size_t kernelwidth, size_t kernelheight, bool maximum, uint32_t threads, void* _out)
 {
 	const size_t width = image->m_Width;
 	const size_t height = image->m_Height;
@@ -205,7 +243,8 @@ static void _minmax(const Image* image, const float* kernel, size_t kernelwidth,
 	const DTYPE* data = (DTYPE*)image->m_Data;
 	DTYPE* out = (DTYPE*)_out;
 
-	for( size_t y = 0; y < height; ++y )
+	PARALLEL_FOR(threads)
+	for( int y = 0; y < (int)height; ++y )
 	{
 		for( size_t x = 0; x < width; ++x )
 		{
@@ -251,7 +290,7 @@ static void _minmax(const Image* image, const float* kernel, size_t kernelwidth,
 }
 
 template<typename DTYPE, size_t MAX>
-static void _minmax_stacked(const Image* image, const float* kernel, size_t kernelwidth, size_t kernelheight, bool maximum, void* _out)
+static void _minmax_stacked(const Image* image, const float* kernel, size_t kernelwidth, size_t kernelheight, bool maximum, uint32_t threads, void* _out)
 {
 	const size_t width = image->m_Width;
 	const size_t height = image->m_Height;
@@ -262,7 +301,8 @@ static void _minmax_stacked(const Image* image, const float* kernel, size_t kern
 
 	for( size_t c = 0; c < channels; ++c )
 	{
-		for( size_t y = 0; y < height; ++y )
+		PARALLEL_FOR(threads)
+		for( int y = 0; y < (int)height; ++y )
 		{
 			for( size_t x = 0; x < width; ++x )
 			{
@@ -308,27 +348,27 @@ static void _minmax_stacked(const Image* image, const float* kernel, size_t kern
 }
 
 
-void maximum(const Image* image, const float* kernel, size_t kernelwidth, size_t kernelheight, void* out)
+void maximum(const Image* image, const float* kernel, size_t kernelwidth, size_t kernelheight, uint32_t threads, void* out)
 {
 	if( image->m_Type == E_UINT )
 	{
 		if( image->m_Layout == E_INTERLEAVED )
 		{
 			if( image->m_ChannelDepth == 8 )
-				_minmax<uint8_t, 255>(image, kernel, kernelwidth, kernelheight, true, out);
+				_minmax<uint8_t, 255>(image, kernel, kernelwidth, kernelheight, true, threads, out);
 			else if( image->m_ChannelDepth == 16 )
-				_minmax<uint16_t, 65535>(image, kernel, kernelwidth, kernelheight, true, out);
+				_minmax<uint16_t, 65535>(image, kernel, kernelwidth, kernelheight, true, threads, out);
 			else if( image->m_ChannelDepth == 32 )
-				_minmax<uint32_t, 0xFFFFFFFF>(image, kernel, kernelwidth, kernelheight, true, out);
+				_minmax<uint32_t, 0xFFFFFFFF>(image, kernel, kernelwidth, kernelheight, true, threads, out);
 		}
 		else
 		{
 			if( image->m_ChannelDepth == 8 )
-				_minmax_stacked<uint8_t, 255>(image, kernel, kernelwidth, kernelheight, true, out);
+				_minmax_stacked<uint8_t, 255>(image, kernel, kernelwidth, kernelheight, true, threads, out);
 			else if( image->m_ChannelDepth == 16 )
-				_minmax_stacked<uint16_t, 65535>(image, kernel, kernelwidth, kernelheight, true, out);
+				_minmax_stacked<uint16_t, 65535>(image, kernel, kernelwidth, kernelheight, true, threads, out);
 			else if( image->m_ChannelDepth == 32 )
-				_minmax_stacked<uint32_t, 0xFFFFFFFF>(image, kernel, kernelwidth, kernelheight, true, out);
+				_minmax_stacked<uint32_t, 0xFFFFFFFF>(image, kernel, kernelwidth, kernelheight, true, threads, out);
 		}
 	}
 	else // float
@@ -336,42 +376,42 @@ void maximum(const Image* image, const float* kernel, size_t kernelwidth, size_t
 		if( image->m_Layout == E_INTERLEAVED )
 		{
 			if( image->m_ChannelDepth == 32 )
-				_minmax<float, 255>(image, kernel, kernelwidth, kernelheight, true, out);
+				_minmax<float, 255>(image, kernel, kernelwidth, kernelheight, true, threads, out);
 			else if( image->m_ChannelDepth == 64 )
-				_minmax<double, 255>(image, kernel, kernelwidth, kernelheight, true, out);
+				_minmax<double, 255>(image, kernel, kernelwidth, kernelheight, true, threads, out);
 		}
 		else // stacked
 		{
 			if( image->m_ChannelDepth == 32 )
-				_minmax_stacked<float, 255>(image, kernel, kernelwidth, kernelheight, true, out);
+				_minmax_stacked<float, 255>(image, kernel, kernelwidth, kernelheight, true, threads, out);
 			else if( image->m_ChannelDepth == 64 )
-				_minmax_stacked<double, 255>(image, kernel, kernelwidth, kernelheight, true, out);
+				_minmax_stacked<double, 255>(image, kernel, kernelwidth, kernelheight, true, threads, out);
 		}
 	}
 }
 
 
-void minimum(const Image* image, const float* kernel, size_t kernelwidth, size_t kernelheight, void* out)
+void minimum(const Image* image, const float* kernel, size_t kernelwidth, size_t kernelheight, uint32_t threads, void* out)
 {
 	if( image->m_Type == E_UINT )
 	{
 		if( image->m_Layout == E_INTERLEAVED )
 		{
 			if( image->m_ChannelDepth == 8 )
-				_minmax<uint8_t, 255>(image, kernel, kernelwidth, kernelheight, false, out);
+				_minmax<uint8_t, 255>(image, kernel, kernelwidth, kernelheight, false, threads, out);
 			else if( image->m_ChannelDepth == 16 )
-				_minmax<uint16_t, 65535>(image, kernel, kernelwidth, kernelheight, false, out);
+				_minmax<uint16_t, 65535>(image, kernel, kernelwidth, kernelheight, false, threads, out);
 			else if( image->m_ChannelDepth == 32 )
-				_minmax<uint32_t, 0xFFFFFFFF>(image, kernel, kernelwidth, kernelheight, false, out);
+				_minmax<uint32_t, 0xFFFFFFFF>(image, kernel, kernelwidth, kernelheight, false, threads, out);
 		}
 		else
 		{
 			if( image->m_ChannelDepth == 8 )
-				_minmax_stacked<uint8_t, 255>(image, kernel, kernelwidth, kernelheight, false, out);
+				_minmax_stacked<uint8_t, 255>(image, kernel, kernelwidth, kernelheight, false, threads, out);
 			else if( image->m_ChannelDepth == 16 )
-				_minmax_stacked<uint16_t, 65535>(image, kernel, kernelwidth, kernelheight, false, out);
+				_minmax_stacked<uint16_t, 65535>(image, kernel, kernelwidth, kernelheight, false, threads, out);
 			else if( image->m_ChannelDepth == 32 )
-				_minmax_stacked<uint32_t, 0xFFFFFFFF>(image, kernel, kernelwidth, kernelheight, false, out);
+				_minmax_stacked<uint32_t, 0xFFFFFFFF>(image, kernel, kernelwidth, kernelheight, false, threads, out);
 		}
 	}
 	else // float
@@ -379,21 +419,229 @@ void minimum(const Image* image, const float* kernel, size_t kernelwidth, size_t
 		if( image->m_Layout == E_INTERLEAVED )
 		{
 			if( image->m_ChannelDepth == 32 )
-				_minmax<float, 255>(image, kernel, kernelwidth, kernelheight, false, out);
+				_minmax<float, 255>(image, kernel, kernelwidth, kernelheight, false, threads, out);
 			else if( image->m_ChannelDepth == 64 )
-				_minmax<double, 255>(image, kernel, kernelwidth, kernelheight, false, out);
+				_minmax<double, 255>(image, kernel, kernelwidth, kernelheight, false, threads, out);
 		}
 		else
 		{
 			if( image->m_ChannelDepth == 32 )
-				_minmax_stacked<float, 255>(image, kernel, kernelwidth, kernelheight, false, out);
+				_minmax_stacked<float, 255>(image, kernel, kernelwidth, kernelheight, false, threads, out);
 			else if( image->m_ChannelDepth == 64 )
-				_minmax_stacked<double, 255>(image, kernel, kernelwidth, kernelheight, false, out);
+				_minmax_stacked<double, 255>(image, kernel, kernelwidth, kernelheight, false, threads, out);
+		}
+	}
+}
+
+
+// The maximum over a window of 2*radius+1 values along a line, with 3 comparisons per value (van Herk/Gil-Werman).
+// The values outside of the line count as 0, like in maximum(). The line is updated in place.
+template<typename DTYPE>
+static void _maximum_line(DTYPE* data, size_t count, ptrdiff_t stride, size_t radius, DTYPE* g, DTYPE* h)
+{
+	const size_t window = radius * 2 + 1;
+	// the line is padded with radius zeros on both sides, and rounded up to whole windows
+	const size_t padded = ((count + radius * 2 + window - 1) / window) * window;
+
+	// the running maximum from the start of each window, and from the end of each window
+	for( size_t i = 0; i < padded; ++i )
+	{
+		const DTYPE value = (i >= radius && i < radius + count) ? data[(ptrdiff_t)(i - radius) * stride] : DTYPE(0);
+		g[i] = (i % window == 0 || value > g[i - 1]) ? value : g[i - 1];
+	}
+	for( size_t i = padded; i-- > 0; )
+	{
+		const DTYPE value = (i >= radius && i < radius + count) ? data[(ptrdiff_t)(i - radius) * stride] : DTYPE(0);
+		h[i] = ((i + 1) % window == 0 || value > h[i + 1]) ? value : h[i + 1];
+	}
+
+	// the window around value i is [i, i + 2*radius] in the padded line, which spans at most two windows
+	for( size_t i = 0; i < count; ++i )
+	{
+		const DTYPE a = h[i];
+		const DTYPE b = g[i + radius * 2];
+		data[(ptrdiff_t)i * stride] = a > b ? a : b;
+	}
+}
+
+template<typename DTYPE>
+static void _maximum_octagon(const Image* image, size_t radius, void* _out)
+{
+	const size_t width = image->m_Width;
+	const size_t height = image->m_Height;
+	const size_t channels = image->m_Channels;
+	const DTYPE* data = (DTYPE*)image->m_Data;
+	DTYPE* out = (DTYPE*)_out;
+
+	// The octagon is the sum of a horizontal, a vertical and two diagonal lines. It's closest to the disc when the
+	// diagonal lines make up a third of the radius. The straight lines are at least 3 pixels long, since the diagonal
+	// lines alone would leave holes.
+	size_t diagonal = (radius + 1) / 3;
+	if( radius < 1 + diagonal * 2 )
+		diagonal = radius > 0 ? (radius - 1) / 2 : 0;
+	const size_t straight = radius - diagonal * 2;
+
+	const ptrdiff_t xstride = image->m_Layout == E_INTERLEAVED ? channels : 1;
+	const ptrdiff_t ystride = xstride * width;
+	const size_t channelstride = image->m_Layout == E_INTERLEAVED ? 1 : width * height;
+
+	// Each channel is processed in a plane with a border of radius pixels, since the lines are applied one after
+	// the other, and a pixel may reach another one by way of pixels outside of the image
+	const size_t pw = width + radius * 2;
+	const size_t ph = height + radius * 2;
+	DTYPE* plane = new DTYPE[pw * ph];
+	const size_t maxcount = pw > ph ? pw : ph;
+	DTYPE* g = new DTYPE[maxcount + radius * 4 + 1];
+	DTYPE* h = new DTYPE[maxcount + radius * 4 + 1];
+
+	for( size_t c = 0; c < channels; ++c )
+	{
+		memset(plane, 0, pw * ph * sizeof(DTYPE));
+		for( size_t y = 0; y < height; ++y )
+			for( size_t x = 0; x < width; ++x )
+				plane[(y + radius) * pw + x + radius] = data[c * channelstride + y * ystride + x * xstride];
+
+		if( straight )
+		{
+			for( size_t y = 0; y < ph; ++y )
+				_maximum_line(plane + y * pw, pw, 1, straight, g, h);
+			for( size_t x = 0; x < pw; ++x )
+				_maximum_line(plane + x, ph, pw, straight, g, h);
 		}
+		if( diagonal )
+		{
+			const ptrdiff_t downright = pw + 1;
+			const ptrdiff_t downleft = pw - 1;
+			// the diagonals start on the top row, and on the left or right column
+			for( size_t x = 0; x < pw; ++x )
+				_maximum_line(plane + x, ph < pw - x ? ph : pw - x, downright, diagonal, g, h);
+			for( size_t y = 1; y < ph; ++y )
+				_maximum_line(plane + y * pw, pw < ph - y ? pw : ph - y, downright, diagonal, g, h);
+			for( size_t x = 0; x < pw; ++x )
+				_maximum_line(plane + x, ph < x + 1 ? ph : x + 1, downleft, diagonal, g, h);
+			for( size_t y = 1; y < ph; ++y )
+				_maximum_line(plane + y * pw + pw - 1, pw < ph - y ? pw : ph - y, downleft, diagonal, g, h);
+		}
+
+		for( size_t y = 0; y < height; ++y )
+			for( size_t x = 0; x < width; ++x )
+				out[c * channelstride + y * ystride + x * xstride] = plane[(y + radius) * pw + x + radius];
 	}
+
+	delete[] plane;
+	delete[] g;
+	delete[] h;
 }
 
+void maximum_octagon(const Image* image, size_t radius, void* out)
+{
+	if( image->m_Type == E_UINT )
+	{
+		if( image->m_ChannelDepth == 8 )
+			_maximum_octagon<uint8_t>(image, radius, out);
+		else if( image->m_ChannelDepth == 16 )
+			_maximum_octagon<uint16_t>(image, radius, out);
+		else if( image->m_ChannelDepth == 32 )
+			_maximum_octagon<uint32_t>(image, radius, out);
+	}
+	else // float
+	{
+		if( image->m_ChannelDepth == 32 )
+			_maximum_octagon<float>(image, radius, out);
+		else if( image->m_ChannelDepth == 64 )
+			_maximum_octagon<double>(image, radius, out);
+	}
+}
+
+
+// One line of the recursive gaussian. The values outside of the line count as 0, like in convolve1d().
+// The forward pass continues for pad values after the line, so that the backward pass starts from the tail of the blur.
+template<typename DTYPE, size_t MAX>
+static void _gaussian_blur_line(const DTYPE* in, DTYPE* out, size_t count, ptrdiff_t stride, size_t pad, const double* coef, double* line)
+{
+	const double B = coef[0], c1 = coef[1], c2 = coef[2], c3 = coef[3];
+
+	double w1 = 0, w2 = 0, w3 = 0;
+	for( size_t i = 0; i < count + pad; ++i )
+	{
+		const double value = i < count ? double(in[(ptrdiff_t)i * stride]) : 0.0;
+		const double w = B * value + c1 * w1 + c2 * w2 + c3 * w3;
+		line[i] = w;
+		w3 = w2; w2 = w1; w1 = w;
+	}
+
+	double y1 = 0, y2 = 0, y3 = 0;
+	for( size_t i = count + pad; i-- > 0; )
+	{
+		double y = B * line[i] + c1 * y1 + c2 * y2 + c3 * y3;
+		y3 = y2; y2 = y1; y1 = y;
+		if( i >= count )
+			continue;
+		if( y < 0 )
+			y = 0;
+		else if( y > MAX )
+			y = MAX;
+		out[(ptrdiff_t)i * stride] = DTYPE(y);
+	}
+}
+
+// The recursive gaussian from Young & van Vliet, "Recursive implementation of the Gaussian filter" (1995),
+// which costs the same for all sigmas
+template<typename DTYPE, size_t MAX>
+static void _gaussian_blur(const Image* image, double sigma, void* _out)
+{
+	const size_t width = image->m_Width;
+	const size_t height = image->m_Height;
+	const size_t channels = image->m_Channels;
+	const DTYPE* data = (DTYPE*)image->m_Data;
+	DTYPE* out = (DTYPE*)_out;
+
+	const double q = sigma >= 2.5 ? 0.98711 * sigma - 0.96330 : 3.97156 - 4.14554 * sqrt(1.0 - 0.26891 * sigma);
+	const double b0 = 1.57825 + 2.44413 * q + 1.4281 * q * q + 0.422205 * q * q * q;
+	const double b1 = 2.44413 * q + 2.85619 * q * q + 1.26661 * q * q * q;
+	const double b2 = -(1.4281 * q * q + 1.26661 * q * q * q);
+	const double b3 = 0.422205 * q * q * q;
+	const double coef[4] = { 1.0 - (b1 + b2 + b3) / b0, b1 / b0, b2 / b0, b3 / b0 };
+	const size_t pad = size_t(sigma * 4) + 3;
+
+	const ptrdiff_t xstride = image->m_Layout == E_INTERLEAVED ? channels : 1;
+	const ptrdiff_t ystride = xstride * width;
+	const size_t channelstride = image->m_Layout == E_INTERLEAVED ? 1 : width * height;
+
+	const size_t maxcount = width > height ? width : height;
+	double* line = new double[maxcount + pad];
 
+	// the rows are blurred into out, and then the columns are blurred in place
+	for( size_t c = 0; c < channels; ++c )
+	{
+		for( size_t y = 0; y < height; ++y )
+			_gaussian_blur_line<DTYPE, MAX>(data + c * channelstride + y * ystride, out + c * channelstride + y * ystride, width, xstride, pad, coef, line);
+		for( size_t x = 0; x < width; ++x )
+			_gaussian_blur_line<DTYPE, MAX>(out + c * channelstride + x * xstride, out + c * channelstride + x * xstride, height, ystride, pad, coef, line);
+	}
+
+	delete[] line;
+}
+
+void gaussian_blur(const Image* image, double sigma, void* out)
+{
+	if( image->m_Type == E_UINT )
+	{
+		if( image->m_ChannelDepth == 8 )
+			_gaussian_blur<uint8_t, 255>(image, sigma, out);
+		else if( image->m_ChannelDepth == 16 )
+			_gaussian_blur<uint16_t, 65535>(image, sigma, out);
+		else if( image->m_ChannelDepth == 32 )
+			_gaussian_blur<uint32_t, 0xFFFFFFFF>(image, sigma, out);
+	}
+	else // float
+	{
+		if( image->m_ChannelDepth == 32 )
+			_gaussian_blur<float, 1>(image, sigma, out);
+		else if( image->m_ChannelDepth == 64 )
+			_gaussian_blur<double, 1>(image, sigma, out);
+	}
+}
 template<typename DTYPE>
 static void _half_size(const Image* image, void* _out)
 {
@@ -416,10 +664,10 @@ static void _half_size(const Image* image, void* _out)
 				uint32_t yy = y*2;
 				for( uint32_t c = 0; c < channels; ++c)
 				{
-					double s0 = data[ yy * channels + xx * channels + c ];
-					double s1 = data[ yy * channels + (xx+1) * channels + c ];
-					double s2 = data[ (yy+1) * channels + xx * channels + c ];
-					double s3 = data[ (yy+1) * channels + (xx+1) * channels + c ];
+					double s0 = data[ yy * width * channels + xx * channels + c ];
+					double s1 = data[ yy * width * channels + (xx+1) * channels + c ];
+					double s2 = data[ (yy+1) * width * channels + xx * channels + c ];
+					double s3 = data[ (yy+1) * width * channels + (xx+1) * channels + c ];
 					out[ y * halfwidth * channels + x * channels + c] = DTYPE((s0 + s1 + s2 + s3) / 4.0);
 				}
 			}
@@ -469,3 +717,142 @@ void half_size(const Image* image, void* out)
 			_half_size<double>(image, out);
 	}
 }
+
+
+// Each output value is the average of a factor x factor block. The integer types are summed as integers. The input rows of a block are first summed into one
+// row, which is a contiguous loop that the compiler can vectorize, and then the columns of that row are summed.
+template<typename DTYPE, typename SUMTYPE>
+static void _downsample(const Image* image, size_t factor, void* _out)
+{
+	const size_t width = image->m_Width;
+	const size_t height = image->m_Height;
+	const size_t channels = image->m_Channels;
+	const DTYPE* data = (DTYPE*)image->m_Data;
+	DTYPE* out = (DTYPE*)_out;
+
+	const size_t outwidth = width / factor;
+	const size_t outheight = height / factor;
+	const double area = double(factor * factor);
+
+	// a stacked image is processed as one interleaved image per channel
+	const bool interleaved = image->m_Layout == E_INTERLEAVED;
+	const size_t planes = interleaved ? 1 : channels;
+	const size_t stride = interleaved ? channels : 1;
+	const size_t rowsize = width * stride;
+	const size_t outrowsize = outwidth * stride;
+
+	// the used part of the input rows
+	const size_t blockrowsize = outwidth * factor * stride;
+	SUMTYPE* sums = new SUMTYPE[blockrowsize];
+
+	for( size_t p = 0; p < planes; ++p )
+	{
+		const DTYPE* plane = data + p * width * height;
+		DTYPE* outplane = out + p * outwidth * outheight;
+
+		for( size_t y = 0; y < outheight; ++y )
+		{
+			const DTYPE* row = plane + y * factor * rowsize;
+			for( size_t i = 0; i < blockrowsize; ++i )
+				sums[i] = SUMTYPE(row[i]);
+			for( size_t yy = 1; yy < factor; ++yy )
+			{
+				row += rowsize;
+				for( size_t i = 0; i < blockrowsize; ++i )
+					sums[i] += SUMTYPE(row[i]);
+			}
+
+			DTYPE* outrow = outplane + y * outrowsize;
+			for( size_t x = 0; x < outwidth; ++x )
+			{
+				for( size_t c = 0; c < stride; ++c )
+				{
+					const SUMTYPE* block = sums + x * factor * stride + c;
+					SUMTYPE sum = 0;
+					for( size_t xx = 0; xx < factor; ++xx )
+						sum += block[xx * stride];
+					outrow[x * stride + c] = DTYPE(double(sum) / area);
+				}
+			}
+		}
+	}
+
+	delete[] sums;
+}
+
+void downsample(const Image* image, size_t factor, void* out)
+{
+	if( image->m_Type == E_UINT )
+	{
+		if( image->m_ChannelDepth == 8 )
+			_downsample<uint8_t, uint32_t>(image, factor, out);
+		else if( image->m_ChannelDepth == 16 )
+			_downsample<uint16_t, uint64_t>(image, factor, out);
+		else if( image->m_ChannelDepth == 32 )
+			_downsample<uint32_t, uint64_t>(image, factor, out);
+	}
+	else // float
+	{
+		if( image->m_ChannelDepth == 32 )
+			_downsample<float, double>(image, factor, out);
+		else if( image->m_ChannelDepth == 64 )
+			_downsample<double, double>(image, factor, out);
+	}
+}
+
+
+template<typename DTYPE>
+static inline DTYPE _blend_channel(uint32_t mode, DTYPE base, DTYPE blend)
+{
+	switch( mode )
+	{
+	case E_BLEND_DARKEN:		return blend < base ? blend : base;
+	case E_BLEND_MULTIPLY:		return base * blend;
+	case E_BLEND_COLORBURN:		return DTYPE(1) - (DTYPE(1) - base) / blend;
+	case E_BLEND_LINEARBURN:	return (base + blend) - DTYPE(1);
+	case E_BLEND_LIGHTEN:		return blend > base ? blend : base;
+	case E_BLEND_SCREEN:		return DTYPE(1) - (DTYPE(1) - blend) * (DTYPE(1) - base);
+	case E_BLEND_COLORDODGE:	return base / (DTYPE(1) - blend);
+	case E_BLEND_LINEARDODGE:	return base + blend;
+	default:					return blend;
+	}
+}
+
+template<typename DTYPE>
+static void _blend(const Image* base, const Image* blend, uint32_t mode, double opacity, void* _out)
+{
+	const size_t size = base->m_Width * base->m_Height;
+	const DTYPE* basedata = (DTYPE*)base->m_Data;
+	const DTYPE* blenddata = (DTYPE*)blend->m_Data;
+	DTYPE* out = (DTYPE*)_out;
+	const DTYPE alpha = DTYPE(opacity);
+
+	for( size_t i = 0; i < size; ++i, basedata += 4, blenddata += 4, out += 4 )
+	{
+		// clip + blend mode + opacity
+		DTYPE top[4];
+		for( size_t c = 0; c < 4; ++c )
+		{
+			DTYPE value = blenddata[c];
+			if( value < 0 )
+				value = 0;
+			else if( value > 1 )
+				value = 1;
+			top[c] = _blend_channel<DTYPE>(mode, basedata[c], value) * alpha;
+		}
+
+		// alpha blend the result onto the base
+		const DTYPE ba = basedata[3];
+		for( size_t c = 0; c < 3; ++c )
+			out[c] = basedata[c] + (top[c] - basedata[c]) * top[3];
+		out[3] = top[3] > ba ? top[3] : ba;
+	}
+}
+
+void blend(const Image* base, const Image* blend, uint32_t mode, double opacity, void* out)
+{
+	if( base->m_ChannelDepth == 32 )
+		_blend<float>(base, blend, mode, opacity, out);
+	else if( base->m_ChannelDepth == 64 )
+		_blend<double>(base, blend, mode, opacity, out);
+}
@@ -25,6 +25,22 @@ enum EDataType
 	E_FLOAT,
 };
 
+enum EBlendMode
+{
+	E_BLEND_NORMAL,
+	E_BLEND_DARKEN,
+	E_BLEND_MULTIPLY,
+	E_BLEND_COLORBURN,
+	E_BLEND_LINEARBURN,
+	E_BLEND_LIGHTEN,
+	E_BLEND_SCREEN,
+	E_BLEND_COLORDODGE,
+	E_BLEND_LINEARDODGE,
+};
+
+// The version of the library interface. Bumped when the arguments of an existing function change
+#define UTILS_VERSION 2
+
 struct DLL_EXPORT Image
 {
 	void*	m_Data;
@@ -36,16 +52,40 @@ struct DLL_EXPORT Image
 	uint32_t	 m_ChannelDepth:26;
 };
 
-DLL_EXPORT void convolve1d(const Image* image, const float* kernel, size_t kernelsize, size_t axis, void* out);
+// Returns UTILS_VERSION. Version 1 (that lacks this function) has no threads argument
+DLL_EXPORT uint32_t get_version();
+
+// convolve1d, maximum and minimum split the rows over the given number of threads (0 = all cores),
+// if the library is compiled with OpenMP
+// Returns the number of threads that "all cores" means. Always 1 without OpenMP
+DLL_EXPORT uint32_t get_max_threads();
+
+DLL_EXPORT void convolve1d(const Image* image, const float* kernel, size_t kernelsize, size_t axis, uint32_t threads, void* out);
 
-DLL_EXPORT void maximum(const Image* image, const float* kernel, size_t kernelwidth, size_t kernelheight, void* out);
+DLL_EXPORT void maximum(const Image* image, const float* kernel, size_t kernelwidth, size_t kernelheight, uint32_t threads, void* out);
 
-DLL_EXPORT void minimum(const Image* image, const float* kernel, size_t kernelwidth, size_t kernelheight, void* out);
+DLL_EXPORT void minimum(const Image* image, const float* kernel, size_t kernelwidth, size_t kernelheight, uint32_t threads, void* out);
+
+// Like maximum() with a disc kernel, but with a regular octagon instead of the disc. The cost per pixel doesn't depend on the radius
+DLL_EXPORT void maximum_octagon(const Image* image, size_t radius, void* out);
+
+// A gaussian blur with a cost per pixel that doesn't depend on the sigma
+DLL_EXPORT void gaussian_blur(const Image* image, double sigma, void* out);
 
 DLL_EXPORT void half_size(const Image* image, void* out);
 
+// Scales the image down by an integer factor, where each value is the average of a factor x factor block
+DLL_EXPORT void downsample(const Image* image, size_t factor, void* out);
+
 DLL_EXPORT void calculate_sedt(const Image* image, float radius, void* out);
 
+DLL_EXPORT void calculate_aaedt(const Image* image, float radius, void* out);
+
+DLL_EXPORT void calculate_edt(const Image* image, float radius, void* out);
+
+// Blends an interleaved RGBA float image onto the base in one pass: clip(blend) -> blend mode -> opacity -> alpha blend
+DLL_EXPORT void blend(const Image* base, const Image* blend, uint32_t mode, double opacity, void* out);
+
 }
 
 #endif // UTILS_H
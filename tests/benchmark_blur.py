@@ -0,0 +1,47 @@
+""" Compares the speed and accuracy of the blur methods in fontutils.blur_image
+
+    python benchmark_blur.py [size]
+
+The accuracy is the largest difference to a gaussian with the same sigma that isn't cut off at the radius
+"""
+
+import sys, os, time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir))
+
+import numpy as np
+import fontutils as fu
+
+
+RADII = [1, 2, 5, 10, 20, 40]
+
+
+def _time(fn, repeat=3):
+    best = None
+    for i in xrange(repeat):
+        start = time.time()
+        result = fn()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main(size):
+    # a few sharp edged blocks, like the glyphs of a texture
+    image = np.zeros( (size, size, 4) )
+    for x in xrange(size / 8, size - size / 8, size / 4):
+        image[x:x + size / 8, size / 4:size * 3 / 4] = 1.0
+
+    print "%dx%d RGBA float64 image" % (size, size)
+    print "%-8s %-8s %10s %12s" % ('radius', 'method', 'time (s)', 'max error')
+    for radius in RADII:
+        sigma = (radius + 1.0) / np.sqrt(3.0)
+        reference = fu.blur_image_kernel1D(image, fu.create_1d_gaussian_kernel(int(sigma * 5) + 1, sigma))
+        for method in ['kernel', 'iir']:
+            elapsed, result = _time(lambda: fu.blur_image(image, radius, method))
+            print "%-8d %-8s %10.4f %12.4f" % (radius, method, elapsed, np.abs(result - reference).max())
+
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 512
+    main(size)
@@ -0,0 +1,68 @@
+""" Compares the distance transforms in utils on the glyphs of a font with a distance field
+
+    python benchmark_edt.py [path/to/font.fontinfo]
+"""
+
+import sys, os, time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir))
+
+import numpy as np
+import freetype as ft
+import fontutils as fu
+import fontcreator
+import utils
+from fontinfo import SFontInfo
+
+
+def _render(face, letters, size, dpi, flags, padding):
+    face.set_char_size( width=0, height=size*64, hres=dpi, vres=dpi )
+    bitmaps = []
+    for c in letters:
+        face.load_char( fontcreator._convert_int_to_unicode(c), flags )
+        if not face.glyph.contents.bitmap.rows:
+            continue
+        bitmap = fu.make_array_from_bitmap(face.glyph.contents.bitmap)
+        bitmaps.append( fu.pad_bitmap(bitmap, padding, padding, padding, padding, 0) )
+    return bitmaps
+
+
+def _time(bitmaps, radius, method, repeat=3):
+    best = None
+    for i in xrange(repeat):
+        start = time.time()
+        for bitmap in bitmaps:
+            utils.calculate_edt(bitmap, radius, method=method)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(path):
+    options = fontcreator.init(['-i', path, '-o', 'unused'])
+    info = SFontInfo(options)
+    distancefields = [fn for fn in info.functionlist.itervalues() if type(fn).__name__ == 'DistanceField']
+    assert distancefields, "The font doesn't use a distance field: %s" % path
+    factor = distancefields[0].factor
+    spread = distancefields[0].size
+
+    face = ft.new_face(info.name)
+
+    # the way DistanceField renders the glyphs in the 'raster' mode
+    raster = _render(face, info.letters, info.size * factor, info.dpi, ft.LOAD_RENDER | ft.LOAD_TARGET_MONO, spread)
+    raster = [np.asfortranarray(bitmap * 255) for bitmap in raster]
+    # and in the 'antialiased' mode
+    antialiased = _render(face, info.letters, info.size, info.dpi, ft.LOAD_RENDER | ft.LOAD_TARGET_NORMAL, spread / factor)
+    antialiased = [bitmap / 255.0 for bitmap in antialiased]
+
+    print "%s: %d glyphs, size %d, factor %d" % (os.path.basename(path), len(raster), info.size, factor)
+    print "%-12s %-22s %10s %12s" % ('input', 'method', 'time (s)', 'pixels')
+    for name, bitmaps, radius in [('raster', raster, spread), ('antialiased', antialiased, float(spread) / factor)]:
+        pixels = sum(bitmap.size for bitmap in bitmaps)
+        for method in ['sedt', 'exact', 'antialiased']:
+            print "%-12s %-22s %10.4f %12d" % (name, method, _time(bitmaps, radius, method), pixels)
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), os.pardir, 'examples', 'distance.fontinfo')
+    main(path)
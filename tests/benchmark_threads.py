@@ -0,0 +1,56 @@
+""" Compares the throughput of the native convolve1d, maximum and minimum with different numbers of threads
+
+    python benchmark_threads.py [size] [radius]
+
+The threads only make a difference if the utils library is compiled with OpenMP, see utils.get_max_threads()
+"""
+
+import sys, os, time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir))
+
+import numpy as np
+import fontutils as fu
+import utils
+
+
+THREADS = [1, 2, 4, 8]
+
+
+def _time(fn, repeat=3):
+    best = None
+    for i in xrange(repeat):
+        start = time.time()
+        fn()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(size, radius):
+    rng = np.random.RandomState(1)
+    image = rng.uniform(0.0, 1.0, (size, size, 4))
+    # the kernels of GaussianBlur and Outline
+    gaussian = fu.create_1d_gaussian_kernel(radius)
+    circle = fu.create_2d_circle_kernel(radius)
+
+    tests = [('convolve1d', lambda threads: utils.convolve1d(image, gaussian, 0, threads=threads)),
+             ('maximum', lambda threads: utils.maximum(image, circle, threads=threads)),
+             ('minimum', lambda threads: utils.minimum(image, circle, threads=threads))]
+
+    print "%dx%d RGBA float64 image, radius %d" % (size, size, radius)
+    if utils.get_max_threads() == 1:
+        print "The utils library isn't compiled with OpenMP (or there is only one core), the threads have no effect"
+    print "%-12s %8s %10s %14s %8s" % ('function', 'threads', 'time (s)', 'Mpixels/s', 'speedup')
+    for name, fn in tests:
+        single = None
+        for threads in THREADS:
+            elapsed = _time(lambda: fn(threads))
+            single = single or elapsed
+            print "%-12s %8d %10.4f %14.2f %8.2f" % (name, threads, elapsed, size * size / elapsed / 1e6, single / elapsed)
+
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+    radius = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    main(size, radius)
@@ -0,0 +1,106 @@
+import sys, os, unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir))
+
+import numpy as np
+import binpack
+
+
+def _sizes(count):
+    return np.array([(3 + (i * 7) % 11, 2 + (i * 5) % 13) for i in xrange(count)], np.int32)
+
+
+class TestPackRects(unittest.TestCase):
+
+    def _check(self, sizes, rects, width, height):
+        # every packed rect is inside the bin, has the right size (maybe rotated) and doesn't overlap the others
+        used = np.zeros( (width, height), int)
+        for (w, h), (x, y, rw, rh) in zip(sizes, rects):
+            if rh == 0:
+                continue
+            self.assertTrue((rw, rh) in [(w, h), (h, w)])
+            self.assertTrue(x >= 0 and y >= 0 and x + rw <= width and y + rh <= height)
+            used[x:x+rw, y:y+rh] += 1
+        self.assertTrue(used.max() <= 1)
+
+    def test_in_order(self):
+        # the same result as calling pack_rect() for each rect
+        sizes = _sizes(200)
+        for method in xrange(binpack.MAXRECTS_CP + 1):
+            packer = binpack.create_packer(method, 100, 100, False)
+            expected = []
+            for w, h in sizes:
+                rect = binpack.pack_rect(packer, w, h)
+                if rect.height == 0:
+                    break
+                expected.append( (rect.x, rect.y, rect.width, rect.height) )
+            binpack.destroy_packer(packer)
+
+            packer = binpack.create_packer(method, 100, 100, False)
+            rects = np.empty( (len(sizes), 4), np.int32)
+            count = binpack.pack_rects(packer, sizes, rects)
+            binpack.destroy_packer(packer)
+
+            self.assertEqual(len(expected), count)
+            self.assertEqual(expected, map(tuple, rects[:count].tolist()))
+            self.assertTrue(np.all(rects[count:] == 0))
+
+    def test_old_library(self):
+        # a library without pack_rects() packs the rects one by one
+        sizes = _sizes(200)
+        expected = np.empty( (len(sizes), 4), np.int32)
+        packer = binpack.create_packer(binpack.SKYLINE_BL, 100, 100, False)
+        count = binpack.pack_rects(packer, sizes, expected)
+        binpack.destroy_packer(packer)
+
+        pack_rects = binpack._pack_rects
+        binpack._pack_rects = binpack.NativeFunction(binpack._binpack, 'no_such_function', [])
+        try:
+            packer = binpack.create_packer(binpack.SKYLINE_BL, 100, 100, False)
+            rects = np.empty( (len(sizes), 4), np.int32)
+            self.assertEqual(count, binpack.pack_rects(packer, sizes, rects))
+            np.testing.assert_array_equal(expected, rects)
+            self.assertRaises(IOError, binpack.pack_rects, packer, sizes, rects, True)
+            binpack.destroy_packer(packer)
+        finally:
+            binpack._pack_rects = pack_rects
+
+    def test_best_fit(self):
+        sizes = _sizes(200)
+        for method in xrange(binpack.MAXRECTS_CP + 1):
+            packer = binpack.create_packer(method, 100, 100, False)
+            rects = np.empty( (len(sizes), 4), np.int32)
+            count = binpack.pack_rects(packer, sizes, rects, best_fit=True)
+            binpack.destroy_packer(packer)
+
+            self.assertTrue(count > 0)
+            self.assertEqual(count, np.count_nonzero(rects[:, 3]))
+            self._check(sizes, rects, 100, 100)
+
+    def test_all_fit(self):
+        sizes = _sizes(50)
+        packer = binpack.create_packer(binpack.MAXRECTS_BSSF, 128, 128, False)
+        rects = np.empty( (len(sizes), 4), np.int32)
+        self.assertEqual(len(sizes), binpack.pack_rects(packer, sizes, rects, best_fit=True))
+        binpack.destroy_packer(packer)
+        self._check(sizes, rects, 128, 128)
+
+    def test_allow_rotate(self):
+        sizes = _sizes(200)
+        for method in xrange(binpack.MAXRECTS_CP + 1):
+            for best_fit in [False, True]:
+                rotated = []
+                for allow_rotate in [False, True]:
+                    packer = binpack.create_packer(method, 100, 100, allow_rotate)
+                    rects = np.empty( (len(sizes), 4), np.int32)
+                    binpack.pack_rects(packer, sizes, rects, best_fit)
+                    binpack.destroy_packer(packer)
+                    self._check(sizes, rects, 100, 100)
+                    packed = rects[:, 3] != 0
+                    rotated.append(np.count_nonzero(np.any(rects[packed, 2:] != sizes[packed], axis=1)))
+                self.assertEqual(0, rotated[0])
+                self.assertTrue(rotated[1] > 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
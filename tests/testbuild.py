@@ -0,0 +1,141 @@
+import sys, os, shutil, tempfile, unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir, 'examples'))
+
+import build
+
+
+class TestStamps(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.rootdir = build.ROOTDIR
+        self.output = self._write('out.png', 'png')
+        self.json = self._write('out.json', 'json')
+        self.dependency = self._write('font.ttf', 'font')
+
+    def tearDown(self):
+        build.ROOTDIR = self.rootdir
+        build._code_stamp = None
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, name, data):
+        path = os.path.join(self.tmpdir, name)
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def _stamp(self, code='code'):
+        return {'code': code, 'files': {self.dependency: build._get_file_stamp(self.dependency, None)},
+                'outputs': build._get_output_stamps([self.output, self.json])}
+
+    def test_up_to_date(self):
+        self.assertTrue(build._is_up_to_date(self._stamp(), self._stamp()))
+
+    def test_missing_output(self):
+        stamp, oldstamp = self._stamp(), self._stamp()
+        os.remove(self.json)
+        self.assertFalse(build._is_up_to_date(stamp, oldstamp))
+        # the written files weren't recorded
+        del oldstamp['outputs']
+        self.assertFalse(build._is_up_to_date(stamp, oldstamp))
+
+    def test_changed_output(self):
+        oldstamp = self._stamp()
+        self._write('out.json', 'another json')
+        self.assertFalse(build._is_up_to_date(self._stamp(), oldstamp))
+
+    def test_no_old_stamp(self):
+        self.assertFalse(build._is_up_to_date(self._stamp(), None))
+        # the stamps from before the code was stamped
+        self.assertFalse(build._is_up_to_date(self._stamp(), self._stamp()['files']))
+
+    def test_changed_dependency(self):
+        oldstamp = self._stamp()
+        self._write('font.ttf', 'another font')
+        self.assertFalse(build._is_up_to_date(self._stamp(), oldstamp))
+
+        stamp = self._stamp()
+        letters = self._write('letters.txt', 'abc')
+        stamp['files'][letters] = build._get_file_stamp(letters, None)
+        self.assertFalse(build._is_up_to_date(stamp, self._stamp()))
+
+    def test_changed_code(self):
+        self.assertFalse(build._is_up_to_date(self._stamp('new'), self._stamp('old')))
+
+    def test_code_stamp(self):
+        build.ROOTDIR = os.path.join(self.tmpdir, 'root')
+        self._write('root/fontcreator.py', 'a')
+        self._write('root/shared/linux64/_utils.so', 'b')
+        self._write('root/examples/build.py', 'c')
+        self._write('root/README.rst', 'd')
+
+        def code_stamp():
+            build._code_stamp = None
+            return build._get_code_stamp()
+
+        stamp = code_stamp()
+        self.assertEqual(stamp, code_stamp())
+        # the examples and other files aren't part of the code
+        self._write('root/examples/build.py', 'cc')
+        self._write('root/README.rst', 'dd')
+        self.assertEqual(stamp, code_stamp())
+
+        self._write('root/fontcreator.py', 'aa')
+        self.assertNotEqual(stamp, code_stamp())
+        stamp = code_stamp()
+        self._write('root/shared/linux64/_utils.so', 'bb')
+        self.assertNotEqual(stamp, code_stamp())
+
+    def test_unchanged_file_isnt_hashed(self):
+        oldstamp = build._get_file_stamp(self.dependency, None)
+        oldstamp['sha1'] = 'not hashed'
+        self.assertEqual(oldstamp, build._get_file_stamp(self.dependency, oldstamp))
+
+
+class TestGenerate(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(build.EXAMPLEDIR)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir)
+
+    def _generate(self, oldstamp=None):
+        self.compiled = []
+        compile = build._compile
+        def counted_compile(args):
+            self.compiled.append(args)
+            return compile(args)
+        build._compile = counted_compile
+        try:
+            doc, stamp = build.generate_doc(os.path.join(build.EXAMPLEDIR, 'subtitle.fontinfo'), self.tmpdir, oldstamp=oldstamp)
+        finally:
+            build._compile = compile
+        return stamp
+
+    def test_outputs(self):
+        stamp = self._generate()
+        self.assertEqual(2, len(self.compiled))
+        names = sorted(os.path.basename(output) for output in stamp['outputs'])
+        self.assertEqual(['subtitle.json', 'subtitle.png', 'subtitle_text.png'], names)
+
+        stamp = self._generate(stamp)
+        self.assertEqual(0, len(self.compiled))
+
+        # all files written by the two passes are checked
+        for name in names:
+            os.remove(os.path.join(self.tmpdir, name))
+            stamp = self._generate(stamp)
+            self.assertEqual(2, len(self.compiled))
+            self.assertTrue(os.path.exists(os.path.join(self.tmpdir, name)))
+
+
+if __name__ == '__main__':
+    unittest.main()
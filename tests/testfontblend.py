@@ -0,0 +1,100 @@
+import sys, os, unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir))
+
+import numpy as np
+import fontutils as fu
+import fontblend
+
+
+def _images(shape=(7, 5, 4)):
+    rnd = np.random.RandomState(42)
+    base = rnd.uniform(0.05, 0.95, shape)
+    blend = rnd.uniform(0.05, 0.95, shape)
+    return base, blend
+
+
+class TestBlendFunctions(unittest.TestCase):
+
+    def test_out(self):
+        for name, fn in fontblend.BLENDFUNCTIONS.iteritems():
+            base, blend = _images()
+            expected = fn(base, blend).copy()
+
+            out = np.empty_like(base)
+            self.assertTrue(fn(base, blend, out=out) is out, name)
+            self.assertTrue(np.array_equal(expected, out), name)
+
+            # the result may be written over the blend image
+            inplace = blend.copy()
+            result = fn(base, inplace, out=inplace)
+            self.assertTrue(result is inplace, name)
+            self.assertTrue(np.array_equal(expected, inplace), name)
+
+    def test_without_out(self):
+        def blendaverage(base, blend):
+            return (base + blend) * 0.5
+        fontblend.blendfunction(blendaverage)
+        try:
+            fn = fontblend.BLENDFUNCTIONS['blendaverage']
+            base, blend = _images()
+            out = np.empty_like(base)
+            self.assertTrue(fn(base, blend, out=out) is out)
+            self.assertTrue(np.array_equal((base + blend) * 0.5, out))
+        finally:
+            del fontblend.BLENDFUNCTIONS['blendaverage']
+
+
+class TestAlphaBlend(unittest.TestCase):
+
+    def test_out(self):
+        bottom, top = _images()
+        expected = fu.alpha_blend(bottom, top)
+
+        out = np.empty_like(bottom)
+        self.assertTrue(fu.alpha_blend(bottom, top, out=out) is out)
+        self.assertTrue(np.array_equal(expected, out))
+
+        # the out array may be either of the inputs
+        out = bottom.copy()
+        self.assertTrue(fu.alpha_blend(out, top, out=out) is out)
+        self.assertTrue(np.array_equal(expected, out))
+        out = top.copy()
+        self.assertTrue(fu.alpha_blend(bottom, out, out=out) is out)
+        self.assertTrue(np.array_equal(expected, out))
+
+    def test_dtype(self):
+        bottom, top = _images()
+        top = top.astype(np.float32)
+        result = fu.alpha_blend(bottom, top, out=bottom)
+        self.assertEqual(np.float32, result.dtype)
+        self.assertTrue(np.array_equal(fu.alpha_blend(bottom.astype(np.float32), top), result))
+
+
+class TestScratchPool(unittest.TestCase):
+
+    def test_reuse(self):
+        pool = fu.ScratchPool()
+        a = pool.get( (4, 6, 4), np.float32 )
+        self.assertEqual((4, 6, 4), a.shape)
+        self.assertEqual(np.float32, a.dtype)
+        pool.put(a)
+
+        # a smaller array of the same type shares the memory
+        b = pool.get( (2, 3, 4), np.float32 )
+        self.assertTrue(np.may_share_memory(a, b))
+        c = pool.get( (2, 3, 4), np.float32 )
+        self.assertFalse(np.may_share_memory(b, c))
+        d = pool.get( (2, 3, 4), np.float64 )
+        self.assertEqual(np.float64, d.dtype)
+        pool.put(b)
+        pool.put(c)
+
+        # a larger one replaces the buffer
+        e = pool.get( (8, 6, 4), np.float32 )
+        self.assertEqual((8, 6, 4), e.shape)
+        self.assertEqual(1, len(pool.free))
+
+
+if __name__ == '__main__':
+    unittest.main()
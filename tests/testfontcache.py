@@ -0,0 +1,75 @@
+import sys, os, unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir))
+
+import numpy as np
+import fontcache
+from testfontcreator import EXAMPLES, EFFECTS, _CompileTestCase
+
+
+class TestGlyphCache(_CompileTestCase):
+
+    def setUp(self):
+        _CompileTestCase.setUp(self)
+        self.cachedir = os.path.join(self.tmpdir, 'cache')
+        self.data = EFFECTS % {'fonts': os.path.abspath(os.path.join(EXAMPLES, 'fonts'))}
+        # count the glyphs that are found in the cache
+        self.hits = 0
+        get = fontcache.GlyphCache.get
+        def counted_get(cache, key):
+            bitmap = get(cache, key)
+            if bitmap is not None:
+                self.hits += 1
+            return bitmap
+        self.get = get
+        fontcache.GlyphCache.get = counted_get
+
+    def tearDown(self):
+        fontcache.GlyphCache.get = self.get
+        _CompileTestCase.tearDown(self)
+
+    def _count(self):
+        """ Returns the number of glyphs in the cache """
+        return sum(len([name for name in filenames if name.endswith('.npz')]) for _, _, filenames in os.walk(self.cachedir))
+
+    def _compile_cached(self, data):
+        self.hits = 0
+        _, result = self._compile(data, ['--cachedir', self.cachedir])
+        return result, self.hits
+
+    def test_miss(self):
+        result, cached = self._compile_cached(self.data)
+        self.assertEqual(0, cached)
+        self.assertTrue(self._count() > 0)
+        _, expected = self._compile(self.data)
+        self.assertSameFont(expected, result)
+
+    def test_hit(self):
+        self._compile_cached(self.data)
+        count = self._count()
+        result, cached = self._compile_cached(self.data)
+        self.assertEqual(count, self._count())
+        self.assertTrue(cached > 0)
+        self.assertEqual(cached, len([glyph for glyph in result[0].glyphs if glyph.bitmap is not None]))
+        _, expected = self._compile(self.data)
+        self.assertSameFont(expected, result)
+
+    def test_changed_parameters(self):
+        self._compile_cached(self.data)
+        count = self._count()
+        # parameters that aren't declared as properties
+        for old, new in [('colors = [(200, 60, 20), (255, 220, 120)]', 'colors = [(20, 60, 200), (120, 220, 255)]'),
+                         ('opacity = 60', 'opacity = 80')]:
+            data = self.data.replace(old, new)
+            self.assertNotEqual(self.data, data)
+            result, cached = self._compile_cached(data)
+            self.assertEqual(0, cached, new)
+            self.assertTrue(self._count() > count, new)
+            count = self._count()
+            _, expected = self._compile(data)
+            self.assertSameFont(expected, result)
+            self.assertFalse(np.array_equal(expected[2], self._compile(self.data)[1][2]), new)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,232 @@
+import sys, os, shutil, tempfile, unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir))
+
+import numpy as np
+import freetype as ft
+import fontutils as fu
+import fontcreator
+import utils, binpack
+from fontinfo import SFontInfo
+from testutils import _Library, _version1_library
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), os.pardir, 'examples')
+
+
+class _Info(object):
+    pass
+
+
+class TestTrimGlyphs(unittest.TestCase):
+
+    def test_bounds(self):
+        image = np.zeros( (10, 8, 4) )
+        self.assertEqual(None, fu.get_alpha_bounds(image))
+        image[2:5, 3, 3] = 0.5
+        image[1, 6, 0] = 1.0    # color without alpha doesn't count
+        self.assertEqual((2, 3, 5, 4), fu.get_alpha_bounds(image))
+
+    def test_trim(self):
+        info = _Info()
+        glyph = fontcreator.Glyph(ord('.'), '.')
+        glyph.bitmap = np.zeros( (10, 12, 4) )
+        glyph.bitmap[4:6, 8:10] = 1.0
+        glyph.bearingX = 1
+        glyph.bearingY = 11
+        space = fontcreator.Glyph(ord(' '), ' ')
+        empty = fontcreator.Glyph(ord('a'), 'a')
+        empty.bitmap = np.zeros( (3, 3, 4) )
+        info.glyphs = [glyph, space, empty]
+
+        fontcreator._trim_glyphs(info)
+        self.assertEqual((2, 2, 4), glyph.bitmap.shape)
+        self.assertTrue(np.all(glyph.bitmap == 1.0))
+        # the trimmed bitmap ends up at the same position relative to the cursor and baseline
+        self.assertEqual(5, glyph.bearingX)
+        self.assertEqual(3, glyph.bearingY)
+        self.assertEqual(None, space.bitmap)
+        self.assertEqual(None, empty.bitmap)
+
+
+class TestPrecision(unittest.TestCase):
+
+    def _render(self, name, precision):
+        options = fontcreator.init(['-i', os.path.join(EXAMPLES, name), '-o', 'unused'])
+        info = SFontInfo(options)
+        info.dtype = np.dtype(precision)
+        face = ft.new_face(info.name)
+        fontcreator._get_glyph_info(options, info, face)
+        fontcreator.render(options, info, face)
+        image = info.texturerender(info)
+        return info, image
+
+    def test_float32(self):
+        # the float32 pipeline stays within one 8 bit step of the float64 pipeline
+        for name in ['header.fontinfo', 'distance.fontinfo', 'subtitle.fontinfo']:
+            info, image = self._render(name, 'float32')
+            reference, expected = self._render(name, 'float64')
+            self.assertEqual(np.float32, image.dtype)
+            self.assertEqual(np.float64, expected.dtype)
+            self.assertEqual(expected.shape, image.shape)
+            for glyph, expectedglyph in zip(info.glyphs, reference.glyphs):
+                if glyph.bitmap is not None:
+                    self.assertEqual(np.float32, glyph.bitmap.dtype)
+                self.assertEqual(expectedglyph.bitmapbox, glyph.bitmapbox)
+            self.assertTrue(np.abs(image - expected).max() <= 1.0 / 255.0, name)
+
+
+# a font with layers and post effects that run both batched (outline, blur) and per glyph (shadow)
+EFFECTS = """
+[default]
+name = %(fonts)s/helsinki.ttf
+size = 24
+letters = 21-7e
+batchsize = 0
+texturesize = 512, 512
+layers = [Layer(color=gradient), Layer(color=solid, effects=[blur], blend=blendmultiply)]
+posteffects = [outline, shadow]
+
+[gradient]
+type = gradient
+colors = [(200, 60, 20), (255, 220, 120)]
+
+[solid]
+type = solid
+color = (255, 255, 255)
+
+[blur]
+type = gaussianblur
+size = 2
+
+[outline]
+type = outline
+width = 2
+color = (0, 0, 0)
+
+[shadow]
+type = dropshadow
+size = 3
+distance = 2
+opacity = 60
+"""
+
+
+def _example(name, replacements=None):
+    """ Returns the contents of an example .fontinfo, with absolute paths """
+    with open(os.path.join(EXAMPLES, name), 'rb') as f:
+        data = f.read()
+    data = data.replace('./fonts/', os.path.abspath(os.path.join(EXAMPLES, 'fonts')) + '/')
+    data = data.replace('letters_ascii.txt', os.path.abspath(os.path.join(EXAMPLES, 'letters_ascii.txt')))
+    for old, new in (replacements or dict()).iteritems():
+        data = data.replace(old, new)
+    return data
+
+
+class _CompileTestCase(unittest.TestCase):
+    """ Compiles fonts into a temporary directory """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _compile(self, data, args=()):
+        """ Compiles the .fontinfo contents. Returns the output path and the result of fontcreator.compile() """
+        count = len([name for name in os.listdir(self.tmpdir) if name.endswith('.fontinfo')])
+        path = os.path.join(self.tmpdir, 'font%d.fontinfo' % count)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+        output = os.path.join(self.tmpdir, 'out', os.path.basename(path).replace('.fontinfo', '.png'))
+        options = fontcreator.init(['-i', path, '-o', output] + list(args))
+        options.endian = '<'
+        return output, fontcreator.compile(options)
+
+    def assertSameFont(self, expected, result):
+        (expectedinfo, expectedkernings, expectedimage) = expected
+        (info, pairkernings, image) = result
+        self.assertTrue(np.array_equal(expectedimage, image))
+        self.assertEqual([(glyph.utf8, glyph.bitmapbox, glyph.bearingX, glyph.bearingY) for glyph in expectedinfo.glyphs],
+                         [(glyph.utf8, glyph.bitmapbox, glyph.bearingX, glyph.bearingY) for glyph in info.glyphs])
+        self.assertEqual(expectedkernings, pairkernings)
+
+
+class TestBatch(_CompileTestCase):
+
+    def test_same_as_per_glyph(self):
+        data = EFFECTS % {'fonts': os.path.abspath(os.path.join(EXAMPLES, 'fonts'))}
+        _, expected = self._compile(data)
+        _, result = self._compile(data.replace('batchsize = 0', 'batchsize = 4'))
+        self.assertSameFont(expected, result)
+
+
+class TestJobs(_CompileTestCase):
+
+    def test_same_as_one_process(self):
+        data = EFFECTS % {'fonts': os.path.abspath(os.path.join(EXAMPLES, 'fonts'))}
+        output, expected = self._compile(data, ['-j', '1'])
+        joboutput, result = self._compile(data, ['-j', '2'])
+        self.assertSameFont(expected, result)
+        # and the written files are the same
+        for ext in ['.png', '.json']:
+            with open(output.replace('.png', ext), 'rb') as f:
+                expectedfile = f.read()
+            with open(joboutput.replace('.png', ext), 'rb') as f:
+                self.assertEqual(expectedfile.replace('font0.', 'font1.'), f.read(), ext)
+
+
+class TestOldLibraries(_CompileTestCase):
+    """ The prebuilt libraries in shared/ may only have the functions of the first version """
+
+    def _forward(self, module, library, names):
+        """ Forwards the named functions to the real library """
+        functions = dict()
+        for name in names:
+            fn = getattr(module, '_' + name)
+            functions[name] = utils.NativeFunction(library, name, list(fn.argtypes), fn.restype)
+        return functions
+
+    def _bind_old_libraries(self):
+        utilsfunctions = self._forward(utils, utils._utils, ['half_size', 'calculate_sedt'])
+        utilsfunctions.update(vars(_version1_library()))
+        binpackfunctions = self._forward(binpack, binpack._binpack, ['create_packer', 'destroy_packer', 'get_occupancy', 'pack_rect'])
+
+        for module, library in [(utils, _Library(**utilsfunctions)), (binpack, _Library(**binpackfunctions))]:
+            for fn in vars(module).values():
+                if isinstance(fn, utils.NativeFunction):
+                    self.addCleanup(vars(fn).update, dict(vars(fn)))
+                    fn.library = library
+                    fn.function = None
+                    if isinstance(fn, utils._ThreadedFunction):
+                        fn.singlethreaded = None
+
+    def test_same_as_current(self):
+        data = EFFECTS % {'fonts': os.path.abspath(os.path.join(EXAMPLES, 'fonts'))}
+        _, expected = self._compile(data)
+
+        self._bind_old_libraries()
+        self.assertEqual(1, utils.get_library_version(utils._convolve1d.library))
+        self.assertFalse(utils.has_blend())
+        _, result = self._compile(data)
+        self.assertSameFont(expected, result)
+
+
+class TestSizes(_CompileTestCase):
+
+    def test_sizes(self):
+        output, results = self._compile(_example('subtitle.fontinfo', {'size = 32': 'sizes = 12, 24'}))
+        self.assertEqual(2, len(results))
+        self.assertEqual([12, 24], [info.size for info, pairkernings, image in results])
+        for size in [12, 24]:
+            self.assertTrue(os.path.exists(fu.get_size_path(output, size)))
+            self.assertTrue(os.path.exists(fu.get_size_path(output, size).replace('.png', '.json')))
+
+        # each size is the same as when it is compiled by itself
+        _, result = self._compile(_example('subtitle.fontinfo', {'size = 32': 'size = 24'}))
+        self.assertSameFont(result, results[1])
+        self.assertTrue(results[0][0].ascender < result[0].ascender)
+
+
+if __name__ == '__main__':
+    unittest.main()
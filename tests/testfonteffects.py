@@ -0,0 +1,177 @@
+import sys, os, unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir))
+
+import numpy as np
+import freetype as ft
+import fontutils as fu
+import fonteffects
+
+FONTPATH = os.path.join(os.path.dirname(__file__), os.pardir, 'examples', 'fonts', 'No-move.ttf')
+
+
+def _reference_gradient(colors, angle, width, height):
+    """ The original per pixel implementation of Gradient.set_dimensions """
+    angle = angle / 180.0 * np.pi
+    normal = np.array([0,-height/2.0])
+    cosa = np.cos(angle)
+    sina = np.sin(angle)
+
+    rotation = np.array([[cosa, -sina], [sina, cosa]])
+    normal = (rotation * normal)[:,1]
+    lengthsq = np.dot(normal,normal)
+    normal /= np.sqrt(lengthsq)
+
+    halfextents = ( (width)/2.0, (height)/2.0 )
+    origin = np.array( [np.round(halfextents[0]), np.round(halfextents[1])], float)
+    maxextents = np.sqrt( halfextents[0]*halfextents[0]*np.abs(normal[0]) + halfextents[1]*halfextents[1]*np.abs(normal[1]) )
+    maxextents = np.round(maxextents)
+
+    data = np.empty((width,height,4), dtype=np.float32)
+    for x in xrange(0, width):
+        for y in xrange(0, height):
+            v = np.array([x,y], dtype=float)
+            v -= origin
+
+            d = (np.dot(v, normal) / maxextents) / 2.0 + 0.5
+            d = np.clip( d, 0.0, 1.0 )
+
+            lenminusone = len(colors) - 1
+
+            index = int(d * lenminusone)
+            subunit = (d * lenminusone) % 1.0
+            if index == lenminusone:
+                index -= 1
+                subunit = 1.0
+
+            c1 = colors[index]
+            c2 = colors[index+1]
+            r = c1[0] + (c2[0] - c1[0]) * subunit
+            g = c1[1] + (c2[1] - c1[1]) * subunit
+            b = c1[2] + (c2[2] - c1[2]) * subunit
+            data[x,y] = (r,g,b,1.0)
+    return data
+
+
+class TestGradient(unittest.TestCase):
+
+    def test_set_dimensions(self):
+        stops = [(140, 20, 4), (212, 164, 54), (0, 0, 255), (255, 255, 255), (12, 200, 90)]
+        for count in xrange(2, len(stops)+1):
+            colors = str(stops[:count])
+            for angle in (0, 30, 45, 90, 120, 180, 225, 270, 333):
+                for width, height in ((17, 23), (40, 40), (33, 12)):
+                    gradient = fonteffects.Gradient(None, colors=colors, angle=str(angle))
+                    gradient.set_dimensions(width, height)
+
+                    expected = _reference_gradient(gradient.colors, gradient.angle, width, height)
+                    self.assertEqual(expected.shape, gradient.bitmap.shape)
+                    self.assertEqual(expected.dtype, gradient.bitmap.dtype)
+                    self.assertTrue(np.array_equal(expected, gradient.bitmap), "Mismatch: %d colors, angle %d, size %s" % (count, angle, str((width, height))))
+
+
+class TestStripes(unittest.TestCase):
+
+    def test_set_dimensions(self):
+        colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255)]
+        stripes = fonteffects.Stripes(None, width='3', offset='1', angle='0', colors=str(colors))
+        stripes.set_dimensions(20, 30)
+
+        self.assertEqual((20, 30, 4), stripes.bitmap.shape)
+        self.assertTrue(np.all(stripes.bitmap[:, :, 3] == 1.0))
+
+        # at angle 0 the stripes are horizontal, and they repeat every width*len(colors) pixels
+        channel = stripes.bitmap[:, :, :3].argmax(axis=2)
+        self.assertTrue(np.all(channel == channel[0:1, :]))
+        self.assertTrue(np.array_equal(channel[0, :-9], channel[0, 9:]))
+        self.assertEqual([0, 1, 2], sorted(set(channel[0, :9])))
+        edges = np.nonzero(np.diff(channel[0]))[0]
+        self.assertTrue(np.all(np.diff(edges) == 3))
+
+    def test_bad_width(self):
+        self.assertRaises(fonteffects.FontEffectException, fonteffects.Stripes, None, width='0')
+
+
+class TestOutline(unittest.TestCase):
+
+    def test_methods(self):
+        image = np.zeros( (24, 24, 4) )
+        image[8:16, 10:14] = 1.0
+        disc = fonteffects.Outline(None, width='4', color='(255, 0, 0)').apply(None, None, image)
+        octagon = fonteffects.Outline(None, width='4', color='(255, 0, 0)', method='octagon').apply(None, None, image)
+        self.assertEqual(disc.shape, octagon.shape)
+        # the octagon covers the disc, and the glyph stays on top
+        self.assertTrue(np.all(octagon[..., 3] >= disc[..., 3]))
+        self.assertTrue(np.array_equal(disc[8:16, 10:14], image[8:16, 10:14]))
+        self.assertTrue(np.array_equal(octagon[8:16, 10:14], image[8:16, 10:14]))
+        self.assertRaises(fonteffects.FontEffectException, fonteffects.Outline, None, method='square')
+
+
+class TestGaussianBlur(unittest.TestCase):
+
+    def test_methods(self):
+        image = np.zeros( (64, 64, 4) )
+        image[28:36, 26:38] = 1.0
+        kernel = fonteffects.GaussianBlur(None, size='6').apply(None, None, image)
+        iir = fonteffects.GaussianBlur(None, size='6', method='iir').apply(None, None, image)
+        self.assertEqual(kernel.shape, iir.shape)
+        # both keep the coverage of the glyph, but the kernel is cut off at the radius
+        self.assertTrue(abs(iir.sum() - image.sum()) < 0.01 * image.sum())
+        self.assertTrue(abs(kernel.sum() - image.sum()) < 0.01 * image.sum())
+        self.assertFalse(np.allclose(kernel, iir))
+        self.assertRaises(fonteffects.FontEffectException, fonteffects.GaussianBlur, None, method='box')
+
+
+class _Info(object):
+    pass
+
+class _Glyph(object):
+    pass
+
+
+class TestMultiChannelDistanceField(unittest.TestCase):
+
+    def test_edge_colors(self):
+        # a square: every corner must switch color, and neighbouring edges must share a channel
+        square = [[(0,0), (10,0)], [(10,0), (10,10)], [(10,10), (0,10)], [(0,10), (0,0)]]
+        segments, colors = fonteffects._color_contour(square, np.sin(8.0 / 180.0 * np.pi))
+        self.assertEqual(len(segments), 4)
+        for i in xrange(4):
+            self.assertNotEqual(colors[i-1], colors[i])
+            self.assertTrue(colors[i-1] & colors[i])
+            self.assertEqual(bin(colors[i]).count('1'), 2)
+
+        # a circle has no corners
+        circle = [[(10,0), (10,10), (0,10)], [(0,10), (-10,10), (-10,0)], [(-10,0), (-10,-10), (0,-10)], [(0,-10), (10,-10), (10,0)]]
+        segments, colors = fonteffects._color_contour(circle, np.sin(8.0 / 180.0 * np.pi))
+        self.assertEqual(colors, [fonteffects._WHITE] * 4)
+
+    def test_inside(self):
+        padding = 4
+        info = _Info()
+        info.face = ft.new_face(FONTPATH)
+        info.size = 48
+        info.dpi = 72
+        info.antialias = 'normal'
+        info.extrapadding = (padding, padding, padding, padding)
+
+        msdf = fonteffects.MultiChannelDistanceField(None, size=str(padding))
+        for c in 'AMe&8':
+            info.face.set_char_size( width=0, height=info.size*64, hres=info.dpi, vres=info.dpi )
+            info.face.load_char( c, ft.LOAD_RENDER | ft.LOAD_TARGET_NORMAL )
+            coverage = fu.make_array_from_bitmap(info.face.glyph.contents.bitmap) / 255.0
+            coverage = fu.pad_bitmap(coverage, padding, padding, padding, padding, 0.0)
+
+            glyph = _Glyph()
+            glyph.unicode = c
+            image = msdf.apply(info, glyph, 0, 0, coverage.shape, None, coverage, None)
+            self.assertEqual(image.shape, coverage.shape + (4,))
+
+            # the median of the channels must agree with the rendered glyph, except at the edges
+            median = np.median(image[..., :3], axis=2)
+            clear = (coverage > 0.9) | (coverage < 0.1)
+            self.assertTrue( ((median > 0.5) == (coverage > 0.5))[clear].all(), c )
+
+
+if __name__ == '__main__':
+    unittest.main()
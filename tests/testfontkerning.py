@@ -0,0 +1,168 @@
+import sys, os, struct, unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir))
+
+import fontkerning
+
+
+def _sfnt(tables):
+    """ Creates a font file with the given tables """
+    header = struct.pack('>4sHHHH', '\x00\x01\x00\x00', len(tables), 0, 0, 0)
+    offset = len(header) + 16 * len(tables)
+    records = ''
+    data = ''
+    for tag, table in sorted(tables.iteritems()):
+        records += struct.pack('>4sIII', tag, 0, offset + len(data), len(table))
+        data += table
+    return header + records + data
+
+
+def _kern_subtable(pairs, coverage=0x0001):
+    data = struct.pack('>HHHH', len(pairs), 0, 0, 0)
+    for (left, right), value in sorted(pairs.iteritems()):
+        data += struct.pack('>HHh', left, right, value)
+    return struct.pack('>HHH', 0, 6 + len(data), coverage) + data
+
+
+def _kern(subtables):
+    return struct.pack('>HH', 0, len(subtables)) + ''.join(subtables)
+
+
+def _coverage(glyphs):
+    return struct.pack('>HH', 1, len(glyphs)) + ''.join(struct.pack('>H', glyph) for glyph in glyphs)
+
+
+def _pair_pos_format1(pairs):
+    """ A pair adjustment with the value format XPlacement|XAdvance, where the x placement is always 99 """
+    firsts = sorted(set(first for first, second in pairs))
+    pairsets = []
+    for first in firsts:
+        seconds = sorted((second, value) for (f, second), value in pairs.iteritems() if f == first)
+        pairsets.append( struct.pack('>H', len(seconds)) + ''.join(struct.pack('>Hhh', second, 99, value) for second, value in seconds) )
+
+    headersize = 10 + 2 * len(firsts)
+    coverage = _coverage(firsts)
+    offsets = []
+    offset = headersize + len(coverage)
+    for pairset in pairsets:
+        offsets.append(offset)
+        offset += len(pairset)
+    header = struct.pack('>HHHHH', 1, headersize, 0x0005, 0, len(firsts)) + ''.join(struct.pack('>H', o) for o in offsets)
+    return header + coverage + ''.join(pairsets)
+
+
+def _class_def(classes):
+    """ A class definition of format 2 """
+    return struct.pack('>HH', 2, len(classes)) + ''.join(struct.pack('>HHH', glyph, glyph, cls) for glyph, cls in sorted(classes.iteritems()))
+
+
+def _pair_pos_format2(firsts, classes1, classes2, matrix):
+    class1count = len(matrix)
+    class2count = len(matrix[0])
+    records = ''.join(struct.pack('>h', value) for row in matrix for value in row)
+    headersize = 16 + len(records)
+    coverage = _coverage(firsts)
+    classdef1 = _class_def(classes1)
+    classdef2 = _class_def(classes2)
+    header = struct.pack('>HHHHHHHH', 2, headersize, 0x0004, 0, headersize + len(coverage), headersize + len(coverage) + len(classdef1), class1count, class2count)
+    return header + records + coverage + classdef1 + classdef2
+
+
+def _lookup(lookuptype, subtables):
+    offset = 6 + 2 * len(subtables)
+    offsets = []
+    for subtable in subtables:
+        offsets.append(offset)
+        offset += len(subtable)
+    return struct.pack('>HHH', lookuptype, 0, len(subtables)) + ''.join(struct.pack('>H', o) for o in offsets) + ''.join(subtables)
+
+
+def _extension(lookuptype, subtable):
+    return struct.pack('>HHI', 1, lookuptype, 8) + subtable
+
+
+def _gpos(features, lookups):
+    """ Creates a GPOS table, given a list of (tag, lookup indices) and a list of lookups """
+    featurelist = struct.pack('>H', len(features))
+    featuretables = ''
+    for tag, indices in features:
+        featurelist += struct.pack('>4sH', tag, 2 + 6 * len(features) + len(featuretables))
+        featuretables += struct.pack('>HH', 0, len(indices)) + ''.join(struct.pack('>H', index) for index in indices)
+    featurelist += featuretables
+
+    lookuplist = struct.pack('>H', len(lookups))
+    offset = 2 + 2 * len(lookups)
+    for lookup in lookups:
+        lookuplist += struct.pack('>H', offset)
+        offset += len(lookup)
+    lookuplist += ''.join(lookups)
+
+    scriptlist = struct.pack('>H', 0)
+    header = struct.pack('>HHHHH', 1, 0, 10, 10 + len(scriptlist), 10 + len(scriptlist) + len(featurelist))
+    return header + scriptlist + featurelist + lookuplist
+
+
+class TestKern(unittest.TestCase):
+
+    def test_subtables(self):
+        kern = _kern([_kern_subtable({(1, 2): -50, (2, 3): 20, (1, 9): -10}),
+                      _kern_subtable({(1, 2): -5, (3, 1): 7}),
+                      _kern_subtable({(3, 1): -30}, coverage=0x0009),    # override
+                      _kern_subtable({(2, 3): 100}, coverage=0x0003)])   # minimum values aren't kernings
+        kernings = fontkerning.parse_kernings(_sfnt({'kern': kern}), [1, 2, 3])
+        self.assertEqual({(1, 2): -55, (2, 3): 20, (3, 1): -30}, kernings)
+
+    def test_no_table(self):
+        self.assertEqual(dict(), fontkerning.parse_kernings(_sfnt({'head': '\0' * 54}), [1, 2, 3]))
+
+    def test_not_a_font(self):
+        self.assertEqual(None, fontkerning.parse_kernings('%!PS-AdobeFont-1.0', [1, 2, 3]))
+        # a truncated font
+        kern = _kern([_kern_subtable({(1, 2): -50})])
+        self.assertEqual(None, fontkerning.parse_kernings(_sfnt({'kern': kern})[:-8], [1, 2, 3]))
+
+
+class TestGPOS(unittest.TestCase):
+
+    def test_pair_adjustments(self):
+        # class 1: glyphs 4 and 5, class 0: all others
+        classes2 = {4: 1, 5: 1}
+        lookups = [_lookup(2, [_pair_pos_format1({(1, 2): -40, (1, 3): 0}),
+                               _pair_pos_format2([1, 2, 3], {2: 1}, classes2, [[0, -15], [8, -25]])]),
+                   _lookup(9, [_extension(2, _pair_pos_format1({(1, 2): -2, (6, 4): 11}))]),
+                   _lookup(2, [_pair_pos_format1({(6, 5): 1000})])]
+        gpos = _gpos([('liga', [2]), ('kern', [0, 1])], lookups)
+
+        kernings = fontkerning.parse_kernings(_sfnt({'GPOS': gpos}), [1, 2, 3, 4, 5, 6])
+        # the first subtable of a lookup that matches a pair is used, e.g. (1, 3) isn't adjusted by the class pairs
+        expected = {(1, 2): -42, (1, 4): -15, (1, 5): -15, (3, 4): -15, (3, 5): -15,
+                    (2, 1): 8, (2, 2): 8, (2, 3): 8, (2, 6): 8, (2, 4): -25, (2, 5): -25,
+                    (6, 4): 11}
+        self.assertEqual(expected, kernings)
+
+        kernings = fontkerning.parse_kernings(_sfnt({'GPOS': gpos}), [1, 2, 4])
+        self.assertEqual({(1, 2): -42, (1, 4): -15, (2, 1): 8, (2, 2): 8, (2, 4): -25}, kernings)
+
+    def test_kern_table_first(self):
+        gpos = _gpos([('kern', [0])], [_lookup(2, [_pair_pos_format1({(1, 2): -40})])])
+        kern = _kern([_kern_subtable({(1, 2): -30})])
+        self.assertEqual({(1, 2): -30}, fontkerning.parse_kernings(_sfnt({'GPOS': gpos, 'kern': kern}), [1, 2]))
+
+
+class TestScaleKerning(unittest.TestCase):
+
+    def test_scale(self):
+        # a 2048 units per em font at 32 and 12 pixels
+        scale32 = 32 * 64 * 65536 / 2048
+        scale12 = 12 * 64 * 65536 / 2048
+        self.assertEqual(-2, fontkerning.scale_kerning(-100, scale32, 32))
+        self.assertEqual(2, fontkerning.scale_kerning(100, scale32, 32))
+        self.assertEqual(-5, fontkerning.scale_kerning(-300, scale32, 32))
+        # the small sizes are kerned less
+        self.assertEqual(0, fontkerning.scale_kerning(-100, scale12, 12))
+        self.assertEqual(-1, fontkerning.scale_kerning(-300, scale12, 12))
+        self.assertEqual(0, fontkerning.scale_kerning(0, scale32, 32))
+
+
+if __name__ == '__main__':
+    unittest.main()
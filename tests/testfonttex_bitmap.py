@@ -0,0 +1,224 @@
+import sys, os, unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir))
+
+import numpy as np
+from fontutils import FontException
+import fonttex_bitmap
+
+
+class _Info(object):
+    pass
+
+class _Glyph(object):
+    pass
+
+
+def _create_info(sizes, texturesize, multiple=0, textureoffset=(0, 0), padding=0, autotexturesize=1, texturepages=1,
+                 packingmethod='skyline_bl', packingorder='height', packingbestfit=0, allowrotate=0):
+    info = _Info()
+    info.glyphs = []
+    for i, (w, h) in enumerate(sizes):
+        glyph = _Glyph()
+        glyph.unicode = unichr(ord('A') + i)
+        glyph.bitmap = np.ones( (w, h, 4) ) * (i + 1)
+        info.glyphs.append(glyph)
+    info.texturesize = texturesize
+    info.autotexturesize = autotexturesize
+    info.texturepages = texturepages
+    info.texturesizemultiple = multiple
+    info.textureoffset = textureoffset
+    info.padding = padding
+    info.bgcolor = (0, 0, 0)
+    info.usepremultipliedalpha = 0
+    info.dtype = np.dtype(np.float32)
+    info.packingmethod = packingmethod
+    info.packingorder = packingorder
+    info.packingbestfit = packingbestfit
+    info.allowrotate = allowrotate
+    info.jobs = 1
+    return info
+
+
+def _check_glyph(test, image, glyph):
+    # the packer may have rotated the glyph
+    x, y, w, h = glyph.bitmapbox
+    test.assertTrue((w, h) in [glyph.bitmap.shape[:2], glyph.bitmap.shape[1::-1]])
+    test.assertTrue(np.all(image[x:x+w, y:y+h] == glyph.bitmap[0, 0]))
+
+
+class TestAutoTextureSize(unittest.TestCase):
+
+    def test_candidates(self):
+        self.assertEqual([16, 32, 64], fonttex_bitmap._get_candidates(9, 100, 0))
+        self.assertEqual([16, 32], fonttex_bitmap._get_candidates(16, 32, 0))
+        self.assertEqual([12, 18, 24], fonttex_bitmap._get_candidates(7, 25, 6))
+
+    def test_power_of_two(self):
+        info = _create_info([(16, 16)] * 16, (1024, 1024))
+        image = fonttex_bitmap.render(info)
+        self.assertEqual((64, 64), tuple(info.texturesize))
+        self.assertEqual((64, 64, 4), image.shape)
+        for i, glyph in enumerate(info.glyphs):
+            x, y, w, h = glyph.bitmapbox
+            self.assertTrue(np.all(image[x:x+w, y:y+h] == i + 1))
+
+    def test_smallest(self):
+        # compare with packing every allowed size
+        sizes = [(3 + (i * 7) % 11, 2 + (i * 5) % 13) for i in xrange(40)]
+        info = _create_info(sizes, (128, 128), multiple=4, textureoffset=(1, 2), padding=1)
+        fonttex_bitmap.render(info)
+
+        padded = [(w + 1, h + 1) for w, h in sorted(sizes, key=lambda s: s[1])]
+        best = None
+        for width in xrange(4, 129, 4):
+            for height in xrange(4, 129, 4):
+                if fonttex_bitmap._pack(padded, width - 1, height - 2) is not None:
+                    if best is None or width * height < best[0] * best[1]:
+                        best = (width, height)
+        self.assertEqual(best[0] * best[1], info.texturesize[0] * info.texturesize[1])
+
+    def test_too_large(self):
+        info = _create_info([(40, 40)] * 3, (64, 64))
+        self.assertRaises(FontException, fonttex_bitmap.render, info)
+
+
+class TestTexturePages(unittest.TestCase):
+
+    def test_pages(self):
+        info = _create_info([(16, 16)] * 40, (64, 64), autotexturesize=0, texturepages=0)
+        images = fonttex_bitmap.render(info)
+        self.assertEqual(3, len(images))
+        self.assertEqual(3, info.pagecount)
+        self.assertEqual([16, 16, 8], [len([g for g in info.glyphs if g.page == page]) for page in xrange(3)])
+        for i, glyph in enumerate(info.glyphs):
+            x, y, w, h = glyph.bitmapbox
+            self.assertTrue(np.all(images[glyph.page][x:x+w, y:y+h] == i + 1))
+
+    def test_max_pages(self):
+        info = _create_info([(16, 16)] * 40, (64, 64), autotexturesize=0, texturepages=2)
+        self.assertRaises(FontException, fonttex_bitmap.render, info)
+
+    def test_glyph_too_large(self):
+        # no number of pages is enough
+        for autotexturesize in [0, 1]:
+            info = _create_info([(16, 16), (80, 16)], (64, 64), autotexturesize=autotexturesize, texturepages=0)
+            try:
+                fonttex_bitmap.render(info)
+                self.fail("The glyph doesn't fit")
+            except FontException, e:
+                self.assertTrue("The glyph 'B' (80x16, including the padding) is larger than the texture size (64, 64)" in str(e), str(e))
+
+        info = _create_info([(16, 16), (60, 10)], (64, 64), textureoffset=(8, 0), autotexturesize=0, texturepages=0)
+        self.assertRaises(FontException, fonttex_bitmap.render, info)
+        # unless it may be rotated
+        info = _create_info([(16, 16), (60, 10)], (64, 64), textureoffset=(8, 0), autotexturesize=0, texturepages=0, allowrotate=1)
+        fonttex_bitmap.render(info)
+
+    def test_auto_single_page(self):
+        # with autotexturesize, the pages are only used when one texture isn't enough
+        info = _create_info([(16, 16)] * 4, (64, 64), texturepages=0)
+        images = fonttex_bitmap.render(info)
+        self.assertEqual(1, len(images))
+        self.assertEqual((32, 32), tuple(info.texturesize))
+
+        info = _create_info([(16, 16)] * 20, (64, 64), texturepages=0)
+        images = fonttex_bitmap.render(info)
+        self.assertEqual(2, len(images))
+        self.assertEqual((64, 64), tuple(info.texturesize))
+
+
+class TestDuplicates(unittest.TestCase):
+
+    def test_shared_box(self):
+        info = _create_info([(16, 16)] * 8, (64, 64), autotexturesize=1)
+        for i, glyph in enumerate(info.glyphs):
+            glyph.bitmap = np.ones( (16, 16, 4) ) * (i % 2 + 1)
+        image = fonttex_bitmap.render(info)
+        self.assertEqual(16 * 16 * 2, info.texturesize[0] * info.texturesize[1])
+        self.assertEqual(2, len(set(glyph.bitmapbox for glyph in info.glyphs)))
+        for glyph in info.glyphs:
+            _check_glyph(self, image, glyph)
+
+    def test_same_size(self):
+        # bitmaps of the same size but with different pixels are packed separately
+        info = _create_info([(4, 4)] * 2, (64, 64))
+        info.glyphs[1].bitmap = info.glyphs[0].bitmap.copy()
+        info.glyphs[1].bitmap[1, 2, 3] = 0.5
+        image = fonttex_bitmap.render(info)
+        self.assertNotEqual(info.glyphs[0].bitmapbox, info.glyphs[1].bitmapbox)
+        for glyph in info.glyphs:
+            x, y, w, h = glyph.bitmapbox
+            self.assertTrue(np.all(image[x:x+w, y:y+h] == glyph.bitmap))
+
+
+class TestPacking(unittest.TestCase):
+
+    def _sizes(self):
+        return [(3 + (i * 7) % 11, 2 + (i * 5) % 13) for i in xrange(60)]
+
+    def test_methods(self):
+        for method, _ in fonttex_bitmap.METHODS:
+            for order in ['height', '-height', 'width', '-area', 'perimeter']:
+                info = _create_info(self._sizes(), (128, 128), multiple=8, padding=1, packingmethod=method, packingorder=order)
+                image = fonttex_bitmap.render(info)
+                for glyph in info.glyphs:
+                    _check_glyph(self, image, glyph)
+
+    def test_auto(self):
+        # the best of all methods and orders is at least as small as the default
+        info = _create_info(self._sizes(), (128, 128), multiple=8, padding=1)
+        fonttex_bitmap.render(info)
+        default = info.texturesize
+
+        info = _create_info(self._sizes(), (128, 128), multiple=8, padding=1, packingmethod='auto', packingorder='auto')
+        image = fonttex_bitmap.render(info)
+        self.assertTrue(info.texturesize[0] * info.texturesize[1] <= default[0] * default[1])
+        self.assertEqual(tuple(info.texturesize) + (4,), image.shape)
+        for glyph in info.glyphs:
+            _check_glyph(self, image, glyph)
+
+    def test_bestfit(self):
+        for method, _ in fonttex_bitmap.METHODS:
+            info = _create_info(self._sizes(), (128, 128), multiple=8, padding=1, packingmethod=method, packingbestfit=1)
+            image = fonttex_bitmap.render(info)
+            for glyph in info.glyphs:
+                _check_glyph(self, image, glyph)
+
+        info = _create_info([(16, 16)] * 40, (64, 64), autotexturesize=0, texturepages=0, packingbestfit=1)
+        images = fonttex_bitmap.render(info)
+        self.assertEqual(3, len(images))
+        for glyph in info.glyphs:
+            _check_glyph(self, images[glyph.page], glyph)
+
+    def test_rotate(self):
+        # tall glyphs with a gradient, to see the orientation
+        sizes = [(4 + i % 3, 20 + (i * 7) % 9) for i in xrange(30)]
+        for method, _ in fonttex_bitmap.METHODS:
+            for allowrotate in [0, 1]:
+                info = _create_info(sizes, (128, 128), multiple=4, padding=1, packingmethod=method, allowrotate=allowrotate)
+                for i, glyph in enumerate(info.glyphs):
+                    glyph.bitmap = np.arange(glyph.bitmap.size, dtype=float).reshape(glyph.bitmap.shape) + i * 1000
+                image = fonttex_bitmap.render(info)
+                for glyph in info.glyphs:
+                    x, y, w, h = glyph.bitmapbox
+                    if not allowrotate:
+                        self.assertFalse(glyph.rotated)
+                    bw, bh = glyph.bitmap.shape[:2]
+                    self.assertEqual((bh, bw) if glyph.rotated else (bw, bh), (w, h))
+                    # the glyph pixel (gx, gy) is at (x + w - 1 - gy, y + gx) when rotated
+                    for gx, gy in [(0, 0), (bw - 1, 0), (0, bh - 1), (bw - 1, bh - 1)]:
+                        tx, ty = (x + w - 1 - gy, y + gx) if glyph.rotated else (x + gx, y + gy)
+                        self.assertTrue(np.all(image[tx, ty] == glyph.bitmap[gx, gy]))
+            if method.startswith('maxrects'):
+                self.assertTrue(any(glyph.rotated for glyph in info.glyphs))
+
+    def test_unknown(self):
+        info = _create_info(self._sizes(), (128, 128), packingmethod='guillotine')
+        self.assertRaises(FontException, fonttex_bitmap.render, info)
+        info = _create_info(self._sizes(), (128, 128), packingorder='-color')
+        self.assertRaises(FontException, fonttex_bitmap.render, info)
+
+
+if __name__ == '__main__':
+    unittest.main()
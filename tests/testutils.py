@@ -0,0 +1,369 @@
+import sys, os, unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir))
+
+import numpy as np
+import utils
+import fontutils as fu
+import fontblend
+
+
+def _disc(width, height, center, radius, samples=8):
+    """ Returns the coverage of a disc, and the exact signed distance (positive inside) to its edge """
+    offsets = (np.arange(samples) + 0.5) / samples - 0.5
+    x = np.arange(width)[:, None, None, None] + offsets[None, None, :, None]
+    y = np.arange(height)[None, :, None, None] + offsets[None, None, None, :]
+    inside = (x - center[0])**2 + (y - center[1])**2 < radius**2
+    coverage = inside.mean(axis=(2, 3))
+
+    x, y = np.meshgrid(np.arange(width), np.arange(height), indexing='ij')
+    distance = radius - np.sqrt((x - center[0])**2 + (y - center[1])**2)
+    return coverage, distance
+
+
+def _brute_force_edt(image):
+    """ The signed distance (positive inside) from each pixel center to the closest pixel center of the other side """
+    inside = np.argwhere(image > 0.5)
+    outside = np.argwhere(image <= 0.5)
+    out = np.empty(image.shape)
+    for x, y in np.ndindex(*image.shape):
+        if image[x, y] > 0.5:
+            out[x, y] = np.sqrt(((outside - (x, y))**2).sum(axis=1)).min()
+        else:
+            out[x, y] = -np.sqrt(((inside - (x, y))**2).sum(axis=1)).min()
+    return out
+
+
+class TestEDT(unittest.TestCase):
+
+    def test_exact(self):
+        radius = 100.0
+        rng = np.random.RandomState(1)
+        image = (rng.rand(23, 31) > 0.8).astype(np.float64)
+        expected = _brute_force_edt(image)
+
+        for image in [image, np.asfortranarray(image), (image * 255).astype(np.uint8)]:
+            out = utils.calculate_edt(image, radius, method='exact')
+            self.assertEqual(out.shape, image.shape)
+            self.assertEqual(out.dtype, image.dtype)
+            if image.dtype == np.uint8:
+                continue
+            self.assertTrue(np.allclose((out - 0.5) * 2 * radius, expected, atol=1e-3))
+
+    def test_antialiased_edges(self):
+        spread = 8.0
+        coverage, distance = _disc(48, 40, (23.3, 19.6), 12.4)
+        inrange = np.abs(distance) < spread - 1
+
+        errors = []
+        for image in [(coverage > 0.5).astype(np.float64), coverage]:
+            out = utils.calculate_edt(image, spread, method='exact')
+            errors.append( np.abs((out - 0.5) * 2 * spread - distance)[inrange].mean() )
+
+        # the coverage should improve the edge positions
+        self.assertLess(errors[1], errors[0])
+
+    def test_methods(self):
+        image = np.zeros((20, 20), np.uint8)
+        image[5:12, 6:15] = 255
+        self.assertTrue((utils.calculate_edt(image, 4.0, method='sedt') == utils.calculate_sedt(image, 4.0)).all())
+        self.assertRaises(AssertionError, utils.calculate_edt, image, 4.0, method='foo')
+
+
+class TestAAEDT(unittest.TestCase):
+
+    def test_disc(self):
+        spread = 8.0
+        coverage, distance = _disc(48, 40, (23.3, 19.6), 12.4)
+
+        for image in [coverage, np.asfortranarray(coverage), coverage.astype(np.float32)]:
+            out = utils.calculate_aaedt(image, spread)
+            self.assertEqual(out.shape, image.shape)
+            self.assertEqual(out.dtype, image.dtype)
+
+            estimate = (out - 0.5) * 2 * spread
+            inrange = np.abs(distance) < spread - 1
+            error = np.abs(estimate - distance)[inrange]
+            self.assertLess(error.max(), 0.25)
+            self.assertLess(error.mean(), 0.05)
+
+    def test_empty(self):
+        out = utils.calculate_aaedt(np.zeros((10, 12)), 4.0)
+        self.assertTrue((out == 0).all())
+
+
+class TestLayout(unittest.TestCase):
+    """ The native functions on non square images, in both memory orders """
+
+    def _images(self, shape):
+        rng = np.random.RandomState(9)
+        image = rng.uniform(0.0, 1.0, shape)
+        return [np.ascontiguousarray(image), np.asfortranarray(image)]
+
+    def test_maximum(self):
+        # an asymmetric kernel, to catch transposed images or kernels
+        kernel = np.zeros( (5, 3), np.float32 )
+        kernel[0, 0] = kernel[4, 1] = kernel[2, 2] = 1.0
+        for shape in [(31, 17, 4), (17, 31, 4), (31, 17)]:
+            image = self._images(shape)[0]
+            width, height = shape[:2]
+            padded = np.zeros( (width + 4, height + 2) + shape[2:] )
+            padded[2:2 + width, 1:1 + height] = image
+            expected = np.zeros_like(image)
+            for i, j in zip(*np.nonzero(kernel)):
+                expected = np.maximum(expected, padded[i:i + width, j:j + height])
+
+            for image in self._images(shape):
+                np.testing.assert_array_equal(expected, utils.maximum(image, kernel))
+
+    def test_convolve1d(self):
+        kernel = np.array([0.5, 0.25, 0.125], np.float32)
+        for shape in [(31, 17, 4), (17, 31, 4)]:
+            image = self._images(shape)[0]
+            for axis in [0, 1]:
+                padded = np.zeros( (shape[0] + 2, shape[1] + 2, shape[2]) )
+                padded[1:-1, 1:-1] = image
+                expected = np.zeros_like(image)
+                for i, weight in enumerate(kernel):
+                    if axis == 0:
+                        expected += weight * padded[i:i + shape[0], 1:-1]
+                    else:
+                        expected += weight * padded[1:-1, i:i + shape[1]]
+
+                out = utils.convolve1d(np.ascontiguousarray(image), kernel, axis)
+                np.testing.assert_array_almost_equal(expected, out, decimal=12)
+                # the stacked layout repeats the edge pixels instead of padding with zeros
+                out = utils.convolve1d(np.asfortranarray(image), kernel, axis)
+                np.testing.assert_array_almost_equal(expected[1:-1, 1:-1], out[1:-1, 1:-1], decimal=12)
+
+    def test_convolve1d_border(self):
+        kernel = [0.25, 0.5, 0.25]
+        for image, edge, inside in [(np.ones((6, 5, 4)), 0.75, 1.0), (np.ones((6, 5), np.float32), 0.75, 1.0),
+                                    (np.ones((6, 5, 4), np.uint8) * 200, 150, 200)]:
+            for axis in [0, 1]:
+                expected = np.empty_like(image)
+                expected[:] = inside
+                if axis == 0:
+                    expected[[0, -1]] = edge
+                else:
+                    expected[:, [0, -1]] = edge
+                # the pixels outside of the interleaved (C ordered) images are 0
+                np.testing.assert_array_equal(expected, utils.convolve1d(image, kernel, axis))
+                # and the stacked layout repeats the edge pixels
+                np.testing.assert_array_equal(image, utils.convolve1d(np.asfortranarray(image), kernel, axis))
+
+
+class TestBlend(unittest.TestCase):
+
+    def _reference(self, base, blend, fn, opacity):
+        # colorburn and colordodge divide by zero where the blend image is clipped
+        with np.errstate(divide='ignore', invalid='ignore'):
+            image = fn(base, np.clip(blend, 0.0, 1.0)) * blend.dtype.type(opacity)
+            return fu.alpha_blend(base, image)
+
+    def test_modes(self):
+        rng = np.random.RandomState(3)
+        for fn, mode in fontblend.NATIVE_MODES.iteritems():
+            for dtype in [np.float32, np.float64]:
+                # the blend image goes outside 0.0 - 1.0, to test the clipping
+                base = rng.uniform(0.0, 1.0, (3, 5, 7, 4)).astype(dtype)
+                blend = rng.uniform(-0.2, 1.2, (3, 5, 7, 4)).astype(dtype)
+                for opacity in [1.0, 0.3]:
+                    expected = self._reference(base, blend, fn, opacity)
+                    out = utils.blend(base, blend, mode, opacity)
+                    self.assertEqual(dtype, out.dtype)
+                    np.testing.assert_array_equal(expected, out, mode)
+                    out = utils.blend(base[1], np.asfortranarray(blend[1]), mode, opacity)
+                    np.testing.assert_array_equal(expected[1], out, mode)
+
+
+class TestMaximumOctagon(unittest.TestCase):
+
+    def _footprint(self, radius):
+        impulse = np.zeros( (radius * 2 + 1, radius * 2 + 1) )
+        impulse[radius, radius] = 1.0
+        return utils.maximum_octagon(impulse, radius)
+
+    def test_footprint(self):
+        for radius in xrange(0, 17):
+            footprint = self._footprint(radius)
+            disc = fu.create_2d_circle_kernel(radius)
+            # a symmetric octagon that reaches as far as the disc along the axes, without holes
+            self.assertTrue(np.array_equal(footprint, footprint.T))
+            self.assertTrue(np.array_equal(footprint, footprint[::-1]))
+            self.assertTrue(np.all(footprint[radius] == 1) and np.all(footprint[:, radius] == 1))
+            for row in footprint:
+                inside = np.nonzero(row)[0]
+                self.assertEqual(len(inside), inside[-1] - inside[0] + 1)
+            # and that differs from the disc by less than the number of pixels around the disc
+            self.assertTrue(np.abs(footprint - disc).sum() < 8 * radius + 1, radius)
+
+    def test_same_as_kernel(self):
+        rng = np.random.RandomState(5)
+        for radius in [1, 2, 5, 8]:
+            kernel = self._footprint(radius).astype(np.float32)
+            for image in [rng.uniform(0.0, 1.0, (37, 29, 4)), np.asfortranarray(rng.uniform(0.0, 1.0, (23, 41, 4))),
+                          (rng.uniform(0.0, 1.0, (2, 21, 17, 4)) * 255).astype(np.uint8)]:
+                np.testing.assert_array_equal(utils.maximum(image, kernel), utils.maximum_octagon(image, radius))
+
+
+class TestGaussianBlur(unittest.TestCase):
+
+    def test_accuracy(self):
+        image = np.zeros( (128, 112, 4) )
+        image[52:76, 46:62] = 1.0
+        # the recursive filter is less accurate for small sigmas
+        for sigma, tolerance in [(0.8, 0.08), (2.0, 0.04), (5.0, 0.04), (12.0, 0.04)]:
+            # a kernel that is wide enough to not be cut off
+            radius = int(sigma * 5) + 1
+            kernel = fu.create_1d_gaussian_kernel(radius, sigma)
+            expected = fu.blur_image_kernel1D(image, kernel)
+            out = utils.gaussian_blur(image, sigma)
+            self.assertEqual(image.shape, out.shape)
+            self.assertTrue(np.abs(out - expected).max() < tolerance, sigma)
+            self.assertTrue(abs(out.sum() - expected.sum()) < 1e-2 * expected.sum(), sigma)
+
+    def test_layouts(self):
+        rng = np.random.RandomState(6)
+        image = rng.uniform(0.0, 1.0, (2, 23, 19, 4))
+        expected = utils.gaussian_blur(image[1], 3.0)
+        np.testing.assert_array_almost_equal(expected, utils.gaussian_blur(np.asfortranarray(image[1]), 3.0))
+        # the glyphs in a batch don't bleed into each other
+        np.testing.assert_array_equal(expected, utils.gaussian_blur(image, 3.0)[1])
+        self.assertEqual(np.uint8, utils.gaussian_blur((image[1] * 255).astype(np.uint8), 3.0).dtype)
+
+
+class TestDownsample(unittest.TestCase):
+
+    def _block_mean(self, image, factor):
+        w, h = image.shape[0] // factor, image.shape[1] // factor
+        blocks = image[:w * factor, :h * factor].reshape( (w, factor, h, factor) + image.shape[2:] )
+        return blocks.mean(axis=3).mean(axis=1)
+
+    def test_half_size(self):
+        rng = np.random.RandomState(7)
+        for image in [rng.uniform(0.0, 1.0, (24, 18, 4)), np.asfortranarray(rng.uniform(0.0, 1.0, (25, 19))),
+                      (rng.uniform(0.0, 1.0, (24, 18)) * 255).astype(np.uint8)]:
+            out = utils.downsample(image, 2)
+            # the values may be summed in another order
+            np.testing.assert_array_almost_equal(utils.half_size(image), out, decimal=12)
+            self.assertEqual(image.flags.f_contiguous and not image.flags.c_contiguous, out.flags.f_contiguous and not out.flags.c_contiguous)
+
+    def test_factors(self):
+        rng = np.random.RandomState(8)
+        for image in [rng.uniform(0.0, 1.0, (37, 29, 4)), np.asfortranarray(rng.uniform(0.0, 1.0, (37, 29, 4))), rng.uniform(0.0, 1.0, (37, 29))]:
+            for factor in [1, 3, 4, 8]:
+                out = utils.downsample(image, factor)
+                self.assertEqual((37 // factor, 29 // factor) + image.shape[2:], out.shape)
+                np.testing.assert_array_almost_equal(self._block_mean(image, factor), out, decimal=12)
+            np.testing.assert_array_almost_equal(utils.half_size(utils.half_size(image)), utils.downsample(image, 4), decimal=12)
+
+        batch = rng.uniform(0.0, 1.0, (3, 8, 12, 4))
+        out = utils.downsample(batch, 4)
+        self.assertEqual((3, 2, 3, 4), out.shape)
+        np.testing.assert_array_equal(utils.downsample(batch[2], 4), out[2])
+
+
+class _Library(object):
+    """ Stands in for a native library that only has the given functions """
+    _name = 'test library'
+
+    def __init__(self, **functions):
+        self.__dict__.update(functions)
+
+
+def _version1_library():
+    """ A library with the first interface, where convolve1d, maximum and minimum have no threads argument.
+    The functions call the real library, on one thread
+    """
+    def version1(name):
+        fn = utils._ThreadedFunction(utils._utils, name, list(getattr(utils, '_' + name).argtypes))
+        def call(*args):
+            assert len(args) == len(fn.argtypes) - 1, "%s() got %d arguments" % (name, len(args))
+            return fn(*(args[:-1] + (1,) + args[-1:]))
+        return call
+    return _Library(convolve1d=version1('convolve1d'), maximum=version1('maximum'), minimum=version1('minimum'))
+
+
+class TestOldLibrary(unittest.TestCase):
+    """ The prebuilt libraries may be older than the python code """
+
+    NAMES = ['_downsample', '_blend', '_convolve1d', '_maximum', '_minimum', '_get_max_threads']
+
+    def setUp(self):
+        self.functions = dict( (name, getattr(utils, name)) for name in self.NAMES )
+
+    def tearDown(self):
+        for name, fn in self.functions.iteritems():
+            setattr(utils, name, fn)
+
+    def test_missing_function(self):
+        fn = utils.NativeFunction(utils._utils, 'no_such_function', [])
+        self.assertFalse(fn.exists())
+        self.assertRaises(IOError, fn)
+        self.assertTrue(utils.NativeFunction(utils._utils, 'maximum', []).exists())
+
+    def test_version1(self):
+        self.assertEqual(2, utils.get_library_version(utils._utils))
+        library = _version1_library()
+        self.assertEqual(1, utils.get_library_version(library))
+
+        rng = np.random.RandomState(10)
+        gaussian = fu.create_1d_gaussian_kernel(3)
+        circle = fu.create_2d_circle_kernel(2)
+        tests = [lambda img: utils.convolve1d(img, gaussian, 0, threads=0),
+                 lambda img: utils.convolve1d(img, gaussian, 1, threads=2),
+                 lambda img: utils.maximum(img, circle, threads=0),
+                 lambda img: utils.minimum(img, circle, threads=3)]
+        images = [rng.uniform(0.0, 1.0, (37, 29, 4)), np.asfortranarray(rng.uniform(0.0, 1.0, (37, 29, 4))),
+                  (rng.uniform(0.0, 1.0, (21, 17)) * 255).astype(np.uint8)]
+        expected = [fn(image) for fn in tests for image in images]
+
+        # the threads argument isn't passed to the older library
+        for name in ['convolve1d', 'maximum', 'minimum']:
+            setattr(utils, '_' + name, utils._ThreadedFunction(library, name, getattr(utils, '_' + name).argtypes))
+        utils._get_max_threads = utils.NativeFunction(library, 'get_max_threads', [])
+        for e, out in zip(expected, [fn(image) for fn in tests for image in images]):
+            np.testing.assert_array_equal(e, out)
+        self.assertEqual(1, utils.get_max_threads())
+
+    def test_downsample(self):
+        rng = np.random.RandomState(9)
+        image = rng.uniform(0.0, 1.0, (37, 29, 4))
+        batch = rng.uniform(0.0, 1.0, (3, 8, 12, 4))
+        expected = [utils.downsample(image, 4), utils.downsample(batch, 2)]
+
+        utils._downsample = utils.NativeFunction(utils._utils, 'no_such_function', [])
+        # the powers of two are scaled down with half_size()
+        np.testing.assert_array_almost_equal(expected[0], utils.downsample(image, 4), decimal=12)
+        np.testing.assert_array_almost_equal(expected[1], utils.downsample(batch, 2), decimal=12)
+        self.assertRaises(IOError, utils.downsample, image, 3)
+
+    def test_blend(self):
+        self.assertTrue(utils.has_blend())
+        utils._blend = utils.NativeFunction(utils._utils, 'no_such_function', [])
+        self.assertFalse(utils.has_blend())
+
+
+class TestThreads(unittest.TestCase):
+
+    def test_max_threads(self):
+        self.assertTrue(utils.get_max_threads() >= 1)
+
+    def test_same_result(self):
+        rng = np.random.RandomState(4)
+        gaussian = fu.create_1d_gaussian_kernel(3)
+        circle = fu.create_2d_circle_kernel(2)
+        for image in [rng.uniform(0.0, 1.0, (37, 29, 4)), np.asfortranarray(rng.uniform(0.0, 1.0, (37, 29, 4))),
+                      (rng.uniform(0.0, 1.0, (4, 21, 17, 4)) * 255).astype(np.uint8)]:
+            for fn in [lambda img, threads: utils.convolve1d(img, gaussian, 0, threads=threads),
+                       lambda img, threads: utils.convolve1d(img, gaussian, 1, threads=threads),
+                       lambda img, threads: utils.maximum(img, circle, threads=threads),
+                       lambda img, threads: utils.minimum(img, circle, threads=threads)]:
+                expected = fn(image, 1)
+                for threads in [0, 2, 3, 8]:
+                    np.testing.assert_array_equal(expected, fn(image, threads))
+
+
+if __name__ == '__main__':
+    unittest.main()
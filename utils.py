@@ -7,7 +7,7 @@ The Signed Euclidian Distance Transform functionality is taken from http://www.g
 import sys
 import numpy as np
 import ctypes
-from ctypes import POINTER, byref, c_void_p, c_size_t, c_float, c_uint32
+from ctypes import POINTER, byref, c_void_p, c_size_t, c_float, c_double, c_uint32
 
 c_float_p = POINTER(c_float)
 
@@ -33,6 +33,9 @@ LAYOUT_STACKED = 1
 TYPE_UINT = 0
 TYPE_FLOAT = 1
 
+# The blend modes of blend(), in the same order as EBlendMode
+BLEND_MODES = ['normal', 'darken', 'multiply', 'colorburn', 'linearburn', 'lighten', 'screen', 'colordodge', 'lineardodge']
+
 
 class Image(ctypes.Structure):
     _fields_ = [
@@ -46,33 +49,98 @@ class Image(ctypes.Structure):
     ]
 
 
-_convolve1d = _utils.convolve1d
-_convolve1d.argtypes = [POINTER(Image), c_float_p, c_size_t, c_size_t, c_void_p]
+class NativeFunction(object):
+    """ A function of a native library, that is looked up on its first call.
+    The libraries in shared/ are prebuilt, and may be older than the python code. An out of date library
+    then only fails when a function that it lacks is actually used, instead of when the module is imported.
+    """
+
+    def __init__(self, library, name, argtypes, restype=None):
+        self.library = library
+        self.name = name
+        self.argtypes = argtypes
+        self.restype = restype
+        self.function = None
+
+    def exists(self):
+        """ Returns True if the library has the function """
+        return hasattr(self.library, self.name)
+
+    def __call__(self, *args):
+        if self.function is None:
+            if not self.exists():
+                raise IOError("The native library %s has no function %s(), it is out of date. Rebuild the native libraries (compile.sh, compile_linux.sh or compile_win*.bat)" % (self.library._name, self.name))
+            function = getattr(self.library, self.name)
+            function.argtypes = self.argtypes
+            if self.restype is not None:
+                function.restype = self.restype
+            self.function = function
+        return self.function(*args)
+
+
+class _ThreadedFunction(NativeFunction):
+    """ A function that takes the number of threads as its second to last argument.
+    The argument was added in version 2 of the library, and the older libraries are called without it (on one thread)
+    """
 
-_maximum = _utils.maximum
-_maximum.argtypes = [POINTER(Image), c_float_p, c_size_t, c_size_t, c_void_p]
+    def __init__(self, library, name, argtypes, restype=None):
+        NativeFunction.__init__(self, library, name, argtypes, restype)
+        self.singlethreaded = None
 
-_minimum = _utils.minimum
-_minimum.argtypes = [POINTER(Image), c_float_p, c_size_t, c_size_t, c_void_p]
+    def __call__(self, *args):
+        if self.singlethreaded is None:
+            self.singlethreaded = get_library_version(self.library) < 2
+            if self.singlethreaded:
+                self.argtypes = self.argtypes[:-2] + self.argtypes[-1:]
+        if self.singlethreaded:
+            args = args[:-2] + args[-1:]
+        return NativeFunction.__call__(self, *args)
 
-_half_size = _utils.half_size
-_half_size.argtypes = [POINTER(Image), c_void_p]
 
-_calculate_sedt = _utils.calculate_sedt
-_calculate_sedt.argtypes = [POINTER(Image), c_float, c_void_p]
+def get_library_version(library):
+    """ Returns the interface version of a native library. The first version had no get_version() """
+    if not hasattr(library, 'get_version'):
+        return 1
+    library.get_version.restype = c_uint32
+    return library.get_version()
+
+
+_convolve1d = _ThreadedFunction(_utils, 'convolve1d', [POINTER(Image), c_float_p, c_size_t, c_size_t, c_uint32, c_void_p])
+_maximum = _ThreadedFunction(_utils, 'maximum', [POINTER(Image), c_float_p, c_size_t, c_size_t, c_uint32, c_void_p])
+_minimum = _ThreadedFunction(_utils, 'minimum', [POINTER(Image), c_float_p, c_size_t, c_size_t, c_uint32, c_void_p])
+_maximum_octagon = NativeFunction(_utils, 'maximum_octagon', [POINTER(Image), c_size_t, c_void_p])
+_gaussian_blur = NativeFunction(_utils, 'gaussian_blur', [POINTER(Image), c_double, c_void_p])
+_half_size = NativeFunction(_utils, 'half_size', [POINTER(Image), c_void_p])
+_downsample = NativeFunction(_utils, 'downsample', [POINTER(Image), c_size_t, c_void_p])
+_calculate_sedt = NativeFunction(_utils, 'calculate_sedt', [POINTER(Image), c_float, c_void_p])
+_calculate_aaedt = NativeFunction(_utils, 'calculate_aaedt', [POINTER(Image), c_float, c_void_p])
+_calculate_edt = NativeFunction(_utils, 'calculate_edt', [POINTER(Image), c_float, c_void_p])
+_blend = NativeFunction(_utils, 'blend', [POINTER(Image), POINTER(Image), c_uint32, c_double, c_void_p])
+_get_max_threads = NativeFunction(_utils, 'get_max_threads', [], c_uint32)
+
+_EDT_METHODS = {'exact': _calculate_edt, 'sedt': _calculate_sedt, 'antialiased': _calculate_aaedt}
 
 
 def _make_image(npimage):
+    """ Wraps a numpy array in an Image struct.
+    The native functions address the pixels as (y * width + x), where x is the fastest changing index.
+    For C ordered arrays that is the second axis, and for Fortran ordered arrays it's the first axis.
+    """
     image = Image()
     image.data = npimage.ctypes.data_as(c_void_p)
     
     if len(npimage.shape) == 2:
-        image.width, image.height = npimage.shape
+        width, height = npimage.shape
         image.channels = 1
     else:
-        image.width, image.height, image.channels = npimage.shape
+        width, height, image.channels = npimage.shape
         
-    image.layout = LAYOUT_INTERLEAVED if npimage.flags.c_contiguous else LAYOUT_STACKED
+    if npimage.flags.c_contiguous:
+        image.layout = LAYOUT_INTERLEAVED
+        image.width, image.height = height, width
+    else:
+        image.layout = LAYOUT_STACKED
+        image.width, image.height = width, height
     
     typ = npimage.dtype
     if typ in (np.ubyte, np.uint8, np.uint16, np.uint32, np.uint64):
@@ -91,63 +159,190 @@ def _make_image(npimage):
         
     return image
 
+
+def _make_image_array(npimage):
+    """ Makes sure the array has a memory layout that the native functions understand.
+    A batch of images with shape (N, W, H, C) is treated as one image with shape (N*W, H, C).
+    Callers must make sure the images in a batch are padded enough to not bleed into each other.
+    """
+    if len(npimage.shape) == 4:
+        return np.ascontiguousarray(npimage).reshape( (-1,) + npimage.shape[2:] )
+    if not npimage.flags.c_contiguous and not npimage.flags.f_contiguous:
+        return np.ascontiguousarray(npimage)
+    return npimage
+
+
 def _make_kernel(kernel):
     if isinstance(kernel, list):
         kernel = np.array(kernel, dtype=np.float32)
     if kernel.dtype == np.float64:
         kernel = np.array( [x for x in kernel], dtype=np.float32)
     return kernel
+
+
+def _make_kernel_2d(kernel, image):
+    """ Returns the kernel with its memory laid out in the same order as the image """
+    kernel = _make_kernel(kernel)
+    if image.layout == LAYOUT_STACKED:
+        kernel = kernel.T
+    return np.ascontiguousarray(kernel)
     
 
-def convolve1d(npimage, kernel, axis):
+def get_max_threads():
+    """ Returns the number of threads that threads=0 uses. It is 1 if the library isn't compiled with OpenMP,
+    in which case the threads argument has no effect. compile_linux.sh and the compile_win*.bat files enable OpenMP,
+    and compile.sh does if libomp is installed.
+    """
+    if not _get_max_threads.exists():
+        return 1
+    return _get_max_threads()
+
+
+def convolve1d(npimage, kernel, axis, threads=1):
+    """ Convolves the image with a 1d kernel along the axis.
+    The GIL is released during the call, and the rows are split over the given number of threads (0 = all cores)
+    if the library is compiled with OpenMP. See get_max_threads()
+    """
+    shape = npimage.shape
+    npimage = _make_image_array(npimage)
     out = np.empty_like(npimage)
     image = _make_image(npimage)
+    if image.layout == LAYOUT_INTERLEAVED:
+        axis = 1 - axis
     kernel = _make_kernel(kernel)
-    _convolve1d(byref(image), kernel.ctypes.data_as(c_float_p), len(kernel), axis, out.ctypes.data_as(c_void_p))
-    return out
+    _convolve1d(byref(image), kernel.ctypes.data_as(c_float_p), len(kernel), axis, threads, out.ctypes.data_as(c_void_p))
+    return out.reshape(shape)
 
 
-def maximum(npimage, kernel):
+def maximum(npimage, kernel, threads=1):
+    """ Sets each pixel to the maximum of its neighborhood, where the kernel is non zero. See convolve1d() for the threads """
+    shape = npimage.shape
+    npimage = _make_image_array(npimage)
     out = np.empty_like(npimage)
     image = _make_image(npimage)
-    kernel = _make_kernel(kernel)
-    _maximum( byref(image), kernel.ctypes.data_as(c_float_p), kernel.shape[0], kernel.shape[1], out.ctypes.data_as(c_void_p))
-    return out
+    kernel = _make_kernel_2d(kernel, image)
+    _maximum( byref(image), kernel.ctypes.data_as(c_float_p), kernel.shape[1], kernel.shape[0], threads, out.ctypes.data_as(c_void_p))
+    return out.reshape(shape)
 
 
-def minimum(npimage, kernel):
+def minimum(npimage, kernel, threads=1):
+    """ Sets each pixel to the minimum of its neighborhood, where the kernel is non zero. See convolve1d() for the threads """
+    shape = npimage.shape
+    npimage = _make_image_array(npimage)
     out = np.empty_like(npimage)
     image = _make_image(npimage)
-    kernel = _make_kernel(kernel)
-    _minimum( byref(image), kernel.ctypes.data_as(c_float_p), kernel.shape[0], kernel.shape[1], out.ctypes.data_as(c_void_p))
+    kernel = _make_kernel_2d(kernel, image)
+    _minimum( byref(image), kernel.ctypes.data_as(c_float_p), kernel.shape[1], kernel.shape[0], threads, out.ctypes.data_as(c_void_p))
+    return out.reshape(shape)
+
+def maximum_octagon(npimage, radius):
+    """ Like maximum() with a create_2d_circle_kernel(radius), but with a regular octagon instead of the disc.
+    The octagon is made of a horizontal, a vertical and two diagonal lines, and each line takes three comparisons
+    per pixel (van Herk/Gil-Werman), regardless of the radius.
+    """
+    shape = npimage.shape
+    npimage = _make_image_array(npimage)
+    out = np.empty_like(npimage)
+    image = _make_image(npimage)
+    _maximum_octagon( byref(image), radius, out.ctypes.data_as(c_void_p))
+    return out.reshape(shape)
+
+def gaussian_blur(npimage, sigma):
+    """ Blurs the image with a recursive gaussian filter, where the cost per pixel is the same for all sigmas.
+    The filter has an infinite reach, so the images in a batch of shape (N, W, H, C) are blurred one by one.
+    """
+    if len(npimage.shape) == 4:
+        return np.array( [gaussian_blur(image, sigma) for image in npimage] )
+    npimage = _make_image_array(npimage)
+    out = np.empty_like(npimage)
+    image = _make_image(npimage)
+    _gaussian_blur( byref(image), sigma, out.ctypes.data_as(c_void_p))
     return out
 
 def half_size(npimage):
-    depth = 1 if len(npimage.shape) == 2 else npimage.shape[2]
-    if npimage.flags.f_contiguous:  # stacked
-        empty = np.empty( (npimage.shape[0]//2, npimage.shape[1]//2), npimage.dtype )
-        if depth == 1:
-            out = np.dstack( (empty,) )
-        elif depth == 2:
-            out = np.dstack( (empty, empty) )
-        elif depth == 3:
-            out = np.dstack( (empty, empty, empty) )
-        elif depth == 4:
-            out = np.dstack( (empty, empty, empty, empty) )
-    else:
-        if depth == 1:
-            out = np.empty( (npimage.shape[0]//2, npimage.shape[1]//2), npimage.dtype )
-        else:
-            out = np.empty( (npimage.shape[0]//2, npimage.shape[1]//2, depth), npimage.dtype )
+    npimage = _make_image_array(npimage)
+    shape = (npimage.shape[0]//2, npimage.shape[1]//2) + npimage.shape[2:]
+    out = np.empty( shape, npimage.dtype, order='C' if npimage.flags.c_contiguous else 'F' )
 
     image = _make_image(npimage)
     _half_size(byref(image), out.ctypes.data_as(c_void_p))
     return out
 
-def calculate_sedt(npimage, radius):
-    assert len(npimage.shape) == 2 or npimage.shape[2] == 1, "calculate_sed only supports 1 channel bitmaps"
+def downsample(npimage, factor):
+    """ Scales the image down by an integer factor in one pass, where each pixel is the average of a factor x factor block.
+    The rows and columns that don't fill a whole block are skipped. downsample(image, 4) is the same as calling
+    half_size() twice, except for the rounding of integer images.
+    """
+    assert factor >= 1, "The factor must be at least 1: %d" % factor
+    if len(npimage.shape) == 4:
+        return np.array( [downsample(image, factor) for image in npimage] )
+    if not _downsample.exists() and factor & (factor - 1) == 0:
+        # an older native library
+        while factor > 1:
+            npimage = half_size(npimage)
+            factor //= 2
+        return npimage
+    npimage = _make_image_array(npimage)
+    shape = (npimage.shape[0]//factor, npimage.shape[1]//factor) + npimage.shape[2:]
+    out = np.empty( shape, npimage.dtype, order='C' if npimage.flags.c_contiguous else 'F' )
+
+    image = _make_image(npimage)
+    _downsample(byref(image), factor, out.ctypes.data_as(c_void_p))
+    return out
+
+def calculate_edt(npimage, radius, method='exact'):
+    """ Calculates a signed distance field, where the distances are scaled by the radius.
+    The result has the same range as the input, where the edge is at the half of the range.
+
+    :param npimage:     A 1 channel image. Float images may hold the coverage of anti-aliased edges (0.0 - 1.0)
+    :param radius:      The distance that maps to the ends of the range
+    :param method:      'exact' (Felzenszwalb), 'sedt' (8SSEDT, approximate) or 'antialiased' (Gustavson, estimates the edges from the gradients)
+    """
+    assert len(npimage.shape) == 2 or npimage.shape[2] == 1, "calculate_edt only supports 1 channel bitmaps"
+    assert method in _EDT_METHODS, "Unknown distance transform: %s" % method
+    npimage = _make_image_array(npimage)
     out = np.empty_like(npimage)
     image = _make_image(npimage)
-    _calculate_sedt( byref(image), radius, out.ctypes.data_as(c_void_p))
+    _EDT_METHODS[method]( byref(image), radius, out.ctypes.data_as(c_void_p))
+    return out
+
+def calculate_sedt(npimage, radius):
+    return calculate_edt(npimage, radius, method='sedt')
+
+def calculate_aaedt(npimage, radius):
+    """ Calculates a signed distance field from an anti-aliased image, where each pixel value is the coverage.
+    The edge positions are estimated with sub pixel precision, which means that the image doesn't have to be
+    rendered at a higher resolution first.
+    """
+    return calculate_edt(npimage, radius, method='antialiased')
+
+
+def has_blend():
+    """ Returns True if blend() is supported by the native library """
+    return _blend.exists()
+
+
+def blend(base, blend, mode, opacity, out=None):
+    """ Blends an image onto the base in one pass. It gives the same result as clipping the blend image to 0.0 - 1.0,
+    applying the blend mode, multiplying with the opacity and then alpha blending the result onto the base.
+
+    :param base:    The base image, an RGBA float image of shape (W, H, 4) or (N, W, H, 4)
+    :param blend:   The blend image, with the same shape and type as the base image
+    :param mode:    One of the BLEND_MODES
+    :param opacity: The opacity of the blend image
+    :param out:     The array to write the result to. If None, a new array is created
+    :return:        The out array
+    """
+    assert base.shape == blend.shape, "Cannot blend two images of different shapes: %s != %s" % (str(base.shape), str(blend.shape))
+    assert base.dtype == blend.dtype and base.dtype in (np.float32, np.float64), "blend only supports float32 and float64 images of the same type"
+    assert base.shape[-1] == 4, "blend only supports RGBA images"
+    assert mode in BLEND_MODES, "Unknown blend mode: %s" % mode
+    if out is None:
+        out = np.empty(base.shape, base.dtype)
+    assert out.shape == base.shape and out.dtype == base.dtype and out.flags.c_contiguous
+
+    # the pixels are processed in memory order, so both images need the same (C) layout
+    base = np.ascontiguousarray(base).reshape( (-1, 1, 4) )
+    blend = np.ascontiguousarray(blend).reshape( base.shape )
+    _blend( byref(_make_image(base)), byref(_make_image(blend)), BLEND_MODES.index(mode), opacity, out.ctypes.data_as(c_void_p) )
     return out
-    